@@ -4,157 +4,167 @@ This avoids the SQLAlchemy import hang issue.
 """
 import sqlite3
 import os
+import threading
+import weakref
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 from contextlib import contextmanager
 
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), "intellidesk.db")
+DATABASE_PATH = os.getenv("DATABASE_PATH", os.path.join(os.path.dirname(__file__), "intellidesk.db"))
 
-def get_connection():
-    """Get a database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))  # page cache per connection
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "128"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+def _configure(conn: sqlite3.Connection, read_only: bool = False) -> sqlite3.Connection:
     conn.row_factory = sqlite3.Row  # Return rows as dict-like objects
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    if not read_only:
+        # Persistent: readers no longer block the writer (and vice versa)
+        conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")  # durable at checkpoints; safe with WAL
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    if read_only:
+        conn.execute("PRAGMA query_only = ON")
     return conn
 
-@contextmanager
+def get_connection(read_only: bool = False):
+    """Get a new, unpooled database connection (init, scripts)"""
+    conn = sqlite3.connect(DATABASE_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    return _configure(conn, read_only)
+
+
+class _Slot:
+    """One thread's pooled connection and how deeply its blocks are nested"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.depth = 0
+        self.thread = weakref.ref(threading.current_thread())
+
+
+class ConnectionPool:
+    """
+    Per-thread connection reuse. API handlers run on a long-lived thread
+    pool and ingestion/draft workers are long-lived threads, so each thread
+    keeps one configured connection instead of reconnecting per call.
+    Connections of threads that have exited are closed when the next one
+    is opened.
+    """
+
+    def __init__(self, name: str, read_only: bool = False):
+        self.name = name
+        self.read_only = read_only
+        self._local = threading.local()
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "closed": 0, "reused": 0, "busy_errors": 0, "rollbacks": 0}
+
+    def _slot(self) -> _Slot:
+        slot = getattr(self._local, "slot", None)
+        if slot is not None:
+            with self._lock:
+                self._stats["reused"] += 1
+            return slot
+        slot = _Slot(get_connection(self.read_only))
+        self._local.slot = slot
+        with self._lock:
+            self._prune()
+            self._slots[id(slot)] = slot
+            self._stats["opened"] += 1
+        return slot
+
+    def _prune(self):
+        """Close connections owned by threads that have exited (caller holds the lock)"""
+        for key, slot in list(self._slots.items()):
+            thread = slot.thread()
+            if thread is None or not thread.is_alive():
+                slot.conn.close()
+                del self._slots[key]
+                self._stats["closed"] += 1
+
+    @contextmanager
+    def connection(self):
+        slot = self._slot()
+        slot.depth += 1
+        try:
+            yield slot.conn
+            if slot.depth == 1:
+                # Read-only blocks commit too, which just ends any implicit read transaction
+                slot.conn.commit()
+        except Exception as e:
+            if slot.depth == 1:
+                slot.conn.rollback()
+                with self._lock:
+                    self._stats["rollbacks"] += 1
+            if isinstance(e, sqlite3.OperationalError) and "locked" in str(e):
+                with self._lock:
+                    self._stats["busy_errors"] += 1
+            raise
+        finally:
+            slot.depth -= 1
+
+    def close_all(self):
+        with self._lock:
+            for slot in self._slots.values():
+                slot.conn.close()
+                self._stats["closed"] += 1
+            self._slots.clear()
+        self._local = threading.local()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["open_connections"] = len(self._slots)
+            stats["in_use"] = sum(1 for slot in self._slots.values() if slot.depth > 0)
+        return stats
+
+
+_write_pool = ConnectionPool("write")
+_read_pool = ConnectionPool("read", read_only=True)
+
 def get_db():
-    """Context manager for database sessions"""
-    conn = get_connection()
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+    """
+    Context manager for database sessions (pooled, one connection per thread).
+    Nested get_db() blocks on the same thread share the connection and its
+    transaction; the outermost block commits, or rolls back on error.
+    """
+    return _write_pool.connection()
+
+def get_read_db():
+    """Context manager for read-only sessions (GET endpoints); writes raise an error"""
+    return _read_pool.connection()
+
+def close_db_pools():
+    _write_pool.close_all()
+    _read_pool.close_all()
+
+def get_pool_stats() -> dict:
+    with get_read_db() as conn:
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    return {
+        "path": os.path.abspath(DATABASE_PATH),
+        "journal_mode": journal_mode,
+        "pragmas": {
+            "synchronous": "NORMAL",
+            "cache_size_kb": SQLITE_CACHE_KB,
+            "mmap_size_mb": SQLITE_MMAP_MB,
+            "busy_timeout_ms": SQLITE_BUSY_TIMEOUT_MS,
+        },
+        "write": _write_pool.get_stats(),
+        "read": _read_pool.get_stats(),
+    }
 
 def init_db():
-    """Initialize database tables"""
+    """Create or upgrade the schema by applying pending migrations (see migrations/)"""
+    from migrations import run_migrations
     conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Create tickets table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS tickets (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            description TEXT NOT NULL,
-            customer_email TEXT,
-            type TEXT DEFAULT 'general',
-            priority TEXT DEFAULT 'medium',
-            status TEXT DEFAULT 'open',
-            suggested_response TEXT,
-            confidence_score REAL,
-            final_response TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            updated_at TEXT,
-            resolved_at TEXT
-        )
-    """)
-    
-    # Create knowledge_documents table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS knowledge_documents (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            filename TEXT NOT NULL,
-            original_filename TEXT NOT NULL,
-            content TEXT NOT NULL,
-            file_type TEXT NOT NULL,
-            chunk_count INTEGER DEFAULT 0,
-            uploaded_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Create document_chunks table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS document_chunks (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            document_id INTEGER NOT NULL,
-            chunk_index INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    # Create accounts table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS accounts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            domain TEXT NOT NULL UNIQUE,
-            tier TEXT DEFAULT 'potential',
-            industry TEXT,
-            status TEXT DEFAULT 'active',
-            last_activity_at TEXT,
-            lead_score REAL DEFAULT 0.0,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-    
-    # Create customers table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS customers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            email TEXT NOT NULL UNIQUE,
-            name TEXT,
-            account_id INTEGER,
-            role TEXT,
-            department TEXT,
-            last_login_at TEXT,
-            metadata TEXT,
-            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(account_id) REFERENCES accounts(id)
-        )
-    """)
-    # Create ticket_emails table for threading
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ticket_emails (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            ticket_id INTEGER NOT NULL,
-            message_id TEXT,
-            sender TEXT NOT NULL,
-            subject TEXT,
-            body TEXT,
-            received_at TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(ticket_id) REFERENCES tickets(id)
-        )
-    """)
-    
-    # Migration: Add columns if they don't exist (for existing DB)
-    try:
-        cursor.execute("ALTER TABLE customers ADD COLUMN role TEXT")
-    except sqlite3.OperationalError:
-        pass # Column already exists
-        
     try:
-        cursor.execute("ALTER TABLE customers ADD COLUMN department TEXT")
-    except sqlite3.OperationalError:
-        pass
-        
-    try:
-        cursor.execute("ALTER TABLE customers ADD COLUMN last_login_at TEXT")
-    except sqlite3.OperationalError:
-        pass
-
-    # Migration for accounts
-    try:
-        cursor.execute("ALTER TABLE accounts ADD COLUMN status TEXT DEFAULT 'active'")
-    except sqlite3.OperationalError:
-        pass
-        
-    try:
-        cursor.execute("ALTER TABLE accounts ADD COLUMN last_activity_at TEXT")
-    except sqlite3.OperationalError:
-        pass
-        
-    try:
-        cursor.execute("ALTER TABLE accounts ADD COLUMN lead_score REAL DEFAULT 0.0")
-    except sqlite3.OperationalError:
-        pass
-    
-    conn.commit()
-    conn.close()
+        run_migrations(conn)
+    finally:
+        conn.close()
 
 # Initialize database on module load
 init_db()
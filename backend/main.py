@@ -1,18 +1,18 @@
 import os
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-from database import init_db
+# Importing database applies pending schema migrations (see migrations/)
+from database import close_db_pools, get_pool_stats
 from routers import tickets, knowledge, analytics, emails, customers, auth
 from services.email_service import get_email_service
 from services.rag_service import get_rag_service
-
-# Initialize database tables
-init_db()
+from services.draft_service import get_draft_service
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -43,9 +43,12 @@ async def startup_event():
     # Connect to MongoDB
     mongo_db.connect()
     
-    # Initialize RAG (Dataset Seeding)
+    # Warm up RAG in the background (vector store, seeding); see /api/health/ready
     get_rag_service()
     
+    # Background response drafting for new tickets
+    get_draft_service().start()
+    
     # Start Email Ingestion
     email_service = get_email_service()
     email_service.start()
@@ -53,7 +56,9 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     get_email_service().stop()
+    get_draft_service().stop()
     mongo_db.close()
+    close_db_pools()
 
 # Include routers
 app.include_router(auth.router)
@@ -76,6 +81,22 @@ def root():
 def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/health/ready")
+def readiness_check():
+    """Ready once background warm-up has finished with RAG usable (or disabled by configuration)"""
+    rag = get_rag_service().get_readiness()
+    ready = rag["status"] in ("ready", "disabled")
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else ("starting" if rag["status"] == "initializing" else "unavailable"),
+                 "components": {"rag": rag}}
+    )
+
+@app.get("/api/health/db")
+def db_health():
+    """SQLite connection pool statistics and effective pragmas"""
+    return get_pool_stats()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000)
@@ -0,0 +1,158 @@
+"""
+Baseline schema: every table and column that init_db used to create with
+CREATE TABLE IF NOT EXISTS and ad-hoc ALTER TABLE statements. Idempotent,
+so databases created before migrations existed are adopted as version 1.
+"""
+from migrations import add_column
+
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    # Create tickets table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tickets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            description TEXT NOT NULL,
+            customer_email TEXT,
+            type TEXT DEFAULT 'general',
+            priority TEXT DEFAULT 'medium',
+            status TEXT DEFAULT 'open',
+            suggested_response TEXT,
+            confidence_score REAL,
+            final_response TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT,
+            resolved_at TEXT,
+            draft_status TEXT,
+            classification_source TEXT
+        )
+    """)
+
+    # Create knowledge_documents table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS knowledge_documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            original_filename TEXT NOT NULL,
+            content TEXT NOT NULL,
+            file_type TEXT NOT NULL,
+            chunk_count INTEGER DEFAULT 0,
+            uploaded_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create document_chunks table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS document_chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            document_id INTEGER NOT NULL,
+            chunk_index INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create accounts table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS accounts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            domain TEXT NOT NULL UNIQUE,
+            tier TEXT DEFAULT 'potential',
+            industry TEXT,
+            status TEXT DEFAULT 'active',
+            last_activity_at TEXT,
+            lead_score REAL DEFAULT 0.0,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Create customers table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT NOT NULL UNIQUE,
+            name TEXT,
+            account_id INTEGER,
+            role TEXT,
+            department TEXT,
+            last_login_at TEXT,
+            metadata TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(account_id) REFERENCES accounts(id)
+        )
+    """)
+    # Create ticket_emails table for threading
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticket_id INTEGER NOT NULL,
+            message_id TEXT,
+            sender TEXT NOT NULL,
+            subject TEXT,
+            body TEXT,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(ticket_id) REFERENCES tickets(id)
+        )
+    """)
+
+    # Create outbox table for queued outbound email
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            to_email TEXT NOT NULL,
+            subject TEXT,
+            body TEXT,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL,
+            last_error TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            sent_at TEXT
+        )
+    """)
+
+    # Create ticket_embeddings table (one float16 vector per ticket for dedup)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ticket_embeddings (
+            ticket_id INTEGER PRIMARY KEY,
+            model TEXT NOT NULL,
+            dim INTEGER NOT NULL,
+            vector BLOB NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY(ticket_id) REFERENCES tickets(id)
+        )
+    """)
+
+    # Create llm_usage table (one row per Groq completion, for cost dashboards)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS llm_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            created_at TEXT NOT NULL,
+            operation TEXT NOT NULL,
+            model TEXT,
+            lane TEXT,
+            items INTEGER DEFAULT 1,
+            prompt_tokens INTEGER DEFAULT 0,
+            completion_tokens INTEGER DEFAULT 0,
+            trimmed_tokens INTEGER DEFAULT 0,
+            latency_ms REAL,
+            estimated INTEGER DEFAULT 0
+        )
+    """)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage(created_at)")
+
+    # Columns added after the first release (already present on new databases)
+    add_column(conn, "customers", "role", "TEXT")
+    add_column(conn, "customers", "department", "TEXT")
+    add_column(conn, "customers", "last_login_at", "TEXT")
+    add_column(conn, "accounts", "status", "TEXT DEFAULT 'active'")
+    add_column(conn, "accounts", "last_activity_at", "TEXT")
+    add_column(conn, "accounts", "lead_score", "REAL DEFAULT 0.0")
+    # Background draft generation
+    add_column(conn, "tickets", "draft_status", "TEXT")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_draft_status ON tickets(draft_status)")
+    # Which classifier labelled the ticket: llm | fast_path | fallback
+    add_column(conn, "tickets", "classification_source", "TEXT")
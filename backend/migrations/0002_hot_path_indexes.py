@@ -0,0 +1,38 @@
+"""
+Indexes for the hot access paths, and a UNIQUE index on
+ticket_emails.message_id (duplicates are removed first, keeping the
+earliest row, as cleanup_duplicates.py did by hand).
+"""
+
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    # Email threading: header lookups and the per-message dedup check
+    cursor.execute("""
+        DELETE FROM ticket_emails
+        WHERE message_id IS NOT NULL AND id NOT IN (
+            SELECT MIN(id) FROM ticket_emails WHERE message_id IS NOT NULL GROUP BY message_id
+        )
+    """)
+    if cursor.rowcount:
+        print(f"Removed {cursor.rowcount} duplicate ticket_emails rows")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_ticket_emails_message_id ON ticket_emails(message_id)")
+    # Ticket detail: a ticket's emails in arrival order
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_ticket_emails_ticket_received ON ticket_emails(ticket_id, received_at)")
+
+    # Threading layer 3: a sender's open tickets, most recently active first
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_tickets_customer_status
+        ON tickets(customer_email, updated_at, status)
+    """)
+    # Ticket list (newest first, optionally by status) and daily analytics
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_created_at ON tickets(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON tickets(status, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_resolved_at ON tickets(resolved_at)")
+
+    # Knowledge base: chunks of a document, in order (delete, lexical rebuild)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_document_chunks_document ON document_chunks(document_id, chunk_index)")
+
+    # Customers of an account (account detail/list user counts, customer filter)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_account ON customers(account_id)")
@@ -0,0 +1,19 @@
+"""
+Composite indexes for keyset pagination on (created_at, id), newest first.
+SQLite appends the rowid (id) to every index, so an index ending in
+created_at serves both the ORDER BY and the (created_at, id) < (?, ?) seek.
+tickets(created_at) and tickets(status, created_at) already exist (0002).
+"""
+
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    # Ticket list filtered by type or priority
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_type_created ON tickets(type, created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tickets_priority_created ON tickets(priority, created_at)")
+
+    # Customer list, optionally by account (supersedes idx_customers_account)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_created_at ON customers(created_at)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_customers_account_created ON customers(account_id, created_at)")
+    cursor.execute("DROP INDEX IF EXISTS idx_customers_account")
@@ -0,0 +1,48 @@
+"""
+FTS5 full-text indexes, kept in sync with their tables by triggers:
+tickets_fts (title, description, final_response) and ticket_emails_fts
+(subject, body) for ranked ticket search, and a trigram customers_fts
+(name, email) for substring customer search. All three are external
+content tables, so the text itself is stored only once; existing rows
+are indexed by a 'rebuild' at the end.
+"""
+
+# (fts table, content table, indexed columns, tokenizer)
+FTS_TABLES = [
+    ("tickets_fts", "tickets", ["title", "description", "final_response"], "porter unicode61 remove_diacritics 2"),
+    ("ticket_emails_fts", "ticket_emails", ["subject", "body"], "porter unicode61 remove_diacritics 2"),
+    ("customers_fts", "customers", ["name", "email"], "trigram"),
+]
+
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    for fts, table, columns, tokenizer in FTS_TABLES:
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+
+        cursor.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(
+                {column_list}, content='{table}', content_rowid='id', tokenize='{tokenizer}'
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        """)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            END
+        """)
+        # Only edits to indexed columns touch the index (status/draft updates don't)
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF {column_list} ON {table} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {fts}(rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        """)
+        cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
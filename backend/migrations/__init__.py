@@ -0,0 +1,77 @@
+"""
+Versioned schema migrations for the SQLite helpdesk database.
+
+Each module in this package named NNNN_description.py defines
+upgrade(conn). Pending migrations are applied in version order, each in
+its own IMMEDIATE transaction together with its schema_version row, so a
+failed migration leaves the schema untouched and concurrent processes
+never apply the same one twice.
+"""
+import importlib
+import os
+import pkgutil
+import re
+import sqlite3
+from datetime import datetime
+from typing import List, Tuple
+
+MIGRATION_PATTERN = re.compile(r"^(\d{4})_(\w+)$")
+
+
+def add_column(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """ALTER TABLE ... ADD COLUMN unless the column already exists"""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def discover() -> List[Tuple[int, str]]:
+    """(version, module name) for every migration file, in order"""
+    migrations = []
+    for module in pkgutil.iter_modules([os.path.dirname(__file__)]):
+        match = MIGRATION_PATTERN.match(module.name)
+        if match:
+            migrations.append((int(match.group(1)), module.name))
+    versions = [version for version, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions: {sorted(versions)}")
+    return sorted(migrations)
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn: sqlite3.Connection) -> List[int]:
+    """Apply pending migrations; returns the versions applied"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+
+    applied = []
+    for version, name in discover():
+        if version <= current_version(conn):
+            continue
+        module = importlib.import_module(f"{__name__}.{name}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have applied it while we waited for the lock
+            if version <= current_version(conn):
+                conn.rollback()
+                continue
+            module.upgrade(conn)
+            conn.execute("INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                         (version, name, datetime.utcnow().isoformat()))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+        print(f"Applied migration {name}")
+    return applied
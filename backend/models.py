@@ -24,6 +24,12 @@ class TicketStatus(str, enum.Enum):
     RESOLVED = "resolved"
     CLOSED = "closed"
 
+class DraftStatus(str, enum.Enum):
+    PENDING = "pending"
+    GENERATING = "generating"
+    READY = "ready"
+    FAILED = "failed"
+
 @dataclass
 class Ticket:
     id: int
@@ -39,6 +45,7 @@ class Ticket:
     created_at: Optional[str] = None
     updated_at: Optional[str] = None
     resolved_at: Optional[str] = None
+    draft_status: Optional[str] = None
 
     @classmethod
     def from_row(cls, row):
@@ -56,7 +63,8 @@ class Ticket:
             final_response=row["final_response"],
             created_at=row["created_at"],
             updated_at=row["updated_at"],
-            resolved_at=row["resolved_at"]
+            resolved_at=row["resolved_at"],
+            draft_status=row["draft_status"]
         )
 
 @dataclass
@@ -1,4 +1,5 @@
 import os
+import threading
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 import certifi
@@ -33,7 +34,15 @@ def get_database():
     """Get Async Database (for FastAPI)"""
     return db.db
 
+_sync_client: MongoClient = None
+_sync_client_lock = threading.Lock()
+
 def get_sync_db():
     """Get Sync Database (for Background Threads)"""
-    client = MongoClient(MONGODB_URL, tlsCAFile=certifi.where())
-    return client[DATABASE_NAME]
+    # MongoClient is thread-safe and pools connections internally, so one
+    # instance is shared by every caller instead of reconnecting each time
+    global _sync_client
+    with _sync_client_lock:
+        if _sync_client is None:
+            _sync_client = MongoClient(MONGODB_URL, tlsCAFile=certifi.where())
+    return _sync_client[DATABASE_NAME]
@@ -2,7 +2,8 @@ from fastapi import APIRouter
 from datetime import datetime, timedelta
 from typing import List
 
-from database import get_db
+from database import get_read_db
+from services.llm_usage import summarize_llm_usage
 from models import Ticket
 from schemas import AnalyticsResponse, CategoryStats
 
@@ -11,7 +12,7 @@ router = APIRouter(prefix="/analytics", tags=["analytics"])
 @router.get("/", response_model=AnalyticsResponse)
 def get_analytics():
     """Get helpdesk analytics data"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         
         # Total tickets
@@ -96,7 +97,7 @@ def get_daily_stats(days: int = 7):
     start_date = end_date - timedelta(days=days)
     start_date_str = start_date.isoformat()
     
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         
         # Get tickets created in date range
@@ -122,3 +123,8 @@ def get_daily_stats(days: int = 7):
             "daily_created": [{"date": str(d), "count": c} for d, c in daily_created],
             "daily_resolved": [{"date": str(d), "count": c} for d, c in daily_resolved]
         }
+
+@router.get("/llm-usage")
+def get_llm_usage(days: int = 7):
+    """LLM token usage, estimated cost and prompt trimming for the past N days"""
+    return summarize_llm_usage(days)
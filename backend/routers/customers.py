@@ -1,21 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import List, Optional
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from typing import List, Optional, Union
+from database import get_read_db
 from models import Customer, Account
-from schemas import CustomerResponse, AccountResponse
+from schemas import CustomerResponse, CustomerPage, AccountResponse
+from services.pagination import keyset_clause, split_page
+from services.search_service import customer_search_clause
 import sqlite3
 
 router = APIRouter()
 
-@router.get("/customers", response_model=List[CustomerResponse])
+@router.get("/customers", response_model=Union[List[CustomerResponse], CustomerPage])
 def get_customers(
+    response: Response,
     skip: int = 0, 
     limit: int = 100, 
     search: Optional[str] = None,
-    account_id: Optional[int] = None
+    account_id: Optional[int] = None,
+    cursor: Optional[str] = None
 ):
-    with get_db() as conn:
-        cursor = conn.cursor()
+    """
+    Without `cursor`: the original skip/limit list. With `cursor` (empty for
+    the first page): newest customers first, keyset-paginated, with
+    `next_cursor` in the body and the X-Next-Cursor header.
+    """
+    with get_read_db() as conn:
+        db_cursor = conn.cursor()
         query = "SELECT * FROM customers WHERE 1=1"
         params = []
         
@@ -24,26 +33,38 @@ def get_customers(
             params.append(account_id)
             
         if search:
-            query += " AND (email LIKE ? OR name LIKE ?)"
-            params.extend([f"%{search}%", f"%{search}%"])
-            
-        query += " LIMIT ? OFFSET ?"
-        params.extend([limit, skip])
-        
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+            condition, search_params = customer_search_clause(search)
+            query += f" AND {condition}"
+            params.extend(search_params)
+
+        next_cursor = None
+        if cursor is not None:
+            condition, order, page_params = keyset_clause(cursor, limit)
+            if condition:
+                query += f" AND {condition}"
+            db_cursor.execute(f"{query} {order}", params + page_params)
+            rows, next_cursor = split_page(db_cursor.fetchall(), limit)
+        else:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit, skip])
+            db_cursor.execute(query, params)
+            rows = db_cursor.fetchall()
         
         customers = []
         for row in rows:
             customer = Customer.from_row(row)
             # Fetch account details if linked
             if customer.account_id:
-                cursor.execute("SELECT * FROM accounts WHERE id = ?", (customer.account_id,))
-                account_row = cursor.fetchone()
+                db_cursor.execute("SELECT * FROM accounts WHERE id = ?", (customer.account_id,))
+                account_row = db_cursor.fetchone()
                 if account_row:
                     customer.account = Account.from_row(account_row)
             customers.append(customer)
-            
+
+        if cursor is not None:
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return {"items": customers, "next_cursor": next_cursor}
         return customers
 
 @router.get("/accounts", response_model=List[AccountResponse])
@@ -52,7 +73,7 @@ def get_accounts(
     limit: int = 100,
     status: Optional[str] = None
 ):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         query = """
             SELECT a.*, COUNT(c.id) as user_count
@@ -106,7 +127,7 @@ def get_accounts(
 
 @router.get("/accounts/{account_id}", response_model=AccountResponse)
 def get_account_detail(account_id: int):
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("""
             SELECT a.*, COUNT(c.id) as user_count
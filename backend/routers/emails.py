@@ -1,11 +1,10 @@
-import os
-import json
 from fastapi import APIRouter
 from typing import List
 from pydantic import BaseModel
 from mongodb import get_database
 
 from services.email_service import get_email_service
+from services.email_store import get_email_store
 
 router = APIRouter(prefix="/emails", tags=["emails"])
 
@@ -23,7 +22,7 @@ class ReplyModel(BaseModel):
 
 @router.post("/send")
 async def send_email_reply(reply: ReplyModel):
-    """Send an email using the configured SMTP service"""
+    """Queue an email for delivery through the outbound SMTP workers"""
     service = get_email_service()
     success = service.send_email(
         to_email=reply.to_email,
@@ -31,8 +30,8 @@ async def send_email_reply(reply: ReplyModel):
         body=reply.body
     )
     if success:
-        return {"message": "Email sent successfully"}
-    return {"message": "Failed to send email"}, 500
+        return {"message": "Email queued for delivery"}
+    return {"message": "Failed to queue email"}, 500
     uid: str
     from_: str = "" # Pydantic alias handling might be needed if field is 'from'
     subject: str
@@ -42,27 +41,14 @@ async def send_email_reply(reply: ReplyModel):
     class Config:
         fields = {'from_': 'from'}
 
-JSON_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "emails.json")
-
-# Endpoint 1: Default (JSON)
+# Endpoint 1: Default (local email log)
 @router.get("/", response_model=List[dict])
-def get_emails_json():
-    """Get emails from JSON file (Fallback)"""
+def get_emails_json(limit: int = 100, offset: int = 0):
+    """Get a newest-first page of emails from the local append-only store"""
     try:
-        print(f"DEBUG Check Path: {JSON_FILE}")
-        print(f"DEBUG Exists? {os.path.exists(JSON_FILE)}")
-        
-        if not os.path.exists(JSON_FILE):
-            print("DEBUG: JSON File not found")
-            return []
-            
-        with open(JSON_FILE, "r") as f:
-            emails = json.load(f)
-            print(f"DEBUG: Found {len(emails)} emails")
-            # Reverse sort
-            return emails[::-1]
+        return get_email_store().page(limit=limit, offset=offset)
     except Exception as e:
-        print(f"Error reading JSON emails: {e}")
+        print(f"Error reading stored emails: {e}")
         return []
 
 # Endpoint 2: MongoDB
@@ -89,9 +75,21 @@ async def get_emails_mongo():
         print(f"Error reading MongoDB emails: {e}")
         return []
 
+@router.get("/stats/ingestion")
+def get_ingestion_stats():
+    """Get email ingestion mode, connection and latency metrics"""
+    metrics = get_email_service().get_metrics()
+    metrics["store"] = get_email_store().get_stats()
+    return metrics
+
+@router.get("/stats/outbox")
+def get_outbox_stats():
+    """Get outbound queue counts and SMTP pool statistics"""
+    return get_email_service().outbound.get_stats()
+
 @router.delete("/all")
 async def delete_all_emails():
-    """Delete ALL emails from MongoDB and JSON"""
+    """Delete ALL emails from MongoDB and the local store"""
     msg = []
     # Mongo
     try:
@@ -101,16 +99,12 @@ async def delete_all_emails():
     except Exception as e:
         msg.append(f"Mongo Error: {str(e)}")
         
-    # JSON
+    # Local store
     try:
-        if os.path.exists(JSON_FILE):
-            os.remove(JSON_FILE)
-            msg.append("Deleted JSON file")
-            # Recreate empty
-            with open(JSON_FILE, "w") as f:
-                json.dump([], f)
+        get_email_store().clear()
+        msg.append("Cleared local email store")
     except Exception as e:
-        msg.append(f"JSON Error: {str(e)}")
+        msg.append(f"Store Error: {str(e)}")
         
     return {"message": "; ".join(msg)}
 
@@ -127,18 +121,12 @@ async def delete_email(uid: str):
     except Exception as e:
         msg.append(f"Mongo Error: {str(e)}")
         
-    # Delete from JSON
+    # Delete from local store (tombstone)
     try:
-        if os.path.exists(JSON_FILE):
-            with open(JSON_FILE, "r") as f:
-                emails = json.load(f)
-            updated_emails = [e for e in emails if str(e.get("uid")) != uid]
-            if len(updated_emails) < len(emails):
-                with open(JSON_FILE, "w") as f:
-                    json.dump(updated_emails, f, indent=4)
-                msg.append("Deleted from JSON")
+        if get_email_store().delete(uid):
+            msg.append("Deleted from local store")
     except Exception as e:
-        msg.append(f"JSON Error: {str(e)}")
+        msg.append(f"Store Error: {str(e)}")
         
     if not msg:
         return {"message": "Email not found in stores"}
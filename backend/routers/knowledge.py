@@ -1,9 +1,10 @@
+import asyncio
 import os
 import uuid
 from fastapi import APIRouter, HTTPException, UploadFile, File
 from typing import List
 
-from database import get_db
+from database import get_db, get_read_db
 from models import KnowledgeDocument, DocumentChunk
 from schemas import KnowledgeDocumentResponse, KnowledgeSearchResponse, KnowledgeSearchResult
 from services.document_processor import get_document_processor
@@ -42,8 +43,8 @@ async def upload_document(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save file: {str(e)}")
     
-    # Extract text content
-    text_content = document_processor.process_file(file_path, file_ext)
+    # Extract text content (PDF parsing is blocking work; keep it off the event loop)
+    text_content = await asyncio.to_thread(document_processor.process_file, file_path, file_ext)
     if not text_content:
         os.remove(file_path)
         raise HTTPException(status_code=400, detail="Could not extract text from file")
@@ -67,19 +68,26 @@ async def upload_document(file: UploadFile = File(...)):
                 INSERT INTO document_chunks (document_id, chunk_index, content)
                 VALUES (?, ?, ?)
             """, (document_id, i, chunk_content))
-        
-        # Add to RAG index
-        rag_service.add_document(document_id, file.filename, chunks)
-        
-        # Fetch the created document
-        cursor.execute("SELECT * FROM knowledge_documents WHERE id = ?", (document_id,))
-        row = cursor.fetchone()
+
+    # Add to RAG index after the rows are committed: embedding (and waiting
+    # for RAG warm-up) must neither block the event loop nor hold the write lock
+    try:
+        await asyncio.to_thread(rag_service.add_document, document_id, file.filename, chunks)
+    except Exception as e:
+        with get_db() as conn:
+            conn.execute("DELETE FROM document_chunks WHERE document_id = ?", (document_id,))
+            conn.execute("DELETE FROM knowledge_documents WHERE id = ?", (document_id,))
+        os.remove(file_path)
+        raise HTTPException(status_code=500, detail=f"Failed to index document: {str(e)}")
+
+    with get_read_db() as conn:
+        row = conn.execute("SELECT * FROM knowledge_documents WHERE id = ?", (document_id,)).fetchone()
         return KnowledgeDocument.from_row(row)
 
 @router.get("/", response_model=List[KnowledgeDocumentResponse])
 def get_documents():
     """Get all knowledge base documents"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM knowledge_documents ORDER BY uploaded_at DESC")
         rows = cursor.fetchall()
@@ -88,7 +96,7 @@ def get_documents():
 @router.get("/{document_id}", response_model=KnowledgeDocumentResponse)
 def get_document(document_id: int):
     """Get a specific document"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM knowledge_documents WHERE id = ?", (document_id,))
         row = cursor.fetchone()
@@ -99,7 +107,7 @@ def get_document(document_id: int):
 @router.get("/{document_id}/content")
 def get_document_content(document_id: int):
     """Get the full content of a document"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM knowledge_documents WHERE id = ?", (document_id,))
         row = cursor.fetchone()
@@ -149,7 +157,7 @@ def search_knowledge_base(request: KnowledgeSearchRequest):
     """Search the knowledge base"""
     rag_service = get_rag_service()
     
-    results = rag_service.search(request.query, top_k=10)
+    results, timings = rag_service.search_with_timings(request.query, top_k=10)
     
     search_results = []
     for content, score, metadata in results:
@@ -160,7 +168,7 @@ def search_knowledge_base(request: KnowledgeSearchRequest):
             relevance_score=score
         ))
     
-    return KnowledgeSearchResponse(query=request.query, results=search_results)
+    return KnowledgeSearchResponse(query=request.query, results=search_results, timings=timings)
 
 @router.get("/stats/index")
 def get_index_stats():
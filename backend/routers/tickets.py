@@ -1,45 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Optional
+import asyncio
+import json
+import time
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Union
 from datetime import datetime
 
-from database import get_db
-from models import Ticket, TicketStatus as TicketStatusModel
+from database import get_db, get_read_db
+from models import Ticket, TicketStatus as TicketStatusModel, DraftStatus
 from schemas import (
     TicketCreate, TicketResponse, TicketUpdate, 
-    TicketApproveResponse, TicketClassification
+    TicketApproveResponse, TicketClassification, TicketPage, TicketSearchResponse
 )
 from services.groq_service import get_groq_service
 from services.rag_service import get_rag_service
-from services.ticket_service import create_ticket_logic
+from services.ticket_service import create_ticket_logic_async, PIPELINE
+from services.draft_service import get_draft_service, PIPELINE as DRAFT_PIPELINE
+from services.metrics import get_latency_metrics
+from services.pagination import keyset_clause, split_page
+from services.prompt_builder import PROMPT_CONTEXT_CANDIDATES, retrieval_query
+from services.search_service import search_tickets
 from services.email_service import get_email_service
 
 router = APIRouter(prefix="/tickets", tags=["tickets"])
 
+DRAFT_STREAM_POLL_INTERVAL = 0.5  # seconds
+DRAFT_STREAM_TIMEOUT = 120  # seconds
+DRAFT_STREAM_KEEPALIVE = 15  # seconds
+
 @router.post("/", response_model=TicketResponse)
-def create_ticket(ticket: TicketCreate):
-    """Create a new ticket with AI classification (response generated on-demand)"""
+async def create_ticket(ticket: TicketCreate):
+    """
+    Create a new ticket with AI classification. The suggested response is
+    generated in the background; follow it via /{ticket_id}/draft/stream.
+    """
     # Use the shared service logic
-    with get_db() as conn:
-        new_ticket = create_ticket_logic(
-            conn, 
-            ticket.title, 
-            ticket.description, 
-            ticket.customer_email
-        )
-        return new_ticket
+    return await create_ticket_logic_async(
+        ticket.title, 
+        ticket.description, 
+        ticket.customer_email
+    )
 
-@router.get("/", response_model=List[TicketResponse])
+@router.get("/", response_model=Union[List[TicketResponse], TicketPage])
 def get_tickets(
+    response: Response,
     status: Optional[str] = None,
     ticket_type: Optional[str] = None,
     priority: Optional[str] = None,
     limit: int = 50,
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
-    """Get all tickets with optional filters"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
+    """
+    Get all tickets with optional filters, newest first.
+    Without `cursor` this is the original offset-paginated list. Pass
+    `cursor=` (empty) for the first keyset page, then the returned
+    `next_cursor` (also in the X-Next-Cursor header) for the next one.
+    """
+    with get_read_db() as conn:
         query = "SELECT * FROM tickets WHERE 1=1"
         params = []
         
@@ -52,18 +70,67 @@ def get_tickets(
         if priority:
             query += " AND priority = ?"
             params.append(priority)
+
+        if cursor is not None:
+            condition, order, page_params = keyset_clause(cursor, limit)
+            if condition:
+                query += f" AND {condition}"
+            rows, next_cursor = split_page(conn.execute(f"{query} {order}", params + page_params).fetchall(), limit)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+            return {"items": [Ticket.from_row(row) for row in rows], "next_cursor": next_cursor}
         
         query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
         params.extend([limit, offset])
         
-        cursor.execute(query, params)
-        rows = cursor.fetchall()
+        rows = conn.execute(query, params).fetchall()
         return [Ticket.from_row(row) for row in rows]
 
+@router.get("/search", response_model=TicketSearchResponse)
+def search_ticket_content(
+    q: str = Query(..., min_length=1),
+    status: Optional[str] = None,
+    ticket_type: Optional[str] = None,
+    priority: Optional[str] = None,
+    customer_email: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Full-text search over ticket title/description/final response and the
+    ticket's emails, best match first, with a highlighted snippet per hit.
+    """
+    results = search_tickets(q, status=status, ticket_type=ticket_type, priority=priority,
+                             customer_email=customer_email, limit=limit, offset=offset)
+    return {"query": q, "results": results}
+
+@router.get("/stats/latency")
+def get_creation_latency():
+    """Per-stage latency histograms for ticket creation and background drafting"""
+    metrics = get_latency_metrics()
+    return {
+        PIPELINE: metrics.snapshot(PIPELINE),
+        DRAFT_PIPELINE: {**metrics.snapshot(DRAFT_PIPELINE), "queue": get_draft_service().get_stats()},
+    }
+
+@router.get("/stats/classification")
+def get_classification_cache_stats():
+    """Classification cache hit-rate and LLM calls saved by the local fast path"""
+    groq_service = get_groq_service()
+    return {
+        "cache": groq_service.classification_cache.get_stats(),
+        "fast_path": groq_service.fast_classifier.get_stats(),
+    }
+
+@router.get("/stats/llm")
+def get_llm_stats():
+    """Groq rate limiter, retry and circuit breaker state, with per-lane queueing time"""
+    return get_groq_service().get_stats()
+
 @router.get("/{ticket_id}", response_model=TicketResponse)
 def get_ticket(ticket_id: int):
     """Get a specific ticket by ID"""
-    with get_db() as conn:
+    with get_read_db() as conn:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,))
         row = cursor.fetchone()
@@ -85,6 +152,50 @@ def get_ticket(ticket_id: int):
         
         return ticket_data
 
+def _sse(event: str, data: str) -> str:
+    return f"event: {event}\ndata: {data}\n\n"
+
+@router.get("/{ticket_id}/draft/stream")
+async def stream_draft(ticket_id: int):
+    """
+    Server-Sent Events for a ticket's background draft: a `status` event on
+    every draft_status change, then one `draft` event carrying the ticket
+    once the draft is ready (or failed).
+    """
+    def load():
+        with get_read_db() as conn:
+            row = conn.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+            return Ticket.from_row(row) if row else None
+
+    if await asyncio.to_thread(load) is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    async def events():
+        started = last_sent = time.monotonic()
+        last_status = None
+        while time.monotonic() - started < DRAFT_STREAM_TIMEOUT:
+            ticket = await asyncio.to_thread(load)
+            if ticket is None:
+                yield _sse("error", json.dumps({"detail": "Ticket not found"}))
+                return
+            # Tickets created before background drafting have no draft_status
+            status = ticket.draft_status or DraftStatus.READY.value
+            if status != last_status:
+                last_status = status
+                last_sent = time.monotonic()
+                yield _sse("status", json.dumps({"draft_status": status}))
+            if status in (DraftStatus.READY.value, DraftStatus.FAILED.value):
+                yield _sse("draft", TicketResponse.model_validate(ticket).model_dump_json())
+                return
+            if time.monotonic() - last_sent >= DRAFT_STREAM_KEEPALIVE:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(DRAFT_STREAM_POLL_INTERVAL)
+        yield _sse("timeout", json.dumps({"draft_status": last_status}))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.patch("/{ticket_id}", response_model=TicketResponse)
 def update_ticket(ticket_id: int, ticket_update: TicketUpdate):
     """Update ticket status or response"""
@@ -199,8 +310,8 @@ def regenerate_response(ticket_id: int):
         groq_service = get_groq_service()
         rag_service = get_rag_service()
         
-        knowledge_context = rag_service.get_context_for_query(
-            f"{ticket.title} {ticket.description}"
+        knowledge_context = rag_service.search(
+            retrieval_query(ticket.title, ticket.description), top_k=PROMPT_CONTEXT_CANDIDATES
         )
         
         suggested_response, confidence = groq_service.generate_response(
@@ -220,6 +331,55 @@ def regenerate_response(ticket_id: int):
         row = cursor.fetchone()
         return Ticket.from_row(row)
 
+@router.post("/{ticket_id}/regenerate/stream")
+async def regenerate_response_stream(ticket_id: int):
+    """
+    Regenerate the AI response, streamed as Server-Sent Events: `token`
+    events carry text as it is generated, then a `done` event carries the
+    final response, its confidence and the updated ticket.
+    """
+    def load():
+        with get_db() as conn:
+            row = conn.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+            return Ticket.from_row(row) if row else None
+
+    ticket = await asyncio.to_thread(load)
+    if not ticket:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+
+    knowledge_context = await asyncio.to_thread(
+        get_rag_service().search, retrieval_query(ticket.title, ticket.description), PROMPT_CONTEXT_CANDIDATES
+    )
+
+    def events():
+        # Sync generator: Starlette iterates it in a worker thread
+        stream = get_groq_service().generate_response_stream(
+            ticket.title,
+            ticket.description,
+            ticket.type,
+            knowledge_context
+        )
+        for event in stream:
+            if event["type"] == "token":
+                yield _sse("token", json.dumps({"text": event["text"]}))
+                continue
+
+            with get_db() as conn:
+                conn.execute("""
+                    UPDATE tickets 
+                    SET suggested_response = ?, confidence_score = ?, updated_at = ?
+                    WHERE id = ?
+                """, (event["response"], event["confidence"], datetime.utcnow().isoformat(), ticket_id))
+            updated = load()
+            yield _sse("done", json.dumps({
+                "response": event["response"],
+                "confidence": event["confidence"],
+                "ticket": json.loads(TicketResponse.model_validate(updated).model_dump_json()) if updated else None,
+            }))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @router.delete("/{ticket_id}")
 def delete_ticket(ticket_id: int):
     """Delete a ticket"""
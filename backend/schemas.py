@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -52,11 +52,27 @@ class TicketResponse(BaseModel):
     created_at: datetime
     updated_at: Optional[datetime]
     resolved_at: Optional[datetime]
+    draft_status: Optional[str] = None  # pending | generating | ready | failed
     emails: List[TicketEmailResponse] = []
 
     class Config:
         from_attributes = True
 
+class TicketPage(BaseModel):
+    """Keyset-paginated tickets (returned when a `cursor` is passed)"""
+    items: List[TicketResponse]
+    next_cursor: Optional[str] = None
+
+class TicketSearchHit(BaseModel):
+    ticket: TicketResponse
+    relevance_score: float
+    snippet: str  # HTML-escaped, matches wrapped in <mark>
+    matched_in: str  # ticket | email
+
+class TicketSearchResponse(BaseModel):
+    query: str
+    results: List[TicketSearchHit]
+
 class TicketUpdate(BaseModel):
     status: Optional[TicketStatus] = None
     final_response: Optional[str] = None
@@ -88,6 +104,7 @@ class KnowledgeSearchRequest(BaseModel):
 class KnowledgeSearchResponse(BaseModel):
     query: str
     results: List[KnowledgeSearchResult]
+    timings: Optional[Dict[str, float]] = None
 
 # AI Response Schemas
 class AIGeneratedResponse(BaseModel):
@@ -155,3 +172,8 @@ class CustomerResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+class CustomerPage(BaseModel):
+    """Keyset-paginated customers (returned when a `cursor` is passed)"""
+    items: List[CustomerResponse]
+    next_cursor: Optional[str] = None
@@ -7,19 +7,19 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from services.customer_service import get_or_create_customer
 from database import init_db
+from services.email_store import get_email_store
 
 def backfill():
     print("Initializing Database...")
     init_db()
     
-    json_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'emails.json')
-    if not os.path.exists(json_path):
-        print("No emails.json found.")
+    store = get_email_store()
+    if not len(store):
+        print("No stored emails found.")
         return
 
-    print(f"Reading {json_path}...")
-    with open(json_path, "r") as f:
-        emails = json.load(f)
+    print("Reading email store...")
+    emails = store.page(limit=len(store))
 
     print(f"Found {len(emails)} emails. Processing...")
     
@@ -0,0 +1,46 @@
+import sys
+import os
+import argparse
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import get_db, init_db
+from services.rag_service import EMBEDDING_MODEL
+from services.ticket_vectors import embed_tickets
+
+def backfill(batch_size: int = 64):
+    print("Initializing Database...")
+    init_db()
+
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.id, t.title, t.description FROM tickets t
+            LEFT JOIN ticket_embeddings e ON e.ticket_id = t.id AND e.model = ?
+            WHERE e.ticket_id IS NULL
+            ORDER BY t.id
+        """, (EMBEDDING_MODEL,))
+        pending = [(row["id"], row["title"], row["description"]) for row in cursor.fetchall()]
+
+    print(f"Found {len(pending)} tickets without embeddings. Processing in batches of {batch_size}...")
+
+    count = 0
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        try:
+            # One transaction per batch so progress survives an interruption
+            with get_db() as conn:
+                embed_tickets(conn, batch)
+            count += len(batch)
+            print(f"Embedded {count}/{len(pending)} tickets")
+        except Exception as e:
+            print(f"Error embedding tickets {batch[0][0]}-{batch[-1][0]}: {e}")
+
+    print(f"Backfill Complete. Embedded {count} tickets.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embed existing tickets for threading dedup")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+    backfill(args.batch_size)
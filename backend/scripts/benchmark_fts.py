@@ -0,0 +1,114 @@
+import sys
+import os
+import argparse
+import random
+import statistics
+import tempfile
+import time
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+# Benchmark against a scratch database, never the live one (database migrates on import)
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="intellidesk-fts-"), "bench.db")
+
+from database import get_db, get_read_db, close_db_pools
+from services.search_service import customer_search_clause, search_tickets
+
+SUBJECTS = ["printer", "invoice", "password", "vpn", "laptop", "refund", "outlook", "wifi", "license", "backup",
+            "monitor", "keyboard", "payroll", "shipment", "dashboard", "firewall", "calendar", "scanner"]
+FILLER = ("the a after before cannot still again since our team user account error issue please help urgent "
+          "working broken update install reset access login server network office customer order").split()
+QUERIES = ["printer", "vpn error", "refund invoice", "passw", "firewall update urgent", "zzznotfound"]
+CUSTOMER_QUERIES = ["smith", "example.org", "ana", "zzz"]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    chosen = [rng.choice(FILLER) for _ in range(words)]
+    chosen[rng.randrange(words)] = rng.choice(SUBJECTS)
+    return " ".join(chosen)
+
+
+def populate(tickets: int, emails_per_ticket: float, customers: int, seed: int = 7):
+    rng = random.Random(seed)
+    start = time.perf_counter()
+    with get_db() as conn:
+        conn.executemany(
+            "INSERT INTO tickets (title, description, status, created_at) VALUES (?, ?, ?, ?)",
+            ((sentence(rng, 6), sentence(rng, 60), rng.choice(["open", "in_progress", "closed"]),
+              f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00")
+             for _ in range(tickets))
+        )
+        conn.executemany(
+            "INSERT INTO ticket_emails (ticket_id, message_id, sender, subject, body) VALUES (?, ?, ?, ?, ?)",
+            ((rng.randint(1, tickets), f"<bench-{i}@example.com>", "user@example.com",
+              "Re: " + sentence(rng, 5), sentence(rng, 80))
+             for i in range(int(tickets * emails_per_ticket)))
+        )
+        first = ["Ana", "Ben", "Chen", "Dana", "Eli", "Fatima", "Goran", "Hana", "Ivan", "Jia"]
+        last = ["Smith", "Garcia", "Okafor", "Novak", "Tanaka", "Silva", "Khan", "Berg", "Rossi", "Kim"]
+        conn.executemany(
+            "INSERT INTO customers (email, name) VALUES (?, ?)",
+            ((f"user{i}@{rng.choice(['example.com', 'example.org', 'corp.test'])}",
+              f"{rng.choice(first)} {rng.choice(last)}") for i in range(customers))
+        )
+    return time.perf_counter() - start
+
+
+def timed(fn, repeat: int) -> tuple:
+    """(median ms, result of the last run)"""
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def like_tickets(text: str, limit: int = 20):
+    # What an agent had before: substring scan over tickets and emails
+    clauses, params = [], []
+    for term in text.split():
+        clauses.append("""(t.title LIKE ? OR t.description LIKE ? OR t.id IN
+                          (SELECT ticket_id FROM ticket_emails WHERE subject LIKE ? OR body LIKE ?))""")
+        params.extend([f"%{term}%"] * 4)
+    with get_read_db() as conn:
+        return conn.execute(f"SELECT t.id FROM tickets t WHERE {' AND '.join(clauses)} "
+                            f"ORDER BY t.created_at DESC LIMIT ?", params + [limit]).fetchall()
+
+
+def customer_query(condition: str, params: list):
+    with get_read_db() as conn:
+        return conn.execute(f"SELECT * FROM customers WHERE {condition} LIMIT 100", params).fetchall()
+
+
+def benchmark(tickets: int, emails_per_ticket: float, customers: int, repeat: int):
+    print(f"Populating {tickets} tickets, {int(tickets * emails_per_ticket)} emails, {customers} customers "
+          f"(FTS triggers active)...")
+    print(f"Inserted in {populate(tickets, emails_per_ticket, customers):.1f}s")
+    print(f"Database size: {os.path.getsize(os.environ['DATABASE_PATH']) / 1e6:.1f} MB\n")
+
+    print(f"{'ticket query':<26}{'fts ms':>10}{'like ms':>10}{'hits':>6}")
+    for query in QUERIES:
+        fts_ms, hits = timed(lambda: search_tickets(query, limit=20), repeat)
+        like_ms, _ = timed(lambda: like_tickets(query), repeat)
+        print(f"{query:<26}{fts_ms:>10.2f}{like_ms:>10.2f}{len(hits):>6}")
+    fts_ms, hits = timed(lambda: search_tickets("printer", status="open", limit=20), repeat)
+    print(f"{'printer (status=open)':<26}{fts_ms:>10.2f}{'':>10}{len(hits):>6}")
+
+    print(f"\n{'customer query':<26}{'fts ms':>10}{'like ms':>10}{'hits':>6}")
+    for query in CUSTOMER_QUERIES:
+        fts_ms, rows = timed(lambda: customer_query(*customer_search_clause(query)), repeat)
+        like_ms, _ = timed(lambda: customer_query("(email LIKE ? OR name LIKE ?)", [f"%{query}%"] * 2), repeat)
+        print(f"{query:<26}{fts_ms:>10.2f}{like_ms:>10.2f}{len(rows):>6}")
+
+    close_db_pools()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FTS5 ticket/customer search against LIKE scans")
+    parser.add_argument("--tickets", type=int, default=100_000)
+    parser.add_argument("--emails-per-ticket", type=float, default=1.0)
+    parser.add_argument("--customers", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    benchmark(args.tickets, args.emails_per_ticket, args.customers, args.repeat)
@@ -0,0 +1,78 @@
+import sys
+import os
+import argparse
+
+import numpy as np
+
+# Add backend to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from database import get_db, init_db
+from services.fast_classifier import FastClassifier, MODEL_PATH, TYPE_THRESHOLD, PRIORITY_THRESHOLD
+
+VALID_PRIORITIES = ("critical", "high", "medium", "low")
+
+def load_samples():
+    """Tickets labelled by the LLM (fallback 'general' results and fast-path labels are skipped)"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT title, description, type, priority FROM tickets
+            WHERE type IS NOT NULL AND type != 'general'
+            AND (classification_source IS NULL OR classification_source = 'llm')
+            ORDER BY id
+        """)
+        return [
+            (row["title"], row["description"], row["type"], row["priority"])
+            for row in cursor.fetchall()
+            if row["priority"] in VALID_PRIORITIES
+        ]
+
+def report(model: FastClassifier, samples, held_out, type_threshold: float, priority_threshold: float):
+    """How many held-out tickets would skip the LLM, and how often the fast path agrees with it"""
+    predictions = [model.predict(samples[i][0], samples[i][1]) for i in held_out]
+    type_conf = np.array([p["type_confidence"] for p in predictions])
+    priority_conf = np.array([p["priority_confidence"] for p in predictions])
+    type_ok = np.array([p["type"] == samples[i][2] for p, i in zip(predictions, held_out)])
+    priority_ok = np.array([p["priority"] == samples[i][3] for p, i in zip(predictions, held_out)])
+
+    print(f"\nHeld-out tickets: {len(held_out)}")
+    print(f"Overall agreement with LLM labels: type {type_ok.mean():.1%}, priority {priority_ok.mean():.1%}")
+    print(f"\n{'type>=':>7} {'prio>=':>7} {'LLM calls saved':>16} {'type agree':>11} {'prio agree':>11}")
+    for t in sorted({0.7, 0.8, 0.9, 0.95, type_threshold}):
+        fast = (type_conf >= t) & (priority_conf >= priority_threshold)
+        saved = fast.mean() if len(fast) else 0.0
+        type_agree = f"{type_ok[fast].mean():.1%}" if fast.any() else "-"
+        prio_agree = f"{priority_ok[fast].mean():.1%}" if fast.any() else "-"
+        marker = "  <- configured" if t == type_threshold else ""
+        print(f"{t:>7.2f} {priority_threshold:>7.2f} {saved:>15.1%} {type_agree:>11} {prio_agree:>11}{marker}")
+
+def train(min_samples: int, dry_run: bool, type_threshold: float, priority_threshold: float):
+    print("Initializing Database...")
+    init_db()
+
+    samples = load_samples()
+    print(f"Loaded {len(samples)} LLM-labelled tickets.")
+    if len(samples) < min_samples:
+        print(f"Need at least {min_samples} tickets to train. Aborting.")
+        return
+
+    model, held_out = FastClassifier.train(samples)
+    print(f"Trained on {model.metadata['train']} tickets, {model.metadata['features']} features. "
+          f"Temperatures: type {model.type_head.temperature:.2f}, priority {model.priority_head.temperature:.2f}")
+    report(model, samples, held_out, type_threshold, priority_threshold)
+
+    if dry_run:
+        print("\nDry run: model not saved.")
+        return
+    model.save(MODEL_PATH)
+    print(f"\nSaved model to {os.path.abspath(MODEL_PATH)}. Restart the API to load it.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the local fast-path ticket classifier")
+    parser.add_argument("--min-samples", type=int, default=50)
+    parser.add_argument("--type-threshold", type=float, default=TYPE_THRESHOLD)
+    parser.add_argument("--priority-threshold", type=float, default=PRIORITY_THRESHOLD)
+    parser.add_argument("--dry-run", action="store_true", help="Report without saving the model")
+    args = parser.parse_args()
+    train(args.min_samples, args.dry_run, args.type_threshold, args.priority_threshold)
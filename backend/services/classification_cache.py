@@ -0,0 +1,210 @@
+"""
+Persistent cache of ticket classifications.
+
+Exact lookups are keyed by sha256(model + prompt version + normalized
+title/description). Optionally, a near-duplicate lookup matches tickets
+whose 64-bit SimHash is within a few bits of a cached one, which catches
+monitoring alerts and forwarded copies that differ only in ids, counters
+or timestamps. Entries expire after a TTL and the table is bounded with
+least-recently-used eviction.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+CACHE_DB_PATH = os.getenv("CLASSIFICATION_CACHE_PATH",
+                          os.path.join(os.path.dirname(__file__), "..", "data", "classification_cache.db"))
+CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "50000"))
+CACHE_TTL = float(os.getenv("CLASSIFICATION_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+SIMHASH_ENABLED = os.getenv("CLASSIFICATION_CACHE_SIMHASH", "true").lower() == "true"
+SIMHASH_MAX_DISTANCE = int(os.getenv("CLASSIFICATION_CACHE_SIMHASH_DISTANCE", "3"))
+
+SIMHASH_BANDS = 4  # 4 x 16-bit bands: any match within 3 bits shares at least one band
+REPLY_PREFIX_PATTERN = re.compile(r"^\s*((re|fw|fwd|aw|sv)\s*:\s*)+", re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def normalize_ticket(title: Optional[str], description: Optional[str]) -> str:
+    """Case/whitespace-insensitive form of a ticket, without reply/forward prefixes or quoted lines"""
+    title = REPLY_PREFIX_PATTERN.sub("", title or "")
+    lines = [line for line in (description or "").splitlines() if not line.lstrip().startswith(">")]
+    return WHITESPACE_PATTERN.sub(" ", f"{title}\n{' '.join(lines)}").strip().lower()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word bigrams, with digits masked so ids and counters don't matter"""
+    tokens = TOKEN_PATTERN.findall(NUMBER_PATTERN.sub("0", text))
+    features = [" ".join(pair) for pair in zip(tokens, tokens[1:])] or tokens
+    weights = [0] * 64
+    for feature in features:
+        h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _bands(value: int):
+    return [(value >> (16 * i)) & 0xFFFF for i in range(SIMHASH_BANDS)]
+
+
+def _to_signed(value: int) -> int:
+    """SQLite integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class ClassificationCache:
+    def __init__(self, path: str = CACHE_DB_PATH, max_entries: int = CACHE_MAX_ENTRIES,
+                 ttl: float = CACHE_TTL, use_simhash: bool = SIMHASH_ENABLED,
+                 max_distance: int = SIMHASH_MAX_DISTANCE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.use_simhash = use_simhash
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self.stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "expired": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One shared connection guarded by self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS classifications (
+                key TEXT PRIMARY KEY,
+                scope TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                band0 INTEGER NOT NULL,
+                band1 INTEGER NOT NULL,
+                band2 INTEGER NOT NULL,
+                band3 INTEGER NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        for i in range(SIMHASH_BANDS):
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_classifications_band{i} ON classifications(scope, band{i})"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_classifications_last_used ON classifications(last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+
+    @staticmethod
+    def make_scope(model: str, prompt_version: str) -> str:
+        return f"{model}:{prompt_version}"
+
+    @staticmethod
+    def make_key(scope: str, normalized: str) -> str:
+        return hashlib.sha256(f"{scope}\0{normalized}".encode("utf-8")).hexdigest()
+
+    def get(self, model: str, prompt_version: str, title: str, description: str) -> Optional[dict]:
+        scope = self.make_scope(model, prompt_version)
+        normalized = normalize_ticket(title, description)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT key, result, created_at FROM classifications WHERE key = ?",
+                (self.make_key(scope, normalized),)
+            ).fetchone()
+            outcome = "exact_hits"
+            if row and now - row["created_at"] > self.ttl:
+                self._conn.execute("DELETE FROM classifications WHERE key = ?", (row["key"],))
+                self._conn.commit()
+                self._count -= 1
+                self.stats["expired"] += 1
+                row = None
+            if row is None and self.use_simhash:
+                row = self._near_duplicate(scope, simhash(normalized), now)
+                outcome = "near_hits"
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+
+            self._conn.execute("UPDATE classifications SET last_used = ? WHERE key = ?", (now, row["key"]))
+            self._conn.commit()
+            self.stats[outcome] += 1
+            return json.loads(row["result"])
+
+    def _near_duplicate(self, scope: str, fingerprint: int, now: float):
+        """Closest unexpired entry within max_distance bits (caller holds the lock)"""
+        bands = _bands(fingerprint)
+        clauses = " OR ".join(f"band{i} = ?" for i in range(SIMHASH_BANDS))
+        candidates = self._conn.execute(
+            f"SELECT key, result, simhash FROM classifications WHERE scope = ? AND created_at >= ? AND ({clauses})",
+            [scope, now - self.ttl] + bands
+        ).fetchall()
+        best, best_distance = None, self.max_distance + 1
+        for row in candidates:
+            distance = bin((row["simhash"] & 0xFFFFFFFFFFFFFFFF) ^ fingerprint).count("1")
+            if distance < best_distance:
+                best, best_distance = row, distance
+        return best
+
+    def put(self, model: str, prompt_version: str, title: str, description: str, result: dict):
+        scope = self.make_scope(model, prompt_version)
+        normalized = normalize_ticket(title, description)
+        fingerprint = simhash(normalized)
+        now = time.time()
+        key = self.make_key(scope, normalized)
+        with self._lock:
+            exists = self._conn.execute("SELECT 1 FROM classifications WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("""
+                INSERT OR REPLACE INTO classifications
+                    (key, scope, simhash, band0, band1, band2, band3, result, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [key, scope, _to_signed(fingerprint)] + _bands(fingerprint) + [json.dumps(result), now, now])
+            self._conn.commit()
+            if not exists:
+                self._count += 1
+            self.stats["stores"] += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self):
+        """Drop expired entries, then the least recently used tenth (caller holds the lock)"""
+        cursor = self._conn.execute("DELETE FROM classifications WHERE created_at < ?", (time.time() - self.ttl,))
+        self.stats["expired"] += cursor.rowcount
+        self._count -= cursor.rowcount
+        excess = self._count - int(self.max_entries * 0.9)
+        if excess > 0:
+            self._conn.execute("""
+                DELETE FROM classifications WHERE key IN (
+                    SELECT key FROM classifications ORDER BY last_used ASC LIMIT ?
+                )
+            """, (excess,))
+            self._count -= excess
+            self.stats["evictions"] += excess
+        self._conn.commit()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            hits = stats["exact_hits"] + stats["near_hits"]
+            lookups = hits + stats["misses"]
+            stats.update({
+                "entries": self._count,
+                "simhash_enabled": self.use_simhash,
+                "hit_rate": round(hits / lookups, 4) if lookups else None,
+            })
+        return stats
+
+
+# Singleton instance
+_classification_cache = None
+_classification_cache_lock = threading.Lock()
+
+def get_classification_cache() -> ClassificationCache:
+    global _classification_cache
+    with _classification_cache_lock:
+        if _classification_cache is None:
+            _classification_cache = ClassificationCache()
+    return _classification_cache
@@ -0,0 +1,175 @@
+"""
+Background generation of suggested responses ("drafts").
+
+Ticket creation stores the ticket with draft_status='pending' and hands
+its id to this service. Workers retrieve knowledge base context, ask Groq
+for a draft, apply the auto-send rule and write the result back. The
+status lives in the tickets table, so pending drafts survive a restart.
+"""
+import os
+import time
+from datetime import datetime
+
+from database import get_db
+from models import DraftStatus, TicketStatus
+from services.groq_service import get_groq_service
+from services.ingestion_pipeline import IngestionPipeline
+from services.llm_guard import BACKGROUND
+from services.metrics import get_latency_metrics
+from services.prompt_builder import PROMPT_CONTEXT_CANDIDATES, retrieval_query
+from services.rag_service import get_rag_service
+
+DRAFT_WORKERS = int(os.getenv("DRAFT_WORKERS", "2"))
+DRAFT_QUEUE_SIZE = int(os.getenv("DRAFT_QUEUE_SIZE", "500"))  # per worker
+AUTO_SEND_CONFIDENCE = 0.8
+
+# Histogram namespace for per-stage latency (see GET /api/tickets/stats/latency)
+PIPELINE = "draft_generation"
+
+
+class DraftService:
+    def __init__(self):
+        self.pipeline = IngestionPipeline(self._handle_job, workers=DRAFT_WORKERS,
+                                          queue_size=DRAFT_QUEUE_SIZE, name="draft")
+
+    def start(self):
+        if self.pipeline.running:
+            return
+        self.pipeline.start()
+        self._requeue_unfinished()
+
+    def stop(self):
+        self.pipeline.stop()
+
+    def enqueue(self, ticket_id: int):
+        self.pipeline.submit(str(ticket_id), (ticket_id, time.time()))
+
+    def _requeue_unfinished(self):
+        """Pick up drafts interrupted by a restart"""
+        with get_db() as conn:
+            conn.execute("UPDATE tickets SET draft_status = ? WHERE draft_status = ?",
+                         (DraftStatus.PENDING.value, DraftStatus.GENERATING.value))
+            rows = conn.execute("SELECT id FROM tickets WHERE draft_status = ? ORDER BY id",
+                                (DraftStatus.PENDING.value,)).fetchall()
+        for row in rows:
+            self.enqueue(row["id"])
+        if rows:
+            print(f"Draft queue: re-queued {len(rows)} pending drafts.")
+
+    def _set_status(self, ticket_id: int, status: DraftStatus):
+        with get_db() as conn:
+            conn.execute("UPDATE tickets SET draft_status = ? WHERE id = ?", (status.value, ticket_id))
+
+    def _handle_job(self, job):
+        ticket_id, enqueued_at = job
+        metrics = get_latency_metrics()
+        metrics.observe(PIPELINE, "queue_wait", time.time() - enqueued_at)
+        start = time.perf_counter()
+        try:
+            self.generate_draft(ticket_id)
+        except Exception:
+            self._set_status(ticket_id, DraftStatus.FAILED)
+            raise
+        finally:
+            metrics.observe(PIPELINE, "total", time.perf_counter() - start)
+
+    def generate_draft(self, ticket_id: int):
+        """Retrieve context, generate a suggested response and auto-send it if confident"""
+        metrics = get_latency_metrics()
+
+        with get_db() as conn:
+            row = conn.execute("SELECT * FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+            if not row or row["draft_status"] not in (DraftStatus.PENDING.value, DraftStatus.GENERATING.value):
+                return
+            conn.execute("UPDATE tickets SET draft_status = ? WHERE id = ?",
+                         (DraftStatus.GENERATING.value, ticket_id))
+
+        title, description, customer_email = row["title"], row["description"], row["customer_email"]
+        rag_service = get_rag_service()
+
+        # Perform RAG search to get context (off the request path, so waiting for warm-up is fine)
+        with metrics.timer(PIPELINE, "retrieve"):
+            rag_service.wait_until_ready()
+            context_chunks = rag_service.search(retrieval_query(title, description), top_k=PROMPT_CONTEXT_CANDIDATES)
+
+        # Generate response
+        with metrics.timer(PIPELINE, "generate"):
+            suggested_response, response_confidence = get_groq_service().generate_response(
+                title,
+                description,
+                row["type"],
+                context=context_chunks,
+                lane=BACKGROUND
+            )
+
+        # AUTO-SEND LOGIC (only while nobody has picked the ticket up)
+        final_response = None
+        if suggested_response and customer_email and row["status"] == TicketStatus.OPEN.value:
+            # Check Confidence Threshold > 0.8 (User Request)
+            confidence = row["confidence_score"] or 0
+
+            if confidence > AUTO_SEND_CONFIDENCE:
+                try:
+                    from services.email_service import get_email_service
+                    subject = f"Re: {title}"
+                    body = f"Hello,\n\n{suggested_response}\n\nBest regards,\nIntelliDesk AI"
+
+                    # Generation takes seconds; an agent may have approved or resolved the
+                    # ticket meanwhile. Resolving only a still-open ticket and queueing the
+                    # email in the same transaction means exactly one reply goes out.
+                    with metrics.timer(PIPELINE, "auto_send"), get_db() as conn:
+                        resolved = conn.execute("""
+                            UPDATE tickets
+                            SET suggested_response = ?, final_response = ?, status = ?, resolved_at = ?,
+                                draft_status = ?
+                            WHERE id = ? AND status = ?
+                        """, (suggested_response, suggested_response, TicketStatus.RESOLVED.value,
+                              datetime.utcnow().isoformat(), DraftStatus.READY.value, ticket_id,
+                              TicketStatus.OPEN.value)).rowcount == 1
+                        if resolved:
+                            if not get_email_service().send_email(customer_email, subject, body):
+                                raise RuntimeError("could not queue the email")
+                            final_response = suggested_response
+                    if resolved:
+                        print(f"Auto-sent response to {customer_email} (Confidence: {confidence:.2f})")
+                    else:
+                        print(f"Ticket {ticket_id} was picked up during generation. Not auto-sending.")
+                except Exception as e:
+                    print(f"Failed to auto-send response: {e}")
+            else:
+                print(f"Confidence {confidence:.2f} <= 0.8. Holding for manual approval.")
+
+        if not final_response:
+            with get_db() as conn:
+                # Keep a suggestion written by a concurrent regenerate
+                conn.execute("""
+                    UPDATE tickets
+                    SET suggested_response = CASE WHEN suggested_response IS ? THEN ? ELSE suggested_response END,
+                        draft_status = ?
+                    WHERE id = ?
+                """, (row["suggested_response"], suggested_response, DraftStatus.READY.value, ticket_id))
+
+        # Learning Loop: Add auto-resolved answers to RAG
+        if final_response:
+            try:
+                with metrics.timer(PIPELINE, "learn"):
+                    rag_service.add_knowledge_pair(
+                        question=f"{title}\n{description}",
+                        answer=final_response,
+                        source_id=f"ticket_{ticket_id}"
+                    )
+            except Exception as rag_err:
+                print(f"Learning Loop Error: {rag_err}")
+
+    def get_stats(self) -> dict:
+        return self.pipeline.get_metrics()
+
+
+# Singleton instance
+_draft_service = None
+
+def get_draft_service() -> DraftService:
+    global _draft_service
+    if _draft_service is None:
+        _draft_service = DraftService()
+    return _draft_service
@@ -3,153 +3,456 @@ import time
 import os
 import threading
 import asyncio
-import smtplib
 import re
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from imap_tools import MailBox, AND
-from database import get_db
-from services.ticket_service import create_ticket_logic
+import random
+from concurrent.futures import ThreadPoolExecutor
+from pymongo import UpdateOne
+from imap_tools import MailBox, MailBoxUnencrypted, AND, U
+from database import get_read_db
+from services.ticket_service import create_ticket_logic, ticket_title
+from services.groq_service import CLASSIFY_BATCH_SIZE, get_groq_service
+from services.llm_guard import BACKGROUND
 from mongodb import get_sync_db
 from services.customer_service import get_or_create_customer
 from services.email_threading_service import get_threading_service
+from services.email_store import get_email_store
+from services.ingestion_pipeline import IngestionPipeline
+from services.outbound_mail import OutboundMailService
 
 # Credentials
 EMAIL = os.getenv("EMAIL_USER", "aglo.intellidesk.ai@gmail.com")
 APP_PASSWORD = os.getenv("EMAIL_PASSWORD", "vswn gtvy jeoi ypah")
 IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
-JSON_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "emails.json")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "993"))
+IMAP_SSL = os.getenv("IMAP_SSL", "true").lower() != "false"  # "false" for a local plaintext IMAP stand-in
+IMAP_FOLDER = os.getenv("IMAP_FOLDER", "INBOX")
+# Per-mailbox UIDVALIDITY, highest fetched UID and the UIDs not yet processed
+STATE_FILE = os.path.join(os.path.dirname(__file__), "..", "data", "imap_state.json")
 CHECK_INTERVAL = 5
 
+# "idle" (push, falls back to polling if unsupported) or "poll"
+INGEST_MODE = os.getenv("EMAIL_INGEST_MODE", "idle").lower()
+IDLE_TIMEOUT = int(os.getenv("IMAP_IDLE_TIMEOUT", "300"))  # RFC 2177 asks clients to re-IDLE before 29 min
+RECONNECT_BACKOFF_MIN = 1
+RECONNECT_BACKOFF_MAX = 300
+BOOTSTRAP_LIMIT = 20  # messages to ingest when no watermark exists yet
+FETCH_BULK_SIZE = 50  # messages per UID FETCH command
+# Backlog (queued + just fetched) at which new-thread emails are classified in batches
+BATCH_CLASSIFY_BACKLOG = int(os.getenv("INGEST_BATCH_CLASSIFY_BACKLOG", "8"))
+
 class EmailIngestionService:
-    def __init__(self):
+    def __init__(self, mailbox_factory=None):
         self.running = False
         self.thread = None
         self.db = get_sync_db()
-        os.makedirs(os.path.dirname(JSON_FILE), exist_ok=True)
+        # Injectable so the loop can be driven against a local IMAP stand-in
+        self.mailbox_factory = mailbox_factory or self._open_mailbox
+        self._stop_event = threading.Event()
+        self._cycle_completed = False
+        self.metrics = {
+            "mode": None,
+            "connected": False,
+            "connects": 0,
+            "reconnects": 0,
+            "idle_wakeups": 0,
+            "emails_ingested": 0,
+            "last_ingest_latency_s": None,
+            "avg_ingest_latency_s": None,
+            "max_ingest_latency_s": None,
+        }
+        self._latency_total = 0.0
+        self._latency_count = 0
+        self._metrics_lock = threading.Lock()
+        # Threading + ticket creation run on a worker pool, sharded by sender
+        self.pipeline = IngestionPipeline(self._handle_job)
+        self.outbound = OutboundMailService(EMAIL, APP_PASSWORD)
+        # Mongo mirror writes happen off the ingest path, one batch per cycle
+        self._mongo_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mongo-mirror")
+        self._mongo_index_ready = False
+        self.store = get_email_store()
+        self._state_lock = threading.Lock()
+        self._resume_pending = True  # re-queue UIDs left unprocessed by the last run
+        os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
         
     def start(self):
         if self.running: return
         print("Starting Email Ingestion Service...")
         self.running = True
-        self.thread = threading.Thread(target=self._poll_emails, daemon=True)
+        self._resume_pending = True
+        self._stop_event.clear()
+        self.outbound.start()
+        self.pipeline.start()
+        self.thread = threading.Thread(target=self._run, daemon=True)
         self.thread.start()
 
     def stop(self):
         self.running = False
+        self._stop_event.set()
         if self.thread:
             self.thread.join(timeout=1)
-            
-    def _poll_emails(self):
+        dropped = self.pipeline.stop()
+        if dropped:
+            print(f"{len(dropped)} queued emails stay pending and are re-queued on the next start")
+        self.outbound.stop()
+
+    def get_metrics(self) -> dict:
+        """Snapshot of ingestion counters, arrival-to-ingestion latency and queue depth"""
+        with self._metrics_lock:
+            metrics = dict(self.metrics)
+        metrics["pipeline"] = self.pipeline.get_metrics()
+        return metrics
+
+    def _open_mailbox(self):
+        """Open and authenticate a single IMAP session"""
+        mailbox_cls = MailBox if IMAP_SSL else MailBoxUnencrypted
+        return mailbox_cls(IMAP_SERVER, IMAP_PORT).login(EMAIL, APP_PASSWORD, initial_folder=IMAP_FOLDER)
+
+    def _supports_idle(self, mailbox) -> bool:
+        capabilities = getattr(mailbox.client, "capabilities", ()) or ()
+        return "IDLE" in [str(c).upper() for c in capabilities]
+
+    def _update_metrics(self, increment: str = None, **values):
+        with self._metrics_lock:
+            if increment:
+                self.metrics[increment] += 1
+            self.metrics.update(values)
+
+    def _run(self):
+        """
+        Hold one authenticated session open for as long as possible.
+        Uses IMAP IDLE when the server advertises it, otherwise polls every
+        CHECK_INTERVAL seconds on the same session. Any failure drops the
+        session and reconnects with jittered exponential backoff; the backoff
+        only resets once a session has completed an ingest cycle, so a
+        failure that recurs right after login doesn't re-login in a tight loop.
+        """
         print(f"Listening for new emails from {EMAIL}...")
+        backoff = RECONNECT_BACKOFF_MIN
         while self.running:
+            self._cycle_completed = False
             try:
-                # 1. MongoDB Collection
-                collection = self.db['Email-Store']
-
-                # 2. Load JSON Store
-                try:
-                    with open(JSON_FILE, "r") as f:
-                        saved_emails = json.load(f)
-                except (FileNotFoundError, json.JSONDecodeError):
-                    saved_emails = []
-                
-                saved_uids_json = {mail.get("uid") for mail in saved_emails if mail.get("uid")}
-
-                new_emails = False
-                with MailBox(IMAP_SERVER).login(EMAIL, APP_PASSWORD) as mailbox:
-                    # Fetch last 20 messages, newest first
-                    for msg in mailbox.fetch(limit=20, reverse=True):
-                        body = msg.text or msg.html or ""
-                        clean_from = self._extract_email_address(msg.from_)
-                        
-                        # Data Object
-                        email_data = {
-                            "uid": msg.uid,
-                            "from": msg.from_ or "",
-                            "clean_from": clean_from,
-                            "subject": msg.subject or "",
-                            "date": msg.date.isoformat() if msg.date else None,
-                            "body": body[:500] + "..." if len(body) > 500 else body
-                        }
-
-                        # --- Store in MongoDB ---
-                        if not collection.find_one({"uid": msg.uid}):
-                            try:
-                                collection.insert_one(email_data.copy())
-                                print(f"Stored in MongoDB: {msg.subject}")
-                            except Exception as e:
-                                print(f"Mongo Insert Error: {e}")
-
-                        # --- Store in JSON & Process Threading ---
-                        if msg.uid not in saved_uids_json:
-                            saved_emails.append(email_data)
-                            saved_uids_json.add(msg.uid)
-                            new_emails = True
-                            
-                            print("-" * 40)
-                            print("New Email Ingested (JSON):")
-                            print("From:", email_data["from"])
-                            print("Subject:", email_data["subject"])
-                            
-                            # --- Threading & Ticket Logic ---
-                            try:
-                                # 1. Identify/Create Customer
-                                customer = get_or_create_customer(email=clean_from, name=clean_from.split("@")[0])
-                                
-                                # 2. Resolve Thread
-                                threading_service = get_threading_service()
-                                
-                                email_event = {
-                                    "message_id": msg.uid,
-                                    "in_reply_to": msg.headers.get("in-reply-to", [])[0] if msg.headers.get("in-reply-to") else None,
-                                    "references": msg.headers.get("references", []),
-                                    "from_email": clean_from,
-                                    "subject": msg.subject or "",
-                                    "body": body
-                                }
-                                
-                                resolution = threading_service.resolve_ticket(email_event)
-                                
-                                # Use Action field (Preferred) or fallback to ticket_id check
-                                action = resolution.get("action")
-                                ticket_id = resolution.get("ticket_id")
-                                
-                                if action == "update" and ticket_id:
-                                    print(f"Matched to Existing Ticket #{ticket_id} ({resolution['matched_by']}) - Confidence: {resolution['confidence']}")
-                                    threading_service.save_email_to_ticket(ticket_id, email_event)
-                                else:
-                                    print(f"No match found ({resolution.get('matched_by', 'new')}). Creating New Ticket...")
-                                    with get_db() as conn:
-                                        ticket = create_ticket_logic(
-                                            conn,
-                                            title=msg.subject,
-                                            description=body,
-                                            customer_email=customer.email # Use identified customer email
-                                        )
-                                        ticket_id = ticket['id']
-                                        print(f"Ticket Created: ID {ticket_id} - {ticket['title']}")
-                                        
-                                        # Save first email to thread
-                                        threading_service.save_email_to_ticket(ticket_id, email_event)
-                            
-                            except Exception as ticket_error:
-                                print(f"Failed to process email/ticket: {ticket_error}")
-                                import traceback
-                                traceback.print_exc()
-
-                            print("-" * 40)
-
-                if new_emails:
-                    with open(JSON_FILE, "w") as f:
-                        json.dump(saved_emails, f, indent=4)
-                        
+                with self.mailbox_factory() as mailbox:
+                    self._update_metrics("connects", connected=True)
+
+                    if INGEST_MODE == "idle" and self._supports_idle(mailbox):
+                        self._update_metrics(mode="idle")
+                        self._idle_loop(mailbox)
+                    else:
+                        if INGEST_MODE == "idle":
+                            print("IMAP server does not support IDLE. Falling back to polling.")
+                        self._update_metrics(mode="poll")
+                        self._poll_loop(mailbox)
+            except Exception as e:
+                print(f"Email Ingestion Error: {e}")
+            finally:
+                self._update_metrics(connected=False)
+
+            if not self.running:
+                break
+            if self._cycle_completed:
+                backoff = RECONNECT_BACKOFF_MIN
+            self._update_metrics("reconnects")
+            delay = backoff * random.uniform(0.5, 1.0)
+            print(f"Reconnecting to IMAP in {delay:.1f}s...")
+            self._stop_event.wait(delay)
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+
+    def _ingest_cycle(self, mailbox, notified_at: float = None):
+        self._ingest_new(mailbox, notified_at=notified_at)
+        self._cycle_completed = True
+
+    def _idle_loop(self, mailbox):
+        # Catch up on anything that arrived while we were disconnected
+        self._ingest_cycle(mailbox)
+        while self.running:
+            # IDLE is re-issued every IDLE_TIMEOUT seconds to keep the session alive
+            responses = mailbox.idle.wait(timeout=IDLE_TIMEOUT)
+            if not self.running:
+                break
+            if responses:
+                self._update_metrics("idle_wakeups")
+                self._ingest_cycle(mailbox, notified_at=time.time())
+
+    def _poll_loop(self, mailbox):
+        while self.running:
+            self._ingest_cycle(mailbox)
+            if self._stop_event.wait(CHECK_INTERVAL):
+                break
+            # NOOP lets the server report new messages on the open session
+            mailbox.client.noop()
+
+    def _record_latency(self, seconds: float):
+        seconds = max(seconds, 0.0)
+        with self._metrics_lock:
+            self._latency_total += seconds
+            self._latency_count += 1
+            self.metrics["emails_ingested"] = self._latency_count
+            self.metrics["last_ingest_latency_s"] = round(seconds, 3)
+            self.metrics["avg_ingest_latency_s"] = round(self._latency_total / self._latency_count, 3)
+            previous_max = self.metrics["max_ingest_latency_s"] or 0.0
+            self.metrics["max_ingest_latency_s"] = round(max(previous_max, seconds), 3)
+
+    def _watermark_key(self) -> str:
+        return f"{EMAIL}@{IMAP_SERVER}/{IMAP_FOLDER}"
+
+    def _load_watermark(self) -> dict:
+        try:
+            with open(STATE_FILE, "r") as f:
+                return json.load(f).get(self._watermark_key())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _update_state(self, update):
+        """Apply update(entry) to this mailbox's state entry and save it atomically"""
+        with self._state_lock:
+            try:
+                with open(STATE_FILE, "r") as f:
+                    state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = {}
+            entry = state.get(self._watermark_key()) or {}
+            update(entry)
+            state[self._watermark_key()] = entry
+            # Write-then-rename so a crash never leaves a truncated state file
+            tmp_path = STATE_FILE + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(state, f, indent=4)
+            os.replace(tmp_path, STATE_FILE)
+
+    def _record_pending(self, uidvalidity: int, uids: list, last_uid: int = None):
+        """Advance the watermark and remember `uids` as fetched but not yet processed"""
+        def update(entry):
+            pending = set(entry.get("pending", [])) if entry.get("uidvalidity") == uidvalidity else set()
+            entry["uidvalidity"] = uidvalidity
+            if last_uid is not None:
+                entry["last_uid"] = last_uid
+            entry["pending"] = sorted(pending | set(uids), key=int)
+        self._update_state(update)
+
+    def _mark_processed(self, uids: list):
+        done = set(uids)
+        def update(entry):
+            entry["pending"] = [uid for uid in entry.get("pending", []) if uid not in done]
+        self._update_state(update)
+
+    def _pending_uids(self, uidvalidity: int) -> list:
+        watermark = self._load_watermark()
+        if watermark and watermark.get("uidvalidity") == uidvalidity:
+            return list(watermark.get("pending", []))
+        return []
+
+    def _find_new_uids(self, mailbox, store):
+        """
+        Return (uidvalidity, new_uids) using the persisted watermark.
+        Only STATUS and UID SEARCH are sent to the server; no message data
+        is transferred until the caller fetches the returned UIDs.
+        """
+        status = mailbox.folder.status(IMAP_FOLDER, ["UIDVALIDITY", "UIDNEXT"])
+        uidvalidity = status.get("UIDVALIDITY")
+        uid_next = status.get("UIDNEXT")
+
+        watermark = self._load_watermark()
+        if watermark and watermark.get("uidvalidity") == uidvalidity:
+            last_uid = watermark["last_uid"]
+        elif watermark is None and store.max_uid() is not None:
+            # First run with an existing store: resume after the newest stored UID
+            last_uid = store.max_uid()
+        else:
+            # No usable watermark (fresh install or UIDVALIDITY changed):
+            # bootstrap from the most recent messages only
+            all_uids = mailbox.uids()
+            candidates = all_uids[-BOOTSTRAP_LIMIT:]
+            return uidvalidity, [uid for uid in candidates if uid not in store]
+
+        if uid_next is not None and uid_next <= last_uid + 1:
+            return uidvalidity, []
+
+        # "N:*" always matches the highest UID, so filter on our side too
+        uids = mailbox.uids(AND(uid=U(last_uid + 1, "*")))
+        return uidvalidity, [uid for uid in uids if int(uid) > last_uid and uid not in store]
+
+    def _mirror_to_mongo(self, emails: list):
+        """Upsert a cycle's emails into Email-Store with one unordered bulk write"""
+        collection = self.db['Email-Store']
+        if not self._mongo_index_ready:
+            try:
+                collection.create_index("uid", unique=True)
             except Exception as e:
-                print(f"Email Polling Error: {e}")
+                # e.g. legacy duplicate uids; upserts below still avoid new duplicates
+                print(f"Mongo Index Error: {e}")
+            self._mongo_index_ready = True
+        try:
+            result = collection.bulk_write(
+                [UpdateOne({"uid": email["uid"]}, {"$setOnInsert": email}, upsert=True) for email in emails],
+                ordered=False
+            )
+            print(f"Stored {result.upserted_count} new emails in MongoDB")
+        except Exception as e:
+            print(f"Mongo Bulk Write Error: {e}")
+
+    def _ingest_new(self, mailbox, notified_at: float = None):
+        # Append-only email store (in-memory UID index)
+        uidvalidity, new_uids = self._find_new_uids(mailbox, self.store)
+        # Emails the last run stored but never finished (still queued at shutdown, crash, failure)
+        resume_uids = []
+        if self._resume_pending:
+            resume_uids = [uid for uid in self._pending_uids(uidvalidity) if uid not in new_uids]
+        if not new_uids and not resume_uids:
+            self._resume_pending = False
+            return
+
+        # Recorded before anything is stored or queued: until a worker has
+        # processed an email, a restart fetches and queues it again
+        if new_uids:
+            self._record_pending(uidvalidity, new_uids, last_uid=max(int(uid) for uid in new_uids))
+
+        mongo_batch = []
+        jobs = []
+        resumed = set(resume_uids)
+        fetched = set()
+
+        # Oldest first so replies are threaded after the mail they answer
+        fetch_uids = sorted(set(new_uids) | resumed, key=int)
+        for msg in mailbox.fetch(uid_list=fetch_uids, bulk=FETCH_BULK_SIZE):
+            fetched.add(msg.uid)
+            body = msg.text or msg.html or ""
+            clean_from = self._extract_email_address(msg.from_)
+
+            if msg.uid in resumed:
+                if self._already_threaded(msg.uid):
+                    # Processed, but the run ended before it was marked done
+                    self._mark_processed([msg.uid])
+                else:
+                    print(f"Re-queueing unprocessed email UID {msg.uid}")
+                    jobs.append((msg, body, clean_from, None))
+                continue
+            
+            # Data Object
+            email_data = {
+                "uid": msg.uid,
+                "from": msg.from_ or "",
+                "clean_from": clean_from,
+                "subject": msg.subject or "",
+                "date": msg.date.isoformat() if msg.date else None,
+                "body": body[:500] + "..." if len(body) > 500 else body
+            }
+
+            # --- Queue for MongoDB mirror ---
+            mongo_batch.append(email_data.copy())
+
+            # --- Store in email log & Process Threading ---
+            if msg.uid not in self.store:
+                self.store.append([email_data])
+                
+                print("-" * 40)
+                print("New Email Ingested:")
+                print("From:", email_data["from"])
+                print("Subject:", email_data["subject"])
+                
+                print("-" * 40)
+
+                jobs.append((msg, body, clean_from, notified_at))
+
+        # Deleted from the server since they were listed: nothing left to process
+        gone = [uid for uid in fetch_uids if uid not in fetched]
+        if gone:
+            self._mark_processed(gone)
+        self._resume_pending = False
+
+        # Under a burst, classify a chunk in one LLM call before its workers need it
+        batching = self.pipeline.depth() + len(jobs) >= BATCH_CLASSIFY_BACKLOG
+        for start in range(0, len(jobs), CLASSIFY_BATCH_SIZE):
+            chunk = jobs[start:start + CLASSIFY_BATCH_SIZE]
+            if batching:
+                self._preclassify(chunk)
+            for job in chunk:
+                # Blocks when this sender's worker is saturated (backpressure)
+                self.pipeline.submit(job[2], job)
+
+        if mongo_batch:
+            self._mongo_writer.submit(self._mirror_to_mongo, mongo_batch)
+
+        self.store.maybe_compact()
+
+    def _already_threaded(self, uid: str) -> bool:
+        """Saving the email to its ticket is the last step of _process_email"""
+        with get_read_db() as conn:
+            return conn.execute("SELECT 1 FROM ticket_emails WHERE message_id = ?", (uid,)).fetchone() is not None
+
+    def _preclassify(self, jobs: list):
+        """
+        Batch-classify emails that look like new threads. Results land in the
+        classification cache, where create_ticket_logic picks them up.
+        """
+        tickets = [
+            (ticket_title(msg.subject, body), body)
+            for msg, body, _, _ in jobs
+            if not msg.headers.get("in-reply-to") and not msg.headers.get("references")
+        ]
+        if len(tickets) < 2:
+            return
+        try:
+            get_groq_service().classify_tickets_batch(tickets, lane=BACKGROUND)
+        except Exception as e:
+            print(f"Batch pre-classification failed: {e}")
+
+    def _handle_job(self, job):
+        msg, body, clean_from, notified_at = job
+        self._process_email(msg, body, clean_from)
+        # Only now is the email done; a failure above leaves it pending for the next start
+        self._mark_processed([msg.uid])
+
+        # Arrival is the IDLE notification when we have one, else the Date header
+        if notified_at is not None:
+            self._record_latency(time.time() - notified_at)
+        elif msg.date and msg.date.tzinfo:
+            self._record_latency(time.time() - msg.date.timestamp())
+
+    def _process_email(self, msg, body: str, clean_from: str):
+        """Thread the email onto an existing ticket or create a new one"""
+        try:
+            # 1. Identify/Create Customer
+            customer = get_or_create_customer(email=clean_from, name=clean_from.split("@")[0])
+            
+            # 2. Resolve Thread
+            threading_service = get_threading_service()
+            
+            email_event = {
+                "message_id": msg.uid,
+                "in_reply_to": msg.headers.get("in-reply-to", [])[0] if msg.headers.get("in-reply-to") else None,
+                "references": msg.headers.get("references", []),
+                "from_email": clean_from,
+                "subject": msg.subject or "",
+                "body": body
+            }
             
-            for _ in range(CHECK_INTERVAL):
-                if not self.running: break
-                time.sleep(1)
+            resolution = threading_service.resolve_ticket(email_event)
+            
+            # Use Action field (Preferred) or fallback to ticket_id check
+            action = resolution.get("action")
+            ticket_id = resolution.get("ticket_id")
+            
+            if action == "update" and ticket_id:
+                print(f"Matched to Existing Ticket #{ticket_id} ({resolution['matched_by']}) - Confidence: {resolution['confidence']}")
+                threading_service.save_email_to_ticket(ticket_id, email_event)
+            else:
+                print(f"No match found ({resolution.get('matched_by', 'new')}). Creating New Ticket...")
+                # The first email is stored in the ticket's own transaction: a retry
+                # after a crash finds it (_already_threaded) instead of opening a second ticket
+                ticket = create_ticket_logic(
+                    title=msg.subject,
+                    description=body,
+                    customer_email=customer.email, # Use identified customer email
+                    first_email=email_event
+                )
+                ticket_id = ticket['id']
+                print(f"Ticket Created: ID {ticket_id} - {ticket['title']}")
+        
+        except Exception as ticket_error:
+            print(f"Failed to process email/ticket: {ticket_error}")
+            import traceback
+            traceback.print_exc()
+            raise
 
     def _extract_email_address(self, raw_from: str) -> str:
         if not raw_from: return ""
@@ -160,22 +463,13 @@ class EmailIngestionService:
         return raw_from.strip()
 
     def send_email(self, to_email: str, subject: str, body: str):
+        """Queue an email for background delivery; returns once it is durably enqueued"""
         if not to_email: return False
         try:
-            msg = MIMEMultipart()
-            msg['From'] = EMAIL
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            msg.attach(MIMEText(body, 'plain'))
-
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(EMAIL, APP_PASSWORD)
-            server.sendmail(EMAIL, to_email, msg.as_string())
-            server.quit()
+            self.outbound.enqueue(to_email, subject, body)
             return True
         except Exception as e:
-            print(f"Failed to send email: {e}")
+            print(f"Failed to queue email: {e}")
             return False
 
 _email_service = None
@@ -0,0 +1,256 @@
+"""
+Append-only email store.
+
+Emails are written as JSON Lines to numbered segment files. An in-memory
+index maps each UID to its record location, so appends, lookups and
+newest-first pages never touch the rest of the history. Deletes append a
+tombstone; compaction rewrites only the live records once enough dead
+records have accumulated.
+"""
+import json
+import os
+import threading
+from itertools import islice
+from typing import Dict, Iterable, List, Optional, Tuple
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "data")
+STORE_DIR = os.path.join(DATA_DIR, "email_log")
+LEGACY_JSON_FILE = os.path.join(DATA_DIR, "emails.json")
+
+SEGMENT_MAX_BYTES = 4 * 1024 * 1024
+COMPACT_MIN_DEAD = 200       # don't bother compacting tiny stores
+COMPACT_DEAD_RATIO = 0.3     # compact when >30% of records on disk are dead
+
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".jsonl"
+
+
+class EmailStore:
+    def __init__(self, directory: str = STORE_DIR, legacy_json: Optional[str] = LEGACY_JSON_FILE):
+        self.directory = directory
+        self._lock = threading.RLock()
+        # uid -> (segment_id, offset, length); insertion order is ingest order
+        self._index: Dict[str, Tuple[int, int, int]] = {}
+        self._dead = 0
+        self._readers = {}
+        self._active_id = 1
+        self._active_size = 0
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._load()
+        if not self._index and legacy_json and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+
+    # --- Segment helpers ---
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment_id:08d}{SEGMENT_SUFFIX}")
+
+    def _segment_ids(self) -> List[int]:
+        ids = []
+        for name in os.listdir(self.directory):
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX):
+                number = name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)]
+                if number.isdigit():
+                    ids.append(int(number))
+        return sorted(ids)
+
+    def _reader(self, segment_id: int):
+        fh = self._readers.get(segment_id)
+        if fh is None:
+            fh = open(self._segment_path(segment_id), "rb")
+            self._readers[segment_id] = fh
+        return fh
+
+    def _close_readers(self):
+        for fh in self._readers.values():
+            fh.close()
+        self._readers = {}
+
+    def _load(self):
+        """Rebuild the index by scanning segments once at startup"""
+        segment_ids = self._segment_ids()
+        for segment_id in segment_ids:
+            path = self._segment_path(segment_id)
+            with open(path, "rb") as f:
+                lines = f.readlines()
+            offset = 0
+            for i, line in enumerate(lines):
+                length = len(line)
+                # Only the end of the active segment can hold a torn write
+                torn_tail = segment_id == segment_ids[-1] and i == len(lines) - 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                if torn_tail and (record is None or not line.endswith(b"\n")):
+                    # Without its newline even a parseable record would have the next append glued on
+                    print(f"EmailStore: truncating torn tail of {path} at byte {offset}")
+                    with open(path, "r+b") as rw:
+                        rw.truncate(offset)
+                    break
+                if record is None:
+                    print(f"EmailStore: skipping corrupt record in {path} at byte {offset}")
+                    self._dead += 1
+                else:
+                    self._apply(record, segment_id, offset, length)
+                offset += length
+        if segment_ids:
+            self._active_id = segment_ids[-1]
+            self._active_size = os.path.getsize(self._segment_path(self._active_id))
+
+    def _apply(self, record: dict, segment_id: int, offset: int, length: int):
+        uid = str(record.get("uid"))
+        if record.get("op") == "del":
+            if uid in self._index:
+                del self._index[uid]
+                self._dead += 1
+            self._dead += 1  # the tombstone itself
+            return
+        if uid in self._index:
+            del self._index[uid]
+            self._dead += 1
+        self._index[uid] = (segment_id, offset, length)
+
+    def _import_legacy(self, legacy_json: str):
+        try:
+            with open(legacy_json, "r") as f:
+                emails = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"EmailStore: could not import {legacy_json}: {e}")
+            return
+        self.append(emails)
+        os.replace(legacy_json, legacy_json + ".migrated")
+        print(f"EmailStore: imported {len(emails)} emails from {legacy_json}")
+
+    def _write(self, records: Iterable[dict]) -> List[Tuple[dict, int, int, int]]:
+        written = []
+        f = open(self._segment_path(self._active_id), "ab")
+        try:
+            for record in records:
+                line = (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+                if self._active_size and self._active_size + len(line) > SEGMENT_MAX_BYTES:
+                    f.close()
+                    self._active_id += 1
+                    self._active_size = 0
+                    f = open(self._segment_path(self._active_id), "ab")
+                f.write(line)
+                written.append((record, self._active_id, self._active_size, len(line)))
+                self._active_size += len(line)
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            f.close()
+        return written
+
+    # --- Public API ---
+
+    def append(self, emails: Iterable[dict]) -> int:
+        """Append emails; a UID already present is superseded by the new record"""
+        records = [{**email, "op": "put", "uid": str(email.get("uid"))} for email in emails if email.get("uid")]
+        if not records:
+            return 0
+        with self._lock:
+            for record, segment_id, offset, length in self._write(records):
+                self._apply(record, segment_id, offset, length)
+        return len(records)
+
+    def delete(self, uid: str) -> bool:
+        uid = str(uid)
+        with self._lock:
+            if uid not in self._index:
+                return False
+            for record, segment_id, offset, length in self._write([{"op": "del", "uid": uid}]):
+                self._apply(record, segment_id, offset, length)
+            self.maybe_compact()
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._close_readers()
+            for segment_id in self._segment_ids():
+                os.remove(self._segment_path(segment_id))
+            self._index = {}
+            self._dead = 0
+            self._active_id = 1
+            self._active_size = 0
+
+    def get(self, uid: str) -> Optional[dict]:
+        with self._lock:
+            location = self._index.get(str(uid))
+            return self._read(location) if location else None
+
+    def page(self, limit: int = 100, offset: int = 0) -> List[dict]:
+        """Newest-first page of emails"""
+        with self._lock:
+            locations = list(islice(reversed(self._index.values()), offset, offset + limit))
+            return [self._read(location) for location in locations]
+
+    def tail(self, count: int) -> List[dict]:
+        return self.page(limit=count, offset=0)
+
+    def max_uid(self) -> Optional[int]:
+        with self._lock:
+            numeric = [int(uid) for uid in self._index if uid.isdigit()]
+        return max(numeric) if numeric else None
+
+    def __contains__(self, uid) -> bool:
+        return str(uid) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _read(self, location: Tuple[int, int, int]) -> dict:
+        segment_id, offset, length = location
+        fh = self._reader(segment_id)
+        fh.seek(offset)
+        record = json.loads(fh.read(length))
+        record.pop("op", None)
+        return record
+
+    # --- Compaction ---
+
+    def maybe_compact(self) -> bool:
+        with self._lock:
+            total = len(self._index) + self._dead
+            if self._dead >= COMPACT_MIN_DEAD and self._dead / total >= COMPACT_DEAD_RATIO:
+                self.compact()
+                return True
+        return False
+
+    def compact(self):
+        """Rewrite live records into fresh segments and drop the old ones"""
+        with self._lock:
+            old_ids = self._segment_ids()
+            live = [self._read(location) for location in self._index.values()]
+            self._close_readers()
+
+            self._index = {}
+            self._dead = 0
+            self._active_id = (old_ids[-1] + 1) if old_ids else 1
+            self._active_size = 0
+            self.append(live)
+
+            for segment_id in old_ids:
+                os.remove(self._segment_path(segment_id))
+            print(f"EmailStore: compacted {len(old_ids)} segments, {len(live)} live emails")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "emails": len(self._index),
+                "dead_records": self._dead,
+                "segments": len(self._segment_ids()),
+            }
+
+
+# Singleton instance
+_email_store = None
+_email_store_lock = threading.Lock()
+
+def get_email_store() -> EmailStore:
+    global _email_store
+    with _email_store_lock:
+        if _email_store is None:
+            _email_store = EmailStore()
+    return _email_store
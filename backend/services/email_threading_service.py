@@ -1,11 +1,29 @@
 import re
 import datetime
 from typing import Optional, Dict, Any, List
-from database import get_db
+from database import get_db, get_read_db
 from models import Ticket, TicketEmail
-from services.rag_service import get_rag_service
+from services.rag_service import get_rag_service, cosine_scores
+from services.ticket_vectors import load_ticket_embeddings, store_ticket_embeddings, ticket_text, ensure_ticket_embedding
+import numpy as np
 from fuzzywuzzy import fuzz  # Requires: pip install fuzzywuzzy python-Levenshtein
 
+def insert_ticket_email(conn, ticket_id: int, email_data: Dict[str, Any]) -> bool:
+    """Insert an email row in the caller's transaction; False if its message_id is already stored"""
+    # Deduplication: message_id is UNIQUE, so a redelivered email is ignored
+    cursor = conn.execute("""
+        INSERT OR IGNORE INTO ticket_emails (ticket_id, message_id, sender, subject, body, received_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """, (
+        ticket_id,
+        email_data.get("message_id"),
+        email_data.get("from_email"),
+        email_data.get("subject"),
+        email_data.get("body"),
+        datetime.datetime.now().isoformat()
+    ))
+    return cursor.rowcount == 1
+
 class EmailThreadingService:
     def __init__(self):
         self.rag_service = get_rag_service()
@@ -76,7 +94,8 @@ class EmailThreadingService:
         
         normalized_subject = self.normalize_subject(subject)
         
-        with get_db() as conn:
+        # Read-only: nothing here may hold the write lock while embedding
+        with get_read_db() as conn:
             cursor = conn.cursor()
             
             # --- LAYER 1: Headers (Hard Thread Linking) ---
@@ -123,18 +142,33 @@ class EmailThreadingService:
             
             now = datetime.datetime.now()
             
+            # Hours since last activity per ticket (unparseable timestamps are skipped)
+            ticket_ages = []
             for ticket in recent_tickets:
-                # Time Check (72h)
                 last_active_str = ticket.updated_at or ticket.created_at
                 try:
                     last_active = datetime.datetime.fromisoformat(last_active_str)
-                    hours_diff = (now - last_active).total_seconds() / 3600
+                    ticket_ages.append((ticket, (now - last_active).total_seconds() / 3600))
                 except:
                     continue
-                
-                if hours_diff > 72:
-                    continue
 
+            # Semantic scores are computed lazily, once, for all candidates
+            # together: stored ticket vectors + one matrix product per layer
+            candidates_72h = [ticket for ticket, hours_diff in ticket_ages if hours_diff <= 72]
+            candidates_48h = [ticket for ticket, hours_diff in ticket_ages if hours_diff <= 48]
+            semantic = None
+
+            def semantic_scores():
+                nonlocal semantic
+                if semantic is None:
+                    semantic = self._semantic_scores(
+                        conn,
+                        [f"{normalized_subject} {body[:500]}", f"{normalized_subject} {body[:300]}"],
+                        candidates_72h
+                    )
+                return semantic
+            
+            for i, ticket in enumerate(candidates_72h):
                 # Fuzzy Subject
                 ticket_norm = self.normalize_subject(ticket.title)
                 fuzz_score = fuzz.ratio(normalized_subject, ticket_norm)
@@ -150,7 +184,7 @@ class EmailThreadingService:
                     
                 # Semantic (RAG) Check
                 # Compare current Email Body vs Ticket Description/Last Email
-                score = self.rag_service.compute_similarity(f"{normalized_subject} {body[:500]}", f"{ticket.title} {ticket.description}")
+                score = semantic_scores()[0][i]
                 if score >= 0.85:
                     return {
                         "action": "update",
@@ -163,24 +197,12 @@ class EmailThreadingService:
             # --- LAYER 4: Time/Topic Grouping (Sender + 48h) ---
             # Group rapid follow-ups even if headers/subjects don't match exactly.
             # Uses Semantic Similarity with a slightly lower threshold for grouping.
-            
-            for ticket in recent_tickets:
-                 # Time Check (48h)
-                last_active_str = ticket.updated_at or ticket.created_at
-                try:
-                    last_active = datetime.datetime.fromisoformat(last_active_str)
-                    hours_diff = (now - last_active).total_seconds() / 3600
-                except:
-                    continue
-                
-                if hours_diff <= 48:
-                    # Semantic Grouping Check
-                    # "My login isn't working" vs "I forgot my password" -> semantically close
-                    target_text = f"{ticket.title} {ticket.description[:300]}"
-                    current_text = f"{normalized_subject} {body[:300]}"
-                    
-                    group_score = self.rag_service.compute_similarity(current_text, target_text)
-                    
+            # "My login isn't working" vs "I forgot my password" -> semantically close
+            if candidates_48h:
+                # Every 48h candidate is also a 72h candidate, so its score is already computed
+                scores_by_id = dict(zip([t.id for t in candidates_72h], semantic_scores()[1]))
+                for ticket in candidates_48h:
+                    group_score = scores_by_id[ticket.id]
                     if group_score >= 0.75: # Slightly lower threshold for grouping
                          return {
                             "action": "update",
@@ -199,35 +221,54 @@ class EmailThreadingService:
                 "confidence": 0.0
             }
 
+    def _semantic_scores(self, conn, query_texts: List[str], tickets: List[Ticket]) -> List[List[float]]:
+        """
+        Cosine scores of each query text against each ticket's stored embedding.
+        The query texts and any tickets without a stored vector are embedded
+        in one batch; the new ticket vectors are then saved in their own short
+        write transaction, so no SQLite lock is held while the model runs.
+        Returns one list of scores per query text, aligned with tickets.
+        """
+        if not tickets:
+            return [[] for _ in query_texts]
+        if not self.rag_service.is_ready:
+            # RAG still warming up (or disabled): skip semantic matching
+            return [[0.0] * len(tickets) for _ in query_texts]
+        try:
+            vectors = load_ticket_embeddings(conn, [t.id for t in tickets])
+            missing = [t for t in tickets if t.id not in vectors]
+            embeddings = self.rag_service.embed(
+                list(query_texts) + [ticket_text(t.title, t.description) for t in missing])
+            queries = embeddings[:len(query_texts)]
+            fresh = {t.id: vector for t, vector in zip(missing, embeddings[len(query_texts):])}
+            if fresh:
+                with get_db() as write_conn:
+                    store_ticket_embeddings(write_conn, fresh.items())
+                vectors.update(fresh)
+            matrix = np.stack([vectors[t.id] for t in tickets])
+            return [cosine_scores(query, matrix).tolist() for query in queries]
+        except Exception as e:
+            print(f"Similarity computation error: {e}")
+            return [[0.0] * len(tickets) for _ in query_texts]
+
     def save_email_to_ticket(self, ticket_id: int, email_data: Dict[str, Any]):
         """Save the email to ticket_emails table"""
         message_id = email_data.get("message_id")
         
         with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Deduplication Check
-            if message_id:
-                cursor.execute("SELECT id FROM ticket_emails WHERE message_id = ?", (message_id,))
-                if cursor.fetchone():
-                    print(f"Skipping duplicate email message_id: {message_id}")
-                    return
-
-            cursor.execute("""
-                INSERT INTO ticket_emails (ticket_id, message_id, sender, subject, body, received_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-            """, (
-                ticket_id,
-                message_id,
-                email_data.get("from_email"),
-                email_data.get("subject"),
-                email_data.get("body"),
-                datetime.datetime.now().isoformat()
-            ))
+            if not insert_ticket_email(conn, ticket_id, email_data):
+                print(f"Skipping duplicate email message_id: {message_id}")
+                return
             
             # Also update ticket's updated_at
-            cursor.execute("UPDATE tickets SET updated_at = ? WHERE id = ?", 
-                          (datetime.datetime.now().isoformat(), ticket_id))
+            conn.execute("UPDATE tickets SET updated_at = ? WHERE id = ?", 
+                         (datetime.datetime.now().isoformat(), ticket_id))
+
+        # Make sure the ticket is ready for vector dedup lookups
+        try:
+            ensure_ticket_embedding(ticket_id)
+        except Exception as e:
+            print(f"Ticket embedding error: {e}")
 
 # Singleton
 _threading_service = None
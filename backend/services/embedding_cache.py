@@ -0,0 +1,148 @@
+"""
+Content-addressed embedding cache.
+
+Two tiers: an in-process LRU for hot texts and an on-disk SQLite store
+that survives restarts. Entries are keyed by sha256(model + text), so a
+model change never serves stale vectors.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+CACHE_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "embedding_cache.db")
+MEMORY_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_MEMORY_SIZE", "4096"))
+DISK_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_DISK_SIZE", "200000"))
+
+
+class EmbeddingCache:
+    def __init__(self, path: str = CACHE_DB_PATH, memory_size: int = MEMORY_CACHE_SIZE,
+                 disk_max_entries: int = DISK_CACHE_MAX_ENTRIES):
+        self.memory_size = memory_size
+        self.disk_max_entries = disk_max_entries
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One shared connection guarded by self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                key TEXT PRIMARY KEY,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return cached vectors aligned with texts, None where missing"""
+        keys = [self.make_key(model, text) for text in texts]
+        results: List[Optional[List[float]]] = [None] * len(keys)
+        with self._lock:
+            disk_lookup = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    results[i] = vector
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+            if disk_lookup:
+                placeholders = ','.join(['?'] * len(disk_lookup))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})",
+                    list(disk_lookup)
+                ).fetchall()
+                found = []
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    found.append(key)
+                    for i in disk_lookup[key]:
+                        results[i] = vector
+                        self.stats["disk_hits"] += 1
+                if found:
+                    now = time.time()
+                    self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?",
+                                           [(now, key) for key in found])
+                    self._conn.commit()
+                self.stats["misses"] += sum(len(disk_lookup[key]) for key in disk_lookup if key not in found)
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model, text)
+                vector = [float(v) for v in vector]
+                self._remember(key, vector)
+                rows.append((key, len(vector), np.asarray(vector, dtype=np.float32).tobytes(), now))
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (key, dim, vector, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._disk_count += self._conn.total_changes - before
+            self._conn.commit()
+            if self._disk_count > self.disk_max_entries:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop the least recently used tenth of the disk tier (caller holds the lock)"""
+        target = int(self.disk_max_entries * 0.9)
+        excess = self._disk_count - target
+        self._conn.execute("""
+            DELETE FROM embeddings WHERE key IN (
+                SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?
+            )
+        """, (excess,))
+        self._conn.commit()
+        self._disk_count = target
+        self.stats["evictions"] += excess
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats.update({
+                "memory_entries": len(self._memory),
+                "disk_entries": self._disk_count,
+                "hit_rate": round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else None,
+            })
+        return stats
+
+
+# Singleton instance
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+def get_embedding_cache() -> EmbeddingCache:
+    global _embedding_cache
+    with _embedding_cache_lock:
+        if _embedding_cache is None:
+            _embedding_cache = EmbeddingCache()
+    return _embedding_cache
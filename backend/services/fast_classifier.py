@@ -0,0 +1,290 @@
+"""
+Local fast-path ticket classifier.
+
+A TF-IDF (unigrams + bigrams) softmax regression, trained with NumPy on
+existing tickets and their Groq-assigned type/priority. Probabilities are
+calibrated with temperature scaling on a held-out split. GroqService only
+trusts it when both the type and the priority prediction clear their
+thresholds; everything else still goes to the LLM.
+
+Train with scripts/train_fast_classifier.py; the model is stored at
+data/fast_classifier.npz.
+"""
+import json
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "fast_classifier.npz")
+FAST_CLASSIFIER_ENABLED = os.getenv("FAST_CLASSIFIER_ENABLED", "true").lower() == "true"
+TYPE_THRESHOLD = float(os.getenv("FAST_CLASSIFIER_TYPE_THRESHOLD", "0.9"))
+PRIORITY_THRESHOLD = float(os.getenv("FAST_CLASSIFIER_PRIORITY_THRESHOLD", "0.8"))
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9_']+")
+MAX_FEATURES = 20000
+MIN_DF = 2
+TEMPERATURES = np.linspace(0.25, 5.0, 39)
+CHUNK_ROWS = 1024  # rows densified at a time during training
+DENSE_CACHE_BYTES = 256 * 1024 * 1024  # keep densified chunks across epochs below this size
+
+
+def tokenize(title: Optional[str], description: Optional[str]) -> List[str]:
+    words = TOKEN_PATTERN.findall(f"{title or ''} {description or ''}".lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class SparseRows:
+    """Row-normalized TF-IDF matrix kept as CSR arrays; densified a chunk at a time"""
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, n_features: int):
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.n_features = n_features
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def dense(self, rows: Sequence[int]) -> np.ndarray:
+        X = np.zeros((len(rows), self.n_features), dtype=np.float32)
+        for out_row, row in enumerate(rows):
+            start, end = self.indptr[row], self.indptr[row + 1]
+            X[out_row, self.indices[start:end]] = self.values[start:end]
+        return X
+
+    def chunks(self, rows: Sequence[int]):
+        for i in range(0, len(rows), CHUNK_ROWS):
+            batch = rows[i:i + CHUNK_ROWS]
+            yield batch, self.dense(batch)
+
+
+class SoftmaxHead:
+    """Multinomial logistic regression over a shared feature matrix"""
+
+    def __init__(self, classes: Sequence[str], weights: np.ndarray, bias: np.ndarray, temperature: float = 1.0):
+        self.classes = list(classes)
+        self.weights = weights
+        self.bias = bias
+        self.temperature = temperature
+
+    @classmethod
+    def train(cls, X: SparseRows, rows: List[int], labels: Sequence[str], epochs: int = 200,
+              lr: float = 2.0, l2: float = 1e-4) -> "SoftmaxHead":
+        """labels[i] is the label of X row rows[i]"""
+        classes = sorted(set(labels))
+        index = {c: i for i, c in enumerate(classes)}
+        Y = np.zeros((len(rows), len(classes)), dtype=np.float32)
+        Y[np.arange(len(rows)), [index[label] for label in labels]] = 1.0
+        W = np.zeros((X.n_features, len(classes)), dtype=np.float32)
+        b = np.zeros(len(classes), dtype=np.float32)
+        cached = None
+        if len(rows) * X.n_features * 4 <= DENSE_CACHE_BYTES:
+            cached = [chunk for _, chunk in X.chunks(rows)]
+        # Full-batch gradient descent; rows are L2-normalized so a fixed step is stable
+        for _ in range(epochs):
+            grad_W = np.zeros_like(W)
+            grad_b = np.zeros_like(b)
+            chunks = cached if cached is not None else (chunk for _, chunk in X.chunks(rows))
+            for i, chunk in enumerate(chunks):
+                error = _softmax(chunk @ W + b) - Y[i * CHUNK_ROWS:(i + 1) * CHUNK_ROWS]
+                grad_W += chunk.T @ error
+                grad_b += error.sum(axis=0)
+            W -= lr * (grad_W / len(rows) + l2 * W)
+            b -= lr * grad_b / len(rows)
+        return cls(classes, W, b)
+
+    def logits(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.weights + self.bias
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        return _softmax(self.logits(X) / self.temperature)
+
+    def calibrate(self, X: SparseRows, rows: List[int], labels: Sequence[str]):
+        """Temperature scaling: pick T minimizing held-out negative log-likelihood"""
+        known = [i for i, label in enumerate(labels) if label in self.classes]
+        if not known:
+            return
+        logits = np.vstack([self.logits(chunk) for _, chunk in X.chunks([rows[i] for i in known])])
+        targets = np.array([self.classes.index(labels[i]) for i in known])
+        best, best_nll = 1.0, float("inf")
+        for temperature in TEMPERATURES:
+            probs = _softmax(logits / temperature)
+            nll = -np.log(np.maximum(probs[np.arange(len(targets)), targets], 1e-12)).mean()
+            if nll < best_nll:
+                best, best_nll = float(temperature), nll
+        self.temperature = best
+
+
+class FastClassifier:
+    def __init__(self, vocabulary: Dict[str, int], idf: np.ndarray, type_head: SoftmaxHead,
+                 priority_head: SoftmaxHead, metadata: Optional[dict] = None):
+        self.vocabulary = vocabulary
+        self.idf = idf
+        self.type_head = type_head
+        self.priority_head = priority_head
+        self.metadata = metadata or {}
+
+    # --- Features ---
+
+    @staticmethod
+    def build_vocabulary(documents: List[List[str]]) -> Tuple[Dict[str, int], np.ndarray]:
+        df = Counter(token for tokens in documents for token in set(tokens))
+        terms = [t for t, n in df.most_common() if n >= MIN_DF][:MAX_FEATURES]
+        vocabulary = {term: i for i, term in enumerate(terms)}
+        idf = np.log((1 + len(documents)) / (1 + np.array([df[t] for t in terms], dtype=np.float32))) + 1
+        return vocabulary, idf.astype(np.float32)
+
+    def vectorize(self, documents: List[List[str]]) -> SparseRows:
+        """Sublinear TF-IDF, L2-normalized per row"""
+        indptr, indices, values = [0], [], []
+        for tokens in documents:
+            columns, weights = [], []
+            for token, count in Counter(tokens).items():
+                column = self.vocabulary.get(token)
+                if column is not None:
+                    columns.append(column)
+                    weights.append((1 + np.log(count)) * self.idf[column])
+            norm = np.sqrt(sum(w * w for w in weights)) or 1.0
+            indices.extend(columns)
+            values.extend(w / norm for w in weights)
+            indptr.append(len(indices))
+        return SparseRows(np.asarray(indptr), np.asarray(indices, dtype=np.int64),
+                          np.asarray(values, dtype=np.float32), len(self.vocabulary))
+
+    # --- Training ---
+
+    @classmethod
+    def train(cls, samples: List[Tuple[str, str, str, str]], holdout: float = 0.2,
+              seed: int = 42) -> Tuple["FastClassifier", List[int]]:
+        """
+        Train on (title, description, type, priority) samples.
+        Returns the model and the indices of the held-out samples used for calibration.
+        """
+        order = np.random.default_rng(seed).permutation(len(samples))
+        split = max(1, int(len(samples) * holdout))
+        held_out, train = order[:split].tolist(), order[split:].tolist()
+
+        documents = [tokenize(title, description) for title, description, _, _ in samples]
+        vocabulary, idf = cls.build_vocabulary([documents[i] for i in train])
+        model = cls(vocabulary, idf, None, None)
+        X = model.vectorize(documents)
+
+        model.type_head = SoftmaxHead.train(X, train, [samples[i][2] for i in train])
+        model.priority_head = SoftmaxHead.train(X, train, [samples[i][3] for i in train])
+        model.type_head.calibrate(X, held_out, [samples[i][2] for i in held_out])
+        model.priority_head.calibrate(X, held_out, [samples[i][3] for i in held_out])
+        model.metadata = {"samples": len(samples), "train": len(train), "held_out": len(held_out),
+                          "features": len(vocabulary)}
+        return model, held_out
+
+    # --- Inference ---
+
+    def predict(self, title: str, description: str) -> dict:
+        X = self.vectorize([tokenize(title, description)]).dense([0])
+        type_probs = self.type_head.predict_proba(X)[0]
+        priority_probs = self.priority_head.predict_proba(X)[0]
+        t, p = int(type_probs.argmax()), int(priority_probs.argmax())
+        return {
+            "type": self.type_head.classes[t],
+            "priority": self.priority_head.classes[p],
+            "type_confidence": float(type_probs[t]),
+            "priority_confidence": float(priority_probs[p]),
+        }
+
+    # --- Persistence ---
+
+    def save(self, path: str = MODEL_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        terms = sorted(self.vocabulary, key=self.vocabulary.get)
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            idf=self.idf,
+            type_weights=self.type_head.weights, type_bias=self.type_head.bias,
+            priority_weights=self.priority_head.weights, priority_bias=self.priority_head.bias,
+            config=np.array(json.dumps({
+                "terms": terms,
+                "type_classes": self.type_head.classes,
+                "type_temperature": self.type_head.temperature,
+                "priority_classes": self.priority_head.classes,
+                "priority_temperature": self.priority_head.temperature,
+                "metadata": self.metadata,
+            })),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "FastClassifier":
+        with np.load(path) as data:
+            config = json.loads(str(data["config"]))
+            return cls(
+                {term: i for i, term in enumerate(config["terms"])},
+                data["idf"],
+                SoftmaxHead(config["type_classes"], data["type_weights"], data["type_bias"],
+                            config["type_temperature"]),
+                SoftmaxHead(config["priority_classes"], data["priority_weights"], data["priority_bias"],
+                            config["priority_temperature"]),
+                config["metadata"],
+            )
+
+
+class FastPathClassifier:
+    """Thresholded wrapper used by GroqService, with counters of LLM calls saved"""
+
+    def __init__(self, path: str = MODEL_PATH, type_threshold: float = TYPE_THRESHOLD,
+                 priority_threshold: float = PRIORITY_THRESHOLD):
+        self.type_threshold = type_threshold
+        self.priority_threshold = priority_threshold
+        self.model = None
+        self._lock = threading.Lock()
+        self.stats = {"fast_path": 0, "deferred": 0}
+        if FAST_CLASSIFIER_ENABLED and os.path.exists(path):
+            try:
+                self.model = FastClassifier.load(path)
+                print(f"Fast classifier loaded ({self.model.metadata.get('samples')} training tickets).")
+            except Exception as e:
+                print(f"Fast classifier load error: {e}")
+
+    def classify(self, title: str, description: str) -> Optional[dict]:
+        """Confident local classification in GroqService's format, or None to defer to the LLM"""
+        if self.model is None:
+            return None
+        prediction = self.model.predict(title, description)
+        confident = (prediction["type_confidence"] >= self.type_threshold
+                     and prediction["priority_confidence"] >= self.priority_threshold)
+        with self._lock:
+            self.stats["fast_path" if confident else "deferred"] += 1
+        if not confident:
+            return None
+        return {
+            "type": prediction["type"],
+            "priority": prediction["priority"],
+            "confidence": round(prediction["type_confidence"], 4),
+            "category": prediction["type"],
+            "reason": "Local fast-path classifier",
+            "source": "fast_path",
+        }
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        seen = stats["fast_path"] + stats["deferred"]
+        stats.update({
+            "enabled": self.model is not None,
+            "llm_calls_saved": stats["fast_path"],
+            "fast_path_rate": round(stats["fast_path"] / seen, 4) if seen else None,
+            "type_threshold": self.type_threshold,
+            "priority_threshold": self.priority_threshold,
+            "model": self.model.metadata if self.model else None,
+        })
+        return stats
@@ -1,8 +1,16 @@
 import os
 import json
+import hashlib
+import threading
+import time
 from groq import Groq
 from dotenv import load_dotenv
-from typing import Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
+from services.classification_cache import get_classification_cache
+from services.fast_classifier import FastPathClassifier
+from services.llm_guard import INTERACTIVE, LLMGuard, estimate_tokens
+from services.llm_usage import record_llm_usage, usage_tokens
+from services.prompt_builder import ContextInput, prepare_response_inputs
 
 # Load environment variables
 load_dotenv()
@@ -24,11 +32,8 @@ Guidelines for Confidence Score (0-100):
 Output MUST be valid JSON and nothing else.
 """
 
-# Classification user prompt template
-USER_PROMPT_TEMPLATE = """
-Classify the following support ticket into ONE of the categories listed below.
-
-CATEGORIES (choose exactly one):
+# Category and priority definitions shared by the single and batch prompts
+CLASSIFICATION_GUIDE = """CATEGORIES (choose exactly one):
 
 1. Technical Support - System errors, bugs, crashes, login issues, performance problems
 2. Access Request - Permission issues, account access, password resets, user provisioning
@@ -46,7 +51,13 @@ PRIORITY LEVELS (choose exactly one):
 2. high - Major feature broken, affecting multiple users, deadline pressure, revenue impact
 3. medium - Feature partially working, workaround exists, moderate impact
 4. low - Questions, minor issues, cosmetic issues, nice-to-have requests
+"""
+
+# Classification user prompt template
+USER_PROMPT_TEMPLATE = """
+Classify the following support ticket into ONE of the categories listed below.
 
+""" + CLASSIFICATION_GUIDE + """
 TICKET CONTENT:
 \"\"\"
 Title: {title}
@@ -63,78 +74,200 @@ Respond ONLY in the following JSON format:
 }}
 """
 
+# Batch classification: several tickets per request, one indexed result each
+BATCH_PROMPT_TEMPLATE = """
+Classify EACH of the {count} support tickets below, independently, into ONE of the categories listed below.
+
+""" + CLASSIFICATION_GUIDE + """
+TICKETS:
+{tickets}
+
+Respond ONLY with a JSON array containing exactly one object per ticket, in this format:
+
+[
+  {{
+    "index": <ticket number as shown above>,
+    "category": "<one of the listed categories - use short form like 'Technical Support'>",
+    "priority": "<one of: critical, high, medium, low>",
+    "confidence": <integer between 0 and 100>,
+    "reason": "<one short sentence explaining why>"
+  }}
+]
+"""
+BATCH_TICKET_TEMPLATE = """TICKET {index}:
+\"\"\"
+Title: {title}
+Description: {description}
+\"\"\"
+"""
+
+CLASSIFY_BATCH_SIZE = int(os.getenv("GROQ_CLASSIFY_BATCH_SIZE", "10"))
+CLASSIFY_BATCH_MAX_PROMPT_TOKENS = int(os.getenv("GROQ_CLASSIFY_BATCH_MAX_PROMPT_TOKENS", "6000"))
+CLASSIFY_BATCH_TOKENS_PER_ITEM = 80  # completion budget per ticket in a batch
+VALID_PRIORITIES = ("critical", "high", "medium", "low")
+
+# Changes whenever a classification prompt is edited, invalidating cached results
+PROMPT_VERSION = hashlib.sha256(
+    (CLASSIFICATION_PROMPT + USER_PROMPT_TEMPLATE + BATCH_PROMPT_TEMPLATE + BATCH_TICKET_TEMPLATE).encode("utf-8")
+).hexdigest()[:12]
+
+RESPONSE_MAX_TOKENS = int(os.getenv("GROQ_RESPONSE_MAX_TOKENS", "800"))
+RESPONSE_SYSTEM_PROMPT = "You are a helpful support agent. Output strictly valid JSON."
+FALLBACK_RESPONSE = "I apologize, but I am unable to generate a response at this time. An agent will review your ticket shortly."
+RESPONSE_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
 
 
+class ResponseFieldExtractor:
+    """
+    Incrementally decodes the "response" string of a streamed JSON object.
+    feed() takes raw completion deltas and returns whatever new text of the
+    field can be safely decoded so far (escape sequences split across
+    deltas are held back until complete).
+    """
+
+    def __init__(self, field: str = "response"):
+        self.buffer = ""
+        self.key = f'"{field}"'
+        self.position = None  # index of the next undecoded char inside the string
+        self.done = False
+
+    def _find_value_start(self) -> Optional[int]:
+        key_at = self.buffer.find(self.key)
+        if key_at == -1:
+            return None
+        i = key_at + len(self.key)
+        while i < len(self.buffer) and self.buffer[i] in " \t\r\n:":
+            i += 1
+        if i < len(self.buffer) and self.buffer[i] == '"':
+            return i + 1
+        return None
+
+    def feed(self, delta: str) -> str:
+        self.buffer += delta
+        if self.done:
+            return ""
+        if self.position is None:
+            self.position = self._find_value_start()
+            if self.position is None:
+                return ""
+
+        out = []
+        i, buffer = self.position, self.buffer
+        while i < len(buffer):
+            char = buffer[i]
+            if char == '"':
+                self.done = True
+                i += 1
+                break
+            if char != '\\':
+                out.append(char)
+                i += 1
+                continue
+            if i + 1 >= len(buffer):
+                break  # escape split across deltas
+            escape = buffer[i + 1]
+            if escape == 'u':
+                if i + 6 > len(buffer):
+                    break
+                try:
+                    code = int(buffer[i + 2:i + 6], 16)
+                except ValueError:
+                    code = 0xFFFD
+                if 0xD800 <= code < 0xDC00:
+                    # High surrogate: combine with the following \uXXXX low surrogate
+                    if i + 12 > len(buffer):
+                        break
+                    try:
+                        low = int(buffer[i + 8:i + 12], 16) if buffer[i + 6:i + 8] == '\\u' else -1
+                    except ValueError:
+                        low = -1
+                    if 0xDC00 <= low < 0xE000:
+                        out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                        i += 12
+                        continue
+                    code = 0xFFFD
+                out.append(chr(code))
+                i += 6
+            else:
+                out.append(RESPONSE_JSON_ESCAPES.get(escape, escape))
+                i += 2
+        self.position = i
+        return "".join(out)
+
 
 class GroqService:
     def __init__(self):
         api_key = os.getenv("GROQ_API_KEY")
         if not api_key:
             raise ValueError("GROQ_API_KEY not found in environment variables")
-        self.client = Groq(api_key=api_key)
+        # Retries are handled by the guard so they share its rate limits and circuit breaker
+        self.client = Groq(api_key=api_key, max_retries=0)
+        self.guard = LLMGuard()
         self.model = "llama-3.1-8b-instant"  # Fast and cost-effective model
+        self.classification_cache = get_classification_cache()
+        self.fast_classifier = FastPathClassifier()
+        self._batch_lock = threading.Lock()
+        self.batch_stats = {"batches": 0, "batched_items": 0, "fallback_items": 0}
+
+    def _complete(self, operation: str, lane: int, system_prompt: str, user_prompt: str,
+                  temperature: float, max_tokens: int, items: int = 1, trimmed_tokens: int = 0):
+        """Non-streaming completion through the guard, with its token usage recorded"""
+        prompt_tokens = estimate_tokens(system_prompt + user_prompt)
+        start = time.perf_counter()
+        response = self.guard.call(
+            self.client.chat.completions.create,
+            lane=lane,
+            prompt_tokens=prompt_tokens,
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        usage = usage_tokens(getattr(response, "usage", None))
+        estimated = usage is None
+        if estimated:
+            usage = (prompt_tokens, estimate_tokens(response.choices[0].message.content or ""))
+        record_llm_usage(operation, self.model, lane, usage[0], usage[1], time.perf_counter() - start,
+                         estimated=estimated, trimmed_tokens=trimmed_tokens, items=items)
+        return response
+
+    def classify_ticket(self, title: str, description: str, lane: int = INTERACTIVE) -> dict:
+        """
+        Classify ticket type and priority using Groq LLM with improved prompts.
+        Classification is deterministic, so results are served from the
+        classification cache for repeated or near-identical tickets.
+        If Groq is unavailable the result is flagged "degraded" with zero
+        confidence, so it is never auto-sent or cached.
+        """
+        cached = self.classification_cache.get(self.model, PROMPT_VERSION, title, description)
+        if cached is not None:
+            print(f"Classification (cached): type='{cached['type']}', priority='{cached['priority']}'")
+            return cached
 
-    def classify_ticket(self, title: str, description: str) -> dict:
-        """Classify ticket type and priority using Groq LLM with improved prompts"""
+        # Obvious tickets are classified locally without an LLM call
+        fast = self.fast_classifier.classify(title, description)
+        if fast is not None:
+            print(f"Classification (fast path): type='{fast['type']}', priority='{fast['priority']}', confidence={fast['confidence']}")
+            return fast
         
+        user_prompt = USER_PROMPT_TEMPLATE.format(title=title, description=description)
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": CLASSIFICATION_PROMPT},
-                    {"role": "user", "content": USER_PROMPT_TEMPLATE.format(title=title, description=description)}
-                ],
-                temperature=0,
-                max_tokens=200
-            )
+            response = self._complete("classify", lane, CLASSIFICATION_PROMPT, user_prompt,
+                                      temperature=0, max_tokens=200)
             
             result_text = response.choices[0].message.content.strip()
             # Parse JSON response
-            result = json.loads(result_text)
-            
-            # Validate and normalize
-            valid_priorities = ["critical", "high", "medium", "low"]
-            
-            # Use exact category from LLM
-            category = result.get("category", "General Inquiry")
-            # For backward compatibility/database schema, we'll store the simplified type as well if needed, 
-            # but for now we will use the category as the type or a sanitized version of it.
-            # However, prompt instruction says "category" is the output. 
-            # We will use the category name directly as the 'type' in the database.
-            ticket_type = category
-            
-            priority = result.get("priority", "medium").lower()
-            confidence_raw = result.get("confidence", 80)
-            confidence = float(confidence_raw) / 100.0  # Convert 0-100 to 0-1
-            reason = result.get("reason", "")
-            
-            if priority not in valid_priorities:
-                priority = "medium"
-            
-            print(f"Classification: type='{ticket_type}', priority='{priority}', confidence={confidence}, reason='{reason}'")
-            
-            return {
-                "type": ticket_type,
-                "priority": priority,
-                "confidence": min(max(confidence, 0.0), 1.0),
-                "category": category,
-                "reason": reason
-            }
-            reason = result.get("reason", "")
-            
-            if priority not in valid_priorities:
-                priority = "medium"
-            
-            print(f"Classification: category='{category}' -> type='{ticket_type}', priority='{priority}', confidence={confidence}, reason='{reason}'")
-            
-            return {
-                "type": ticket_type,
-                "priority": priority,
-                "confidence": min(max(confidence, 0.0), 1.0),
-                "category": category,
-                "reason": reason
-            }
-            
+            classification = self._to_classification(json.loads(result_text))
+            print(f"Classification: type='{classification['type']}', priority='{classification['priority']}', "
+                  f"confidence={classification['confidence']}, reason='{classification['reason']}'")
+
+            # Only successful classifications are cached; fallbacks below are retried next time
+            self.classification_cache.put(self.model, PROMPT_VERSION, title, description, classification)
+            return classification
+
         except json.JSONDecodeError as e:
             print(f"JSON parse error: {e}")
             return {
@@ -142,29 +275,137 @@ class GroqService:
                 "priority": "medium",
                 "confidence": 0.0,
                 "category": "General Inquiry",
-                "reason": "Failed to parse model output"
+                "reason": "Failed to parse model output",
+                "source": "fallback"
             }
         except Exception as e:
             print(f"Classification error: {e}")
             return {
                 "type": "general",
                 "priority": "medium",
-                "confidence": 0.5,
+                "confidence": 0.0,
                 "category": "General Inquiry",
-                "reason": str(e)
+                "reason": str(e),
+                "source": "fallback",
+                "degraded": True
             }
 
-    def generate_response(
-        self, 
-        title: str, 
-        description: str, 
-        ticket_type: str,
-        context: Optional[str] = None
-    ) -> Tuple[str, float]:
+    @staticmethod
+    def _to_classification(result: dict) -> dict:
+        """Validate and normalize one classification object from the model"""
+        # The exact category from the LLM is stored as the ticket 'type'
+        category = result.get("category", "General Inquiry")
+        priority = str(result.get("priority", "medium")).lower()
+        if priority not in VALID_PRIORITIES:
+            priority = "medium"
+        confidence = float(result.get("confidence", 80)) / 100.0  # Convert 0-100 to 0-1
+        return {
+            "type": category,
+            "priority": priority,
+            "confidence": min(max(confidence, 0.0), 1.0),
+            "category": category,
+            "reason": result.get("reason", "")
+        }
+
+    @staticmethod
+    def _is_valid_batch_item(item) -> bool:
+        """Batch items are held to the full schema; anything else is retried on its own"""
+        if not isinstance(item, dict) or not isinstance(item.get("category"), str) or not item["category"].strip():
+            return False
+        if str(item.get("priority", "")).lower() not in VALID_PRIORITIES:
+            return False
+        try:
+            float(item.get("confidence"))
+        except (TypeError, ValueError):
+            return False
+        return True
+
+    def _batches(self, items: List[Tuple[int, str, str]]) -> Iterator[List[Tuple[int, str, str]]]:
+        """Split (position, title, description) items by CLASSIFY_BATCH_SIZE and the prompt token budget"""
+        batch, budget = [], estimate_tokens(CLASSIFICATION_PROMPT + BATCH_PROMPT_TEMPLATE)
+        used = budget
+        for item in items:
+            cost = estimate_tokens(BATCH_TICKET_TEMPLATE.format(index=0, title=item[1], description=item[2]))
+            if batch and (len(batch) >= CLASSIFY_BATCH_SIZE or used + cost > CLASSIFY_BATCH_MAX_PROMPT_TOKENS):
+                yield batch
+                batch, used = [], budget
+            batch.append(item)
+            used += cost
+        if batch:
+            yield batch
+
+    def _classify_batch_llm(self, batch: List[Tuple[int, str, str]], lane: int) -> Dict[int, dict]:
+        """One LLM call for the whole batch; returns the valid results by batch index"""
+        tickets = "\n".join(
+            BATCH_TICKET_TEMPLATE.format(index=i, title=title, description=description)
+            for i, (_, title, description) in enumerate(batch)
+        )
+        user_prompt = BATCH_PROMPT_TEMPLATE.format(count=len(batch), tickets=tickets)
+        response = self._complete("classify_batch", lane, CLASSIFICATION_PROMPT, user_prompt, temperature=0,
+                                  max_tokens=CLASSIFY_BATCH_TOKENS_PER_ITEM * len(batch), items=len(batch))
+        content = response.choices[0].message.content.strip()
+        if content.startswith("```"):
+            content = content.strip("`").removeprefix("json").strip()
+        items = json.loads(content)
+        if isinstance(items, dict):
+            items = items.get("results", items.get("tickets", []))
+
+        results = {}
+        for item in items if isinstance(items, list) else []:
+            index = item.get("index") if isinstance(item, dict) else None
+            if isinstance(index, int) and 0 <= index < len(batch) and index not in results \
+                    and self._is_valid_batch_item(item):
+                results[index] = self._to_classification(item)
+        return results
+
+    def classify_tickets_batch(self, tickets: List[Tuple[str, str]], lane: int = INTERACTIVE) -> List[dict]:
         """
-        Generate a suggested response using Groq LLM.
-        Now returns a calculated confidence score based on context relevance.
+        Classify several (title, description) tickets, packing the ones that
+        need the LLM into as few requests as possible. Results come back in
+        input order and are cached exactly like classify_ticket's, so later
+        single calls for the same tickets are cache hits. Items the batch
+        response leaves out or gets wrong fall back to classify_ticket.
+        """
+        results: List[Optional[dict]] = [None] * len(tickets)
+        pending = []
+        for position, (title, description) in enumerate(tickets):
+            cached = self.classification_cache.get(self.model, PROMPT_VERSION, title, description)
+            if cached is None:
+                cached = self.fast_classifier.classify(title, description)
+            if cached is not None:
+                results[position] = cached
+            else:
+                pending.append((position, title, description))
+
+        for batch in self._batches(pending):
+            valid = {}
+            if len(batch) > 1:
+                try:
+                    valid = self._classify_batch_llm(batch, lane)
+                except Exception as e:
+                    print(f"Batch classification error ({len(batch)} tickets): {e}")
+                with self._batch_lock:
+                    self.batch_stats["batches"] += 1
+                    self.batch_stats["batched_items"] += len(valid)
+                    self.batch_stats["fallback_items"] += len(batch) - len(valid)
+            for i, (position, title, description) in enumerate(batch):
+                if i in valid:
+                    results[position] = valid[i]
+                    self.classification_cache.put(self.model, PROMPT_VERSION, title, description, valid[i])
+                else:
+                    results[position] = self.classify_ticket(title, description, lane)
+
+        print(f"Batch classification: {len(tickets)} tickets, {len(pending)} sent to the LLM")
+        return results
+
+    def _build_response_prompt(self, title: str, description: str, ticket_type: str,
+                               context: ContextInput) -> Tuple[str, dict]:
+        """
+        Response prompt with the description and knowledge base context
+        compressed to their token budgets (see services/prompt_builder.py).
+        Returns the prompt and the builder's token stats.
         """
+        description, context, stats = prepare_response_inputs(description, context)
         context_str = f"Relevant Knowledge Base Context:\n{context}" if context else "No specific knowledge base context available."
         
         prompt = f"""
@@ -192,42 +433,136 @@ OUTPUT FORMAT (JSON ONLY):
   "confidence": <int>
 }}
 """
+        return prompt, stats
+
+    @staticmethod
+    def _parse_response_json(content: str) -> Tuple[str, float]:
+        content = content.strip()
+        # Clean potential markdown fences
+        if content.startswith("```json"):
+            content = content.replace("```json", "").replace("```", "")
+        if content.startswith("```"):
+            content = content.replace("```", "")
+        
+        data = json.loads(content)
+        
+        suggested_response = data.get("response", "Thank you for contacting us. We received your request.")
+        confidence_raw = data.get("confidence", 50)
+        
+        # Normalize to 0.0 - 1.0
+        confidence = min(max(float(confidence_raw) / 100.0, 0.0), 1.0)
+        return suggested_response, confidence
+
+    def generate_response(
+        self, 
+        title: str, 
+        description: str, 
+        ticket_type: str,
+        context: ContextInput = None,
+        lane: int = INTERACTIVE
+    ) -> Tuple[str, float]:
+        """
+        Generate a suggested response using Groq LLM.
+        Now returns a calculated confidence score based on context relevance.
+        `context` is a list of knowledge base search results (text, score,
+        metadata) or a pre-formatted bullet list.
+        """
+        prompt, stats = self._build_response_prompt(title, description, ticket_type, context)
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a helpful support agent. Output strictly valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3, # Lower temperature for stable JSON
-                max_tokens=800
-            )
-            
-            content = response.choices[0].message.content.strip()
-            # Clean potential markdown fences
-            if content.startswith("```json"):
-                content = content.replace("```json", "").replace("```", "")
-            if content.startswith("```"):
-                content = content.replace("```", "")
+            response = self._complete("generate", lane, RESPONSE_SYSTEM_PROMPT, prompt,
+                                      temperature=0.3,  # Lower temperature for stable JSON
+                                      max_tokens=RESPONSE_MAX_TOKENS, trimmed_tokens=stats["trimmed_tokens"])
             
-            data = json.loads(content)
-            
-            suggested_response = data.get("response", "Thank you for contacting us. We received your request.")
-            confidence_raw = data.get("confidence", 50)
-            
-            # Normalize to 0.0 - 1.0
-            confidence = min(max(float(confidence_raw) / 100.0, 0.0), 1.0)
+            suggested_response, confidence = self._parse_response_json(response.choices[0].message.content)
             
             print(f"Generated Response Confidence: {confidence}")
             return suggested_response, confidence
             
         except Exception as e:
             print(f"Response generation error: {e}")
-            return "I apologize, but I am unable to generate a response at this time. An agent will review your ticket shortly.", 0.0
+            return FALLBACK_RESPONSE, 0.0
+
+    def generate_response_stream(
+        self,
+        title: str,
+        description: str,
+        ticket_type: str,
+        context: ContextInput = None,
+        lane: int = INTERACTIVE
+    ) -> Iterator[dict]:
+        """
+        Streaming variant of generate_response.
+        Yields {"type": "token", "text": ...} as the "response" field arrives,
+        then a final {"type": "done", "response": ..., "confidence": ...}.
+        """
+        prompt, stats = self._build_response_prompt(title, description, ticket_type, context)
+        extractor = ResponseFieldExtractor()
+        streamed = []
+        usage = None
+        prompt_tokens = estimate_tokens(RESPONSE_SYSTEM_PROMPT + prompt)
+        start = time.perf_counter()
+
+        try:
+            stream = self.guard.call(
+                self.client.chat.completions.create,
+                lane=lane,
+                prompt_tokens=prompt_tokens,
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": RESPONSE_SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.3,
+                max_tokens=RESPONSE_MAX_TOKENS,
+                stream=True
+            )
+            for chunk in stream:
+                # Groq reports usage on the final chunk (x_groq.usage)
+                x_groq = getattr(chunk, "x_groq", None)
+                usage = usage_tokens(getattr(chunk, "usage", None) or getattr(x_groq, "usage", None)) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                text = extractor.feed(delta)
+                if text:
+                    streamed.append(text)
+                    yield {"type": "token", "text": text}
+        except Exception as e:
+            print(f"Response streaming error: {e}")
+            if not streamed:
+                yield {"type": "token", "text": FALLBACK_RESPONSE}
+                yield {"type": "done", "response": FALLBACK_RESPONSE, "confidence": 0.0}
+                return
+
+        record_llm_usage("generate_stream", self.model, lane,
+                         *(usage or (prompt_tokens, estimate_tokens(extractor.buffer))),
+                         time.perf_counter() - start, estimated=usage is None,
+                         trimmed_tokens=stats["trimmed_tokens"])
+
+        # Confidence comes after the response field, so parse the full body at the end
+        try:
+            suggested_response, confidence = self._parse_response_json(extractor.buffer)
+        except Exception as e:
+            print(f"Streamed response parse error: {e}")
+            suggested_response, confidence = "".join(streamed) or FALLBACK_RESPONSE, 0.0
+
+        print(f"Generated Response Confidence: {confidence}")
+        yield {"type": "done", "response": suggested_response, "confidence": confidence}
+
+    def get_stats(self) -> dict:
+        with self._batch_lock:
+            batch = dict(self.batch_stats)
+        return {**self.guard.get_stats(), "batch_classification": batch}
 
-# Singleton instance
-groq_service = GroqService()
+# Singleton instance, built on first use: importing this module must not open
+# the classification cache or load the fast classifier
+_groq_service = None
+_groq_service_lock = threading.Lock()
 
-def get_groq_service():
-    return groq_service
+def get_groq_service() -> GroqService:
+    global _groq_service
+    with _groq_service_lock:
+        if _groq_service is None:
+            _groq_service = GroqService()
+    return _groq_service
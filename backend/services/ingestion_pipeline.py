@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+import time
+import zlib
+from typing import Any, Callable, Optional
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))  # per worker
+
+_STOP = object()
+
+
+class IngestionPipeline:
+    """
+    Bounded, sharded worker pool between the IMAP fetcher and ticket creation.
+
+    Each worker owns its own bounded queue. Jobs are routed by a key (the
+    sender address), so every email from the same sender is handled by the
+    same worker in arrival order while different senders run concurrently.
+    When a worker's queue is full, submit() blocks the fetcher (backpressure)
+    instead of buffering without limit.
+    """
+
+    def __init__(self, handler: Callable[[Any], None], workers: int = INGEST_WORKERS,
+                 queue_size: int = INGEST_QUEUE_SIZE, name: str = "ingest"):
+        self.handler = handler
+        self.name = name
+        self.queue_size = queue_size
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in range(max(workers, 1))]
+        self._threads = []
+        self._lock = threading.Lock()
+        self.running = False
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "in_flight": 0,
+            "backpressure_events": 0,
+            "backpressure_wait_s": 0.0,
+            "max_depth": 0,
+        }
+
+    def start(self):
+        if self.running: return
+        self.running = True
+        self._threads = []
+        for i, q in enumerate(self._queues):
+            thread = threading.Thread(target=self._worker, args=(q,), name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float = 1.0) -> list:
+        """
+        Stop the workers and return the jobs still queued (they are dropped,
+        so owners must be able to pick them up again on the next start).
+        """
+        self.running = False
+        for q in self._queues:
+            try:
+                q.put_nowait(_STOP)
+            except queue.Full:
+                pass  # worker exits on its next loop check
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+        dropped = []
+        for q in self._queues:
+            while True:
+                try:
+                    job = q.get_nowait()
+                except queue.Empty:
+                    break
+                q.task_done()
+                if job is not _STOP:
+                    dropped.append(job)
+        if dropped:
+            print(f"{self.name} pipeline stopped with {len(dropped)} queued jobs")
+        return dropped
+
+    def shard_for(self, key: Optional[str]) -> int:
+        return zlib.crc32((key or "").lower().encode("utf-8")) % len(self._queues)
+
+    def depth(self) -> int:
+        return sum(q.qsize() for q in self._queues)
+
+    def submit(self, key: Optional[str], job: Any):
+        """Enqueue a job, blocking while the target worker's queue is full"""
+        q = self._queues[self.shard_for(key)]
+        try:
+            q.put_nowait(job)
+        except queue.Full:
+            started = time.monotonic()
+            with self._lock:
+                self._stats["backpressure_events"] += 1
+            while True:
+                try:
+                    q.put(job, timeout=0.5)
+                    break
+                except queue.Full:
+                    if not self.running:
+                        raise RuntimeError("Ingestion pipeline stopped while waiting for queue space")
+            with self._lock:
+                self._stats["backpressure_wait_s"] += time.monotonic() - started
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["max_depth"] = max(self._stats["max_depth"], self.depth())
+
+    def join(self):
+        """Block until every submitted job has been processed"""
+        for q in self._queues:
+            q.join()
+
+    def _worker(self, q: queue.Queue):
+        while self.running:
+            try:
+                job = q.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if job is _STOP:
+                q.task_done()
+                break
+
+            with self._lock:
+                self._stats["in_flight"] += 1
+            try:
+                self.handler(job)
+                outcome = "completed"
+            except Exception as e:
+                print(f"Ingestion worker error: {e}")
+                outcome = "failed"
+            finally:
+                with self._lock:
+                    self._stats["in_flight"] -= 1
+                    self._stats[outcome] += 1
+                q.task_done()
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        depths = [q.qsize() for q in self._queues]
+        stats["backpressure_wait_s"] = round(stats["backpressure_wait_s"], 3)
+        stats.update({
+            "workers": len(self._queues),
+            "queue_capacity_per_worker": self.queue_size,
+            "queue_depth": sum(depths),
+            "queue_depth_per_worker": depths,
+        })
+        return stats
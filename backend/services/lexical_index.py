@@ -0,0 +1,151 @@
+"""
+Lexical (BM25) index over the knowledge base, backed by SQLite FTS5.
+
+Mirrors what RAGService puts in the vector store (document chunks, seed
+FAQs and learned Q&A pairs) under the same ids, so lexical and vector
+results can be fused by id. Catches exact tokens that dense retrieval
+tends to miss: error codes, invoice numbers, API paths.
+
+Lives in its own database file so indexing never contends with the
+write transactions the knowledge routes hold on the main database.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+from database import get_db
+
+LEXICAL_DB_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "lexical_index.db")
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+MAX_QUERY_TOKENS = 32
+
+
+def build_match_query(text: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 OR-query of quoted tokens"""
+    tokens = list(dict.fromkeys(t.lower() for t in TOKEN_PATTERN.findall(text or "")))[:MAX_QUERY_TOKENS]
+    if not tokens:
+        return None
+    return " OR ".join('"' + token.replace('"', '""') + '"' for token in tokens)
+
+
+class LexicalIndex:
+    def __init__(self, path: str = LEXICAL_DB_PATH):
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # One shared connection guarded by self._lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS knowledge_fts USING fts5(
+                text,
+                vector_id UNINDEXED,
+                document_id UNINDEXED,
+                metadata UNINDEXED,
+                tokenize = 'porter unicode61'
+            )
+        """)
+        # UNINDEXED FTS5 columns can only be filtered by scanning the whole
+        # index, so deletes go through this rowid map instead
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS knowledge_entries (
+                id INTEGER PRIMARY KEY,
+                vector_id TEXT NOT NULL UNIQUE,
+                document_id INTEGER
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_knowledge_entries_document ON knowledge_entries(document_id)")
+        # Index files written before the map existed
+        if self._conn.execute("SELECT 1 FROM knowledge_entries LIMIT 1").fetchone() is None:
+            self._conn.execute("""
+                INSERT OR IGNORE INTO knowledge_entries (id, vector_id, document_id)
+                SELECT rowid, vector_id, document_id FROM knowledge_fts
+            """)
+        self._conn.commit()
+
+    def add(self, entries: List[Tuple[str, str, dict]]):
+        """Index (vector_id, text, metadata) entries, replacing any with the same id"""
+        if not entries:
+            return
+        # A repeated id keeps its last entry, as it would with one add() per entry
+        entries = list({vector_id: (vector_id, text, metadata) for vector_id, text, metadata in entries}.values())
+        ids = [(vector_id,) for vector_id, _, _ in entries]
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM knowledge_fts WHERE rowid = (SELECT id FROM knowledge_entries WHERE vector_id = ?)", ids)
+            self._conn.executemany("DELETE FROM knowledge_entries WHERE vector_id = ?", ids)
+            self._conn.executemany("INSERT INTO knowledge_entries (vector_id, document_id) VALUES (?, ?)", [
+                (vector_id, metadata.get("document_id")) for vector_id, _, metadata in entries
+            ])
+            self._conn.executemany("""
+                INSERT INTO knowledge_fts (rowid, text, vector_id, document_id, metadata)
+                VALUES ((SELECT id FROM knowledge_entries WHERE vector_id = ?), ?, ?, ?, ?)
+            """, [
+                (vector_id, text, vector_id, metadata.get("document_id"), json.dumps(metadata))
+                for vector_id, text, metadata in entries
+            ])
+            self._conn.commit()
+
+    def remove_document(self, document_id: int):
+        with self._lock:
+            self._conn.execute("""
+                DELETE FROM knowledge_fts
+                WHERE rowid IN (SELECT id FROM knowledge_entries WHERE document_id = ?)
+            """, (document_id,))
+            self._conn.execute("DELETE FROM knowledge_entries WHERE document_id = ?", (document_id,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM knowledge_entries").fetchone()[0]
+
+    def rebuild_from_chunks(self) -> int:
+        """Index every chunk in document_chunks (used when the index starts out empty)"""
+        with get_db() as conn:
+            cursor = conn.execute("""
+                SELECT c.document_id, c.chunk_index, c.content, d.original_filename
+                FROM document_chunks c
+                JOIN knowledge_documents d ON d.id = c.document_id
+            """)
+            entries = [
+                (f"doc_{row['document_id']}_chunk_{row['chunk_index']}", row["content"], {
+                    "document_id": row["document_id"],
+                    "filename": row["original_filename"],
+                    "text": row["content"],
+                    "chunk_index": row["chunk_index"]
+                })
+                for row in cursor.fetchall()
+            ]
+        self.add(entries)
+        return len(entries)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[str, str, float, dict]]:
+        """Return (vector_id, text, bm25_score, metadata) best first; higher score is better"""
+        match_query = build_match_query(query)
+        if not match_query:
+            return []
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT vector_id, text, metadata, bm25(knowledge_fts) AS rank
+                FROM knowledge_fts
+                WHERE knowledge_fts MATCH ?
+                ORDER BY rank
+                LIMIT ?
+            """, (match_query, top_k)).fetchall()
+        # FTS5 bm25() is negative with lower meaning better; flip it for callers
+        return [(vector_id, text, -rank, json.loads(metadata or "{}")) for vector_id, text, metadata, rank in rows]
+
+
+# Singleton instance
+_lexical_index = None
+_lexical_index_lock = threading.Lock()
+
+def get_lexical_index() -> LexicalIndex:
+    global _lexical_index
+    with _lexical_index_lock:
+        if _lexical_index is None:
+            _lexical_index = LexicalIndex()
+    return _lexical_index
@@ -0,0 +1,263 @@
+"""
+Client-side protection for Groq calls, shared by every GroqService call.
+
+- Token buckets for requests/minute and tokens/minute (GROQ_RPM, GROQ_TPM)
+- Priority lanes: interactive calls (API requests, regenerate) are admitted
+  ahead of queued background work (email ingestion, draft generation)
+- Jittered exponential retry on 429/5xx/connection errors, honoring retry-after
+- A circuit breaker that fails fast while the provider keeps failing
+"""
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import groq
+
+GROQ_RPM = float(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = float(os.getenv("GROQ_TPM", "30000"))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "3"))
+GROQ_RETRY_BASE = float(os.getenv("GROQ_RETRY_BASE", "0.5"))  # seconds
+GROQ_RETRY_MAX = float(os.getenv("GROQ_RETRY_MAX", "20"))  # seconds
+GROQ_QUEUE_TIMEOUT = float(os.getenv("GROQ_QUEUE_TIMEOUT", "30"))  # seconds, interactive lane
+GROQ_BREAKER_THRESHOLD = int(os.getenv("GROQ_BREAKER_THRESHOLD", "5"))
+GROQ_BREAKER_RESET = float(os.getenv("GROQ_BREAKER_RESET", "30"))  # seconds
+
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+RETRYABLE_ERRORS = (groq.RateLimitError, groq.InternalServerError, groq.APIConnectionError, groq.APITimeoutError)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call waited longer than its lane allows for rate-limit capacity"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+class TokenBucket:
+    """Continuously refilling bucket; capacity is one minute's worth of budget"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)"""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def refund(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class CircuitBreaker:
+    """closed -> open after N consecutive failures -> half_open after a cool-down -> closed on success"""
+
+    def __init__(self, threshold: int = GROQ_BREAKER_THRESHOLD, reset_after: float = GROQ_BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> bool:
+        """Admit a call; True if it is the half-open probe (release it with release_probe)"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_after:
+                    raise CircuitOpenError("Groq circuit breaker is open")
+                self.state = "half_open"
+            if self.state == "half_open":
+                if self._probe_in_flight:
+                    raise CircuitOpenError("Groq circuit breaker is half-open (probe in flight)")
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release_probe(self):
+        """Let another probe through when ours ended without a verdict (queue timeout, 429)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._probe_in_flight = False
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.threshold:
+                if self.state != "open":
+                    print(f"Groq circuit breaker opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+class LLMGuard:
+    def __init__(self, rpm: float = GROQ_RPM, tpm: float = GROQ_TPM, max_retries: int = GROQ_MAX_RETRIES):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.breaker = CircuitBreaker()
+        self._cond = threading.Condition()
+        self._waiting = []  # heap of (lane, seq)
+        self._seq = itertools.count()
+        self.stats = {
+            "calls": 0, "retries": 0, "failures": 0, "rejected_open_circuit": 0, "queue_timeouts": 0,
+            "wait_s": {name: 0.0 for name in LANE_NAMES.values()},
+            "admitted": {name: 0 for name in LANE_NAMES.values()},
+        }
+
+    # --- Admission ---
+
+    def _acquire(self, lane: int, tokens: int, timeout: Optional[float]):
+        """Wait for rate-limit capacity; only the highest-priority waiter may take it"""
+        ticket = (lane, next(self._seq))
+        started = time.monotonic()
+        with self._cond:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    if self._waiting[0] == ticket:
+                        wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                        if wait == 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            break
+                    else:
+                        wait = 0.5  # woken early by notify_all when the head changes
+                    if timeout is not None and time.monotonic() - started + wait > timeout:
+                        self.stats["queue_timeouts"] += 1
+                        raise RateLimitTimeout(f"Waited over {timeout}s for Groq rate-limit capacity")
+                    self._cond.wait(wait)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+            name = LANE_NAMES[lane]
+            self.stats["admitted"][name] += 1
+            self.stats["wait_s"][name] += time.monotonic() - started
+
+    def _settle(self, estimated: int, response):
+        """Replace the token estimate with what the provider reports using"""
+        usage = getattr(response, "usage", None)
+        actual = getattr(usage, "total_tokens", None)
+        if actual is None:
+            return
+        with self._cond:
+            if actual < estimated:
+                self.tokens.refund(estimated - actual)
+            else:
+                self.tokens.take(actual - estimated)
+
+    # --- Retry ---
+
+    @staticmethod
+    def _retry_after(error: Exception) -> Optional[float]:
+        response = getattr(error, "response", None)
+        headers = getattr(response, "headers", None) or {}
+        value = headers.get("retry-after")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = self._retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, GROQ_RETRY_MAX)
+        # Full jitter
+        return random.uniform(0, min(GROQ_RETRY_MAX, GROQ_RETRY_BASE * 2 ** attempt))
+
+    def call(self, create: Callable, *, lane: int = INTERACTIVE, prompt_tokens: int = 0, max_tokens: int = 0, **kwargs):
+        """
+        Run create(**kwargs) (e.g. client.chat.completions.create) through
+        the limiter, breaker and retry policy.
+        """
+        estimated = prompt_tokens + max_tokens
+        timeout = GROQ_QUEUE_TIMEOUT if lane == INTERACTIVE else None
+        attempt = 0
+        while True:
+            try:
+                probe = self.breaker.before_call()
+            except CircuitOpenError:
+                with self._cond:
+                    self.stats["rejected_open_circuit"] += 1
+                raise
+            try:
+                self._acquire(lane, estimated, timeout)
+                with self._cond:
+                    self.stats["calls"] += 1
+                response = create(max_tokens=max_tokens, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                # Being throttled is not an outage; only 5xx/connection errors trip the breaker
+                if not isinstance(e, groq.RateLimitError):
+                    self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    with self._cond:
+                        self.stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                with self._cond:
+                    self.stats["retries"] += 1
+                print(f"Groq call failed ({type(e).__name__}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+            except RateLimitTimeout:
+                raise
+            except Exception:
+                # Client errors (bad request, auth) are not the provider being down
+                self.breaker.record_success()
+                with self._cond:
+                    self.stats["failures"] += 1
+                raise
+            finally:
+                if probe:
+                    self.breaker.release_probe()
+            self.breaker.record_success()
+            self._settle(estimated, response)
+            return response
+
+    def get_stats(self) -> dict:
+        with self._cond:
+            stats = {
+                **{k: v for k, v in self.stats.items() if not isinstance(v, dict)},
+                "admitted": dict(self.stats["admitted"]),
+                "wait_s": {k: round(v, 3) for k, v in self.stats["wait_s"].items()},
+                "queued": len(self._waiting),
+                "requests_available": round(self.requests.tokens, 1),
+                "tokens_available": round(self.tokens.tokens, 1),
+            }
+        stats["circuit"] = {"state": self.breaker.state, "consecutive_failures": self.breaker.failures}
+        return stats
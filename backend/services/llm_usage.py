@@ -0,0 +1,83 @@
+"""
+Per-call LLM token accounting for cost dashboards.
+
+Every Groq completion writes one llm_usage row with the provider-reported
+prompt/completion tokens (estimated when the provider doesn't report them,
+e.g. an interrupted stream) and how many input tokens the prompt builder
+trimmed. Recording never fails the LLM call it describes.
+"""
+import os
+from datetime import datetime, timedelta
+
+from database import get_db, get_read_db
+from services.llm_guard import LANE_NAMES
+
+# USD per million tokens; defaults are llama-3.1-8b-instant list prices
+LLM_PRICE_INPUT_PER_M = float(os.getenv("LLM_PRICE_INPUT_PER_M", "0.05"))
+LLM_PRICE_OUTPUT_PER_M = float(os.getenv("LLM_PRICE_OUTPUT_PER_M", "0.08"))
+
+
+def usage_tokens(usage):
+    """(prompt_tokens, completion_tokens) from a provider usage object, or None"""
+    prompt = getattr(usage, "prompt_tokens", None)
+    completion = getattr(usage, "completion_tokens", None)
+    if prompt is None or completion is None:
+        return None
+    return prompt, completion
+
+
+def record_llm_usage(operation: str, model: str, lane: int, prompt_tokens: int, completion_tokens: int,
+                     latency_s: float, estimated: bool = False, trimmed_tokens: int = 0, items: int = 1):
+    try:
+        with get_db() as conn:
+            conn.execute("""
+                INSERT INTO llm_usage (created_at, operation, model, lane, items, prompt_tokens,
+                                       completion_tokens, trimmed_tokens, latency_ms, estimated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (datetime.utcnow().isoformat(), operation, model, LANE_NAMES.get(lane, str(lane)), items,
+                  prompt_tokens, completion_tokens, trimmed_tokens, round(latency_s * 1000, 1), int(estimated)))
+    except Exception as e:
+        print(f"LLM usage recording error: {e}")
+
+
+def _cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return round((prompt_tokens * LLM_PRICE_INPUT_PER_M + completion_tokens * LLM_PRICE_OUTPUT_PER_M) / 1e6, 6)
+
+
+def summarize_llm_usage(days: int = 7) -> dict:
+    """Token totals, estimated cost and latency by operation and by day"""
+    since = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    columns = """
+        COUNT(*) AS calls,
+        COALESCE(SUM(items), 0) AS items,
+        COALESCE(SUM(prompt_tokens), 0) AS prompt_tokens,
+        COALESCE(SUM(completion_tokens), 0) AS completion_tokens,
+        COALESCE(SUM(trimmed_tokens), 0) AS trimmed_tokens,
+        AVG(latency_ms) AS avg_latency_ms,
+        COALESCE(SUM(estimated), 0) AS estimated_calls
+    """
+    with get_read_db() as conn:
+        totals = conn.execute(f"SELECT {columns} FROM llm_usage WHERE created_at >= ?", (since,)).fetchone()
+        by_operation = conn.execute(
+            f"SELECT operation, {columns} FROM llm_usage WHERE created_at >= ? GROUP BY operation ORDER BY operation",
+            (since,)
+        ).fetchall()
+        daily = conn.execute(
+            f"SELECT DATE(created_at) AS date, {columns} FROM llm_usage WHERE created_at >= ? "
+            f"GROUP BY DATE(created_at) ORDER BY date",
+            (since,)
+        ).fetchall()
+
+    def row_summary(row) -> dict:
+        summary = {key: row[key] for key in row.keys()}
+        summary["avg_latency_ms"] = round(summary["avg_latency_ms"], 1) if summary["avg_latency_ms"] is not None else None
+        summary["estimated_cost_usd"] = _cost(summary["prompt_tokens"], summary["completion_tokens"])
+        return summary
+
+    return {
+        "period_days": days,
+        "totals": row_summary(totals),
+        "by_operation": [row_summary(row) for row in by_operation],
+        "daily": [row_summary(row) for row in daily],
+        "pricing_per_million": {"input": LLM_PRICE_INPUT_PER_M, "output": LLM_PRICE_OUTPUT_PER_M},
+    }
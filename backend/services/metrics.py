@@ -0,0 +1,80 @@
+"""
+In-process latency histograms, keyed by pipeline and stage name.
+
+Each histogram keeps cumulative counts over fixed millisecond buckets
+plus a window of recent samples for percentile estimates.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+RECENT_SAMPLES = 1024
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)  # last bucket is +Inf
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, ms: float):
+        index = next((i for i, bound in enumerate(BUCKETS_MS) if ms <= bound), len(BUCKETS_MS))
+        self.counts[index] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.recent.append(ms)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.recent)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 2) if ordered else None
+
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 2) if self.total else None,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": {
+                **{f"le_{bound}": count for bound, count in zip(BUCKETS_MS, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class LatencyMetrics:
+    def __init__(self):
+        self._histograms: Dict[str, Dict[str, LatencyHistogram]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, pipeline: str, stage: str, seconds: float):
+        with self._lock:
+            stages = self._histograms.setdefault(pipeline, {})
+            stages.setdefault(stage, LatencyHistogram()).observe(seconds * 1000)
+
+    @contextmanager
+    def timer(self, pipeline: str, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(pipeline, stage, time.perf_counter() - start)
+
+    def snapshot(self, pipeline: str) -> dict:
+        with self._lock:
+            return {stage: histogram.snapshot() for stage, histogram in self._histograms.get(pipeline, {}).items()}
+
+
+# Singleton instance
+_latency_metrics = LatencyMetrics()
+
+def get_latency_metrics() -> LatencyMetrics:
+    return _latency_metrics
@@ -0,0 +1,264 @@
+"""
+Outbound mail subsystem.
+
+Messages are written to a durable SQLite outbox and the caller returns
+immediately. Background workers drain the outbox in batches over pooled,
+already-authenticated SMTP connections and retry transient failures with
+exponential backoff.
+"""
+import os
+import queue
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import List
+
+from database import get_db
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"  # "false" for a local SMTP stand-in
+SMTP_TIMEOUT = 30
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_IDLE_CHECK = 30  # seconds idle before a pooled connection is NOOP-checked
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_POLL_INTERVAL = 2
+OUTBOX_MAX_ATTEMPTS = 5
+RETRY_BACKOFF_BASE = 15   # seconds, doubled per attempt
+RETRY_BACKOFF_MAX = 1800
+
+
+class SMTPConnectionPool:
+    """Reusable authenticated SMTP connections"""
+
+    def __init__(self, username: str, password: str, size: int = SMTP_POOL_SIZE):
+        self.username = username
+        self.password = password
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "discarded": 0}
+
+    def _open(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        server.ehlo()
+        if SMTP_STARTTLS:
+            server.starttls()
+            server.ehlo()
+        if self.username and self.password and server.has_extn("auth"):
+            server.login(self.username, self.password)
+        with self._lock:
+            self.stats["opened"] += 1
+        return server
+
+    def _healthy(self, server: smtplib.SMTP) -> bool:
+        try:
+            return server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def _discard(self, server: smtplib.SMTP):
+        with self._lock:
+            self.stats["discarded"] += 1
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def get(self) -> smtplib.SMTP:
+        while True:
+            try:
+                server, idle_since = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if time.monotonic() - idle_since < SMTP_IDLE_CHECK or self._healthy(server):
+                with self._lock:
+                    self.stats["reused"] += 1
+                return server
+            self._discard(server)
+
+    def put(self, server: smtplib.SMTP, broken: bool = False):
+        if broken or self._idle.qsize() >= self.size:
+            self._discard(server)
+        else:
+            self._idle.put((server, time.monotonic()))
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(server)
+
+
+class OutboundMailService:
+    def __init__(self, sender: str, password: str, workers: int = OUTBOX_WORKERS):
+        self.sender = sender
+        self.pool = SMTPConnectionPool(sender, password)
+        self.workers = workers
+        self.running = False
+        self._threads = []
+        self._wakeup = threading.Event()
+
+    def start(self):
+        if self.running: return
+        self.running = True
+        # Messages claimed by a worker that died mid-send go back to the queue
+        with get_db() as conn:
+            conn.execute("UPDATE outbox SET status = 'pending' WHERE status = 'sending'")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"outbox-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+        self.pool.close()
+
+    def enqueue(self, to_email: str, subject: str, body: str) -> int:
+        """Persist a message to the outbox and return its id without touching SMTP"""
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO outbox (to_email, subject, body, status, attempts, next_attempt_at, created_at)
+                VALUES (?, ?, ?, 'pending', 0, ?, ?)
+            """, (to_email, subject, body, time.time(), datetime.utcnow().isoformat()))
+            outbox_id = cursor.lastrowid
+        self._wakeup.set()
+        return outbox_id
+
+    def _build_message(self, to_email: str, subject: str, body: str) -> str:
+        msg = MIMEMultipart()
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+        return msg.as_string()
+
+    def _claim_batch(self) -> List[dict]:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            # IMMEDIATE takes the write lock up front so two workers can't claim the same rows
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("""
+                SELECT * FROM outbox
+                WHERE status = 'pending' AND next_attempt_at <= ?
+                ORDER BY id LIMIT ?
+            """, (time.time(), OUTBOX_BATCH_SIZE))
+            rows = [dict(row) for row in cursor.fetchall()]
+            if rows:
+                placeholders = ','.join(['?'] * len(rows))
+                cursor.execute(f"UPDATE outbox SET status = 'sending' WHERE id IN ({placeholders})",
+                               [row["id"] for row in rows])
+            return rows
+
+    def _mark_sent(self, outbox_id: int):
+        with get_db() as conn:
+            conn.execute("UPDATE outbox SET status = 'sent', sent_at = ?, last_error = NULL WHERE id = ?",
+                         (datetime.utcnow().isoformat(), outbox_id))
+
+    def _mark_failed(self, row: dict, error: Exception, permanent: bool = False):
+        attempts = row["attempts"] + 1
+        if permanent or attempts >= OUTBOX_MAX_ATTEMPTS:
+            status, next_attempt_at = "failed", row["next_attempt_at"]
+            print(f"Outbox: giving up on message {row['id']} to {row['to_email']}: {error}")
+        else:
+            delay = min(RETRY_BACKOFF_BASE * (2 ** (attempts - 1)), RETRY_BACKOFF_MAX)
+            status, next_attempt_at = "pending", time.time() + delay * random.uniform(0.8, 1.2)
+            print(f"Outbox: send to {row['to_email']} failed (attempt {attempts}), retrying in {delay}s: {error}")
+        with get_db() as conn:
+            conn.execute("""
+                UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+                WHERE id = ?
+            """, (status, attempts, next_attempt_at, str(error)[:500], row["id"]))
+
+    def _reschedule(self, rows: List[dict], error: Exception):
+        """Put untried messages back for a later batch without spending one of their attempts"""
+        if not rows:
+            return
+        next_attempt_at = time.time() + RETRY_BACKOFF_BASE * random.uniform(0.8, 1.2)
+        print(f"Outbox: SMTP unavailable, deferring {len(rows)} messages by ~{RETRY_BACKOFF_BASE}s: {error}")
+        placeholders = ','.join(['?'] * len(rows))
+        with get_db() as conn:
+            conn.execute(f"""
+                UPDATE outbox SET status = 'pending', next_attempt_at = ?, last_error = ?
+                WHERE id IN ({placeholders})
+            """, [next_attempt_at, str(error)[:500]] + [row["id"] for row in rows])
+
+    def _send_batch(self, rows: List[dict]):
+        """
+        Send a claimed batch, reusing one pooled connection for as long as it
+        stays up. A dropped connection is reopened once per batch (pooled
+        connections can go stale); if the server can't be reached, the rest
+        of the batch is deferred at once rather than reconnecting per message.
+        """
+        pending = list(rows)
+        reconnected = False
+        while pending:
+            try:
+                server = self.pool.get()
+            except Exception as e:
+                self._mark_failed(pending.pop(0), e)
+                self._reschedule(pending, e)
+                return
+            broken = False
+            try:
+                while pending:
+                    row = pending[0]
+                    try:
+                        server.sendmail(self.sender, row["to_email"],
+                                        self._build_message(row["to_email"], row["subject"], row["body"]))
+                        self._mark_sent(row["id"])
+                    except smtplib.SMTPRecipientsRefused as e:
+                        self._mark_failed(row, e, permanent=True)
+                    except smtplib.SMTPResponseException as e:
+                        # 5xx is permanent, 4xx is worth retrying
+                        self._mark_failed(row, e, permanent=e.smtp_code >= 500)
+                    pending.pop(0)
+            except Exception as e:
+                # Connection-level failure: retry the current message later
+                broken = True
+                self._mark_failed(pending.pop(0), e)
+                if reconnected:
+                    self._reschedule(pending, e)
+                    return
+                reconnected = True
+            finally:
+                self.pool.put(server, broken=broken)
+
+    def _worker(self):
+        while self.running:
+            try:
+                rows = self._claim_batch()
+            except Exception as e:
+                print(f"Outbox claim error: {e}")
+                rows = []
+            if rows:
+                self._send_batch(rows)
+                continue
+            self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+            self._wakeup.clear()
+
+    def get_stats(self) -> dict:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")
+            counts = {status: count for status, count in cursor.fetchall()}
+        return {
+            "outbox": counts,
+            "workers": len(self._threads),
+            "pool": dict(self.pool.stats, idle=self.pool._idle.qsize()),
+        }
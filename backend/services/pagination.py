@@ -0,0 +1,60 @@
+"""
+Keyset (cursor) pagination on (created_at, id), newest first.
+
+A cursor is the opaque, URL-safe base64 encoding of the last row's
+[created_at, id]. The next page is `WHERE (created_at, id) < (?, ?)`,
+which SQLite answers from an index on created_at (the rowid is the
+implicit last index column), so every page costs O(page) however deep it
+is and rows inserted meanwhile never shift or duplicate results.
+"""
+import base64
+import binascii
+import json
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException
+
+KEYSET_ORDER = "ORDER BY {alias}created_at DESC, {alias}id DESC"
+KEYSET_CONDITION = "({alias}created_at, {alias}id) < (?, ?)"
+
+
+def encode_cursor(created_at, row_id: int) -> str:
+    raw = json.dumps([created_at, row_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    """(created_at, id) from a cursor; HTTP 400 if it was not issued by encode_cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, row_id = json.loads(raw)
+        if not isinstance(created_at, str) or not isinstance(row_id, int):
+            raise ValueError
+        return created_at, row_id
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def keyset_clause(cursor: Optional[str], limit: int, alias: str = "") -> Tuple[str, str, list]:
+    """
+    (extra WHERE condition or "", ORDER BY ... LIMIT ?, params) for a page.
+    One row more than `limit` is fetched to tell whether another page exists.
+    An empty cursor starts at the newest row. HTTP 400 if `limit` < 1, whose
+    page would be empty yet still advance the cursor.
+    """
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+    prefix = f"{alias}." if alias else ""
+    condition, params = "", []
+    if cursor:
+        condition = KEYSET_CONDITION.format(alias=prefix)
+        params = list(decode_cursor(cursor))
+    return condition, f"{KEYSET_ORDER.format(alias=prefix)} LIMIT ?", params + [limit + 1]
+
+
+def split_page(rows: List, limit: int) -> Tuple[List, Optional[str]]:
+    """The page's rows and the cursor for the next page (None on the last page)"""
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], encode_cursor(last["created_at"], last["id"])
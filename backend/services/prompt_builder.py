@@ -0,0 +1,220 @@
+"""
+Prompt-size budgeting for response generation.
+
+Ticket descriptions are often whole email bodies: quoted reply chains,
+signatures and mobile footers that cost tokens without helping the draft.
+Knowledge base hits overlap (adjacent chunks share text, the learning loop
+stores near-identical Q/A pairs). This module trims both to a token budget,
+keeping the highest-scoring context first.
+"""
+import os
+import re
+from typing import List, Optional, Tuple, Union
+
+from services.llm_guard import estimate_tokens
+
+PROMPT_DESCRIPTION_TOKENS = int(os.getenv("PROMPT_DESCRIPTION_TOKENS", "1000"))
+PROMPT_CONTEXT_TOKENS = int(os.getenv("PROMPT_CONTEXT_TOKENS", "1200"))
+PROMPT_CONTEXT_CANDIDATES = int(os.getenv("PROMPT_CONTEXT_CANDIDATES", "5"))  # search hits considered
+PROMPT_DEDUP_THRESHOLD = float(os.getenv("PROMPT_DEDUP_THRESHOLD", "0.7"))  # shingle containment
+
+MIN_OVERLAP_WORDS = 8  # shared run between adjacent chunks worth trimming
+MIN_PARTIAL_CHUNK_TOKENS = 60  # smallest truncated chunk worth including
+SIGNATURE_MAX_LINES = 6  # a signature is at most this many name/contact lines
+SIGNATURE_LINE_MAX_CHARS = 60
+TRUNCATION_MARKER = " [...]"
+
+# Start of a quoted reply chain: everything from here on is history
+QUOTE_HEADER_PATTERNS = [
+    re.compile(r"^\s*On .{0,200}wrote:\s*$", re.IGNORECASE),
+    re.compile(r"^\s*-{2,}\s*(Original|Forwarded) Message\s*-{2,}", re.IGNORECASE),
+    re.compile(r"^\s*Begin forwarded message:", re.IGNORECASE),
+    re.compile(r"^\s*_{10,}\s*$"),  # Outlook separator
+]
+OUTLOOK_HEADER_PATTERN = re.compile(r"^\s*From:\s.+", re.IGNORECASE)
+OUTLOOK_FIELD_PATTERN = re.compile(r"^\s*(Sent|Date|To|Subject):\s", re.IGNORECASE)
+SIGNATURE_DELIMITER_PATTERN = re.compile(r"^--\s*$")
+MOBILE_FOOTER_PATTERN = re.compile(r"^\s*Sent from my \w+", re.IGNORECASE)
+CLOSING_PATTERN = re.compile(
+    r"^\s*(best|kind|warm)?\s*(regards|thanks|thank you|many thanks|cheers|sincerely|best wishes|best)\s*[,.!]?\s*$",
+    re.IGNORECASE,
+)
+SIGNATURE_CONTACT_PATTERNS = [
+    re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+"),  # email address
+    re.compile(r"(https?://|www\.)\S+", re.IGNORECASE),
+    re.compile(r"\+?\d[\d\s().-]{6,}\d"),  # phone number
+    re.compile(r"^\s*(tel|phone|mobile|cell|fax|email|e-mail|web|website|[tmpwe])\s*[:.]\s*\S", re.IGNORECASE),
+]
+SIGNATURE_NAME_CONNECTIVES = {"of", "and", "at", "the", "for", "&", "|", "-"}
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+WORD_PATTERN = re.compile(r"\w+")
+
+ContextInput = Union[str, List[Tuple[str, float, dict]], None]
+
+
+def count_tokens(text: Optional[str]) -> int:
+    return estimate_tokens(text) if text else 0
+
+
+def strip_quoted_history(text: str) -> str:
+    """Drop '>' quoted lines and everything after a reply/forward header"""
+    lines = text.splitlines()
+    kept = []
+    for i, line in enumerate(lines):
+        if any(pattern.match(line) for pattern in QUOTE_HEADER_PATTERNS):
+            break
+        # Gmail wraps long "On <date>, <name> wrote:" headers onto two lines
+        if i + 1 < len(lines) and line.strip().lower().startswith("on ") \
+                and QUOTE_HEADER_PATTERNS[0].match(f"{line} {lines[i + 1].strip()}"):
+            break
+        if OUTLOOK_HEADER_PATTERN.match(line) and any(
+                OUTLOOK_FIELD_PATTERN.match(following) for following in lines[i + 1:i + 4]):
+            break
+        if line.lstrip().startswith(">"):
+            continue
+        kept.append(line)
+    return "\n".join(kept)
+
+
+def _is_signature_line(line: str) -> bool:
+    """A short name/title/company line, or a contact line (email, phone, URL)"""
+    line = line.strip()
+    if len(line) > SIGNATURE_LINE_MAX_CHARS:
+        return False
+    if any(pattern.search(line) for pattern in SIGNATURE_CONTACT_PATTERNS):
+        return True
+    words = line.replace(",", " ").split()
+    return 0 < len(words) <= SIGNATURE_MAX_LINES and all(
+        word[0].isupper() or not word[0].isalpha() or word.lower() in SIGNATURE_NAME_CONNECTIVES
+        for word in words
+    )
+
+
+def _only_signature_follows(lines: List[str], start: int) -> bool:
+    following = [line for line in lines[start + 1:] if line.strip()]
+    return len(following) <= SIGNATURE_MAX_LINES and all(_is_signature_line(line) for line in following)
+
+
+def strip_signature(text: str) -> str:
+    """
+    Cut at a '-- ' delimiter or a closing line ("Thanks,") when only a few
+    name/contact lines follow it, and drop mobile footers. A closing or
+    '--' in the middle of the message is left alone.
+    """
+    lines = [line for line in text.splitlines() if not MOBILE_FOOTER_PATTERN.match(line)]
+    for i, line in enumerate(lines):
+        if (SIGNATURE_DELIMITER_PATTERN.match(line) or (i > 0 and CLOSING_PATTERN.match(line))) \
+                and _only_signature_follows(lines, i):
+            return "\n".join(lines[:i])
+    return "\n".join(lines)
+
+
+def clean_description(description: Optional[str]) -> str:
+    """Email body without quoted history, signature or excess blank lines"""
+    if not description:
+        return ""
+    cleaned = strip_signature(strip_quoted_history(description.replace("\r\n", "\n")))
+    cleaned = BLANK_LINES_PATTERN.sub("\n\n", cleaned).strip()
+    # Never strip a message down to nothing (e.g. a bare forward)
+    return cleaned or description.strip()
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the beginning of `text` within max_tokens, cutting at a word boundary"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    limit = max(max_tokens - count_tokens(TRUNCATION_MARKER), 0) * 4
+    cut = text[:limit]
+    space = cut.rfind(" ")
+    if space > limit // 2:
+        cut = cut[:space]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def retrieval_query(title: Optional[str], description: Optional[str]) -> str:
+    """Knowledge base query for a ticket, without the noise stripped from prompts"""
+    return truncate_to_tokens(f"{title or ''} {clean_description(description)}".strip(), PROMPT_DESCRIPTION_TOKENS)
+
+
+def _shingles(words: List[str], size: int = 3) -> set:
+    return {" ".join(words[i:i + size]) for i in range(max(len(words) - size + 1, 1))}
+
+
+def _trim_overlap(kept_words: List[str], text: str) -> str:
+    """Remove a leading run of `text` that repeats the tail of an already selected chunk"""
+    words = text.split()
+    lowered = [w.lower() for w in words]
+    for size in range(min(len(kept_words), len(words)), MIN_OVERLAP_WORDS - 1, -1):
+        if kept_words[-size:] == lowered[:size]:
+            return " ".join(words[size:])
+    return text
+
+
+def _as_chunks(context: ContextInput) -> List[Tuple[str, float]]:
+    """Normalize search results or a pre-formatted '- ' bullet string into (text, score)"""
+    if not context:
+        return []
+    if isinstance(context, str):
+        items = [line[2:] if line.startswith("- ") else line for line in context.split("\n- ")]
+        return [(text.strip(), 1.0 / (rank + 1)) for rank, text in enumerate(items) if text.strip()]
+    return [(text, float(score or 0.0)) for text, score, *_ in context if text and text.strip()]
+
+
+def select_context(context: ContextInput, max_tokens: int = PROMPT_CONTEXT_TOKENS,
+                   dedup_threshold: float = PROMPT_DEDUP_THRESHOLD) -> Tuple[List[str], int]:
+    """
+    Highest-scoring chunks first, skipping near-duplicates and trimming text
+    repeated from an adjacent chunk, until the token budget is spent.
+    Returns the selected chunks and the number of candidates dropped.
+    """
+    chunks = sorted(_as_chunks(context), key=lambda chunk: chunk[1], reverse=True)
+    selected, selected_shingles, selected_words = [], [], []
+    remaining = max_tokens
+    for text, _ in chunks:
+        shingles = _shingles(WORD_PATTERN.findall(text.lower()))
+        if any(len(shingles & other) / min(len(shingles), len(other)) >= dedup_threshold
+               for other in selected_shingles):
+            continue
+        original = text
+        for words in selected_words:
+            text = _trim_overlap(words, text)
+        words = [w.lower() for w in text.split()]
+        if text != original and len(words) < MIN_OVERLAP_WORDS:
+            continue  # nothing new left once the shared run is removed
+        cost = count_tokens(text) + 1  # bullet prefix and newline
+        if cost > remaining:
+            if remaining < MIN_PARTIAL_CHUNK_TOKENS:
+                continue
+            text = truncate_to_tokens(text, remaining - 1)
+            cost = remaining
+        selected.append(text)
+        selected_shingles.append(shingles)
+        selected_words.append(words)
+        remaining -= cost
+    return selected, len(chunks) - len(selected)
+
+
+def prepare_response_inputs(description: Optional[str], context: ContextInput,
+                            description_tokens: int = PROMPT_DESCRIPTION_TOKENS,
+                            context_tokens: int = PROMPT_CONTEXT_TOKENS) -> Tuple[str, Optional[str], dict]:
+    """
+    Compress the description and context for the response prompt.
+    Returns (description, context bullet list or None, stats) where stats
+    reports the token counts before and after.
+    """
+    raw_description_tokens = count_tokens(description)
+    compact_description = truncate_to_tokens(clean_description(description), description_tokens)
+
+    raw_chunks = _as_chunks(context)
+    selected, dropped = select_context(context, context_tokens)
+    context_text = "\n".join(f"- {text}" for text in selected) or None
+
+    raw_tokens = raw_description_tokens + sum(count_tokens(text) for text, _ in raw_chunks)
+    kept_tokens = count_tokens(compact_description) + count_tokens(context_text)
+    return compact_description, context_text, {
+        "raw_tokens": raw_tokens,
+        "kept_tokens": kept_tokens,
+        "trimmed_tokens": max(raw_tokens - kept_tokens, 0),
+        "context_chunks": len(selected),
+        "context_dropped": dropped,
+    }
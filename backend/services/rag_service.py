@@ -1,65 +1,186 @@
 import os
+import threading
 import time
 import requests
-from typing import List, Tuple, Optional, Union
-from pinecone import Pinecone, ServerlessSpec
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple, Optional, Union
 from dotenv import load_dotenv
+from services.embedding_cache import get_embedding_cache
+from services.lexical_index import get_lexical_index
+from services.search_cache import SearchResultCache
+from services.vector_store import create_vector_store
 
 # Load environment variables
 load_dotenv()
 
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# "hybrid" fuses BM25 and vector results; "vector" is dense retrieval only
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "hybrid").lower()
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+# How long index mutations and direct embed() calls wait for warm-up (seconds)
+RAG_READY_TIMEOUT = float(os.getenv("RAG_READY_TIMEOUT", "60"))
+# Each retriever fetches this many times top_k before fusion
+HYBRID_CANDIDATE_MULTIPLIER = 3
+
+# Sample Q&A pairs used to seed an empty knowledge base
+SEED_DOCUMENTS = [
+    {
+        "id": "seed_1",
+        "text": "How do I reset my password? To reset your password, go to the login page and click on 'Forgot Password'. Follow the email instructions to create a new password.",
+        "metadata": {"type": "faq", "topic": "account"}
+    },
+    {
+        "id": "seed_2",
+        "text": "What are the billing cycles? We offer monthly and annual billing cycles. You can switch between them in your account settings under the 'Billing' tab.",
+        "metadata": {"type": "faq", "topic": "billing"}
+    },
+    {
+        "id": "seed_3",
+        "text": "How do I contact support? You can contact support by creating a ticket in this portal or emailing support@intellidesk.com. Our hours are 9am-5pm EST.",
+        "metadata": {"type": "faq", "topic": "support"}
+    },
+    {
+        "id": "seed_4",
+        "text": "Where can I find API documentation? API documentation is available at https://api.intellidesk.com/docs. You needs an API key from your dashboard settings.",
+        "metadata": {"type": "faq", "topic": "technical"}
+    },
+    {
+        "id": "seed_5",
+        "text": "My server is down. If your server is down, please check the status page at status.intellidesk.com. If the status is green, restart your local agent.",
+        "metadata": {"type": "faq", "topic": "troubleshooting"}
+    }
+]
+
+def cosine_scores(query: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+    """Cosine similarity between one vector and each row of a matrix"""
+    query_norm = np.linalg.norm(query)
+    row_norms = np.linalg.norm(matrix, axis=1)
+    denominator = np.maximum(row_norms * query_norm, 1e-12)
+    return (matrix @ query) / denominator
+
 class RAGService:
     """
-    RAG Service using Pinecone and SentenceTransformers (or HF Inference API).
+    RAG Service using a pluggable vector store (Pinecone or local) and
+    SentenceTransformers (or HF Inference API).
     Optimized for low memory usage.
+
+    Construction is cheap: connecting the vector store, seeding and
+    loading models happen in a background warm-up thread. Until it
+    finishes, searches return no results and callers should check
+    is_ready before optional work such as semantic dedup.
     """
     
     def __init__(self):
-        # Initialize Pinecone
-        api_key = os.getenv("PINECONE_API_KEY")
         self.hf_token = os.getenv("HF_TOKEN")
-        
-        if not api_key:
-            print("WARNING: PINECONE_API_KEY not found. RAG will be disabled.")
-            self.pc = None
-            return
-
-        self.pc = Pinecone(api_key=api_key)
-        self.index_name = "intellidesk"
+        self.embedding_cache = get_embedding_cache()
+        self.search_cache = SearchResultCache()
         self.embedding_dim = 384  # Dimension for all-MiniLM-L6-v2
-        
-        # Initialize HF Inference Client
-        if self.hf_token:
-            from huggingface_hub import InferenceClient
-            self.hf_client = InferenceClient(token=self.hf_token)
-        else:
-            self.hf_client = None
+        self.hf_client = None
         
         # Lazy loaded model
         self.local_model = None
         
-        # Check if index exists, create if not
-        self._ensure_index_exists()
-        
-        self.index = self.pc.Index(self.index_name)
+        self.store = None
+        self.lexical = None
+        self._search_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="rag-search")
         
-        # Seed knowledge base if empty
-        self.seed_knowledge_base()
+        # Warm-up state: initializing -> ready | disabled | failed
+        self.status = "initializing"
+        self.error = None
+        self.warmup_seconds = None
+        self._ready = threading.Event()
+        self._warmup_thread = None
+        self._warmup_lock = threading.Lock()
+
+    def start_warmup(self):
+        """Run initialize() in a background thread (no-op if already started)"""
+        with self._warmup_lock:
+            if self._warmup_thread is not None:
+                return
+            self._warmup_thread = threading.Thread(target=self.initialize, name="rag-warmup", daemon=True)
+            self._warmup_thread.start()
+
+    def initialize(self):
+        """Connect the vector store, seed it and build the lexical index"""
+        start = time.perf_counter()
+        try:
+            # Initialize HF Inference Client
+            if self.hf_token:
+                from huggingface_hub import InferenceClient
+                self.hf_client = InferenceClient(token=self.hf_token)
+            
+            # Vector backend selected by VECTOR_STORE (None disables RAG)
+            store = create_vector_store(self.embedding_dim)
+            if not store:
+                self.status = "disabled"
+                return
+            
+            # BM25 side of hybrid retrieval, kept in step with the vector store
+            self.lexical = get_lexical_index() if RETRIEVAL_MODE == "hybrid" else None
+            self.store = store
+            
+            # Seed knowledge base if empty
+            self.seed_knowledge_base()
+            self._backfill_lexical_index()
+            self.status = "ready"
+        except Exception as e:
+            print(f"RAG initialization failed: {e}")
+            self.store = None
+            self.status = "failed"
+            self.error = str(e)
+        finally:
+            self.warmup_seconds = round(time.perf_counter() - start, 3)
+            self._ready.set()
+            print(f"RAG warm-up finished in {self.warmup_seconds}s (status: {self.status})")
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
+    def wait_until_ready(self, timeout: Optional[float] = RAG_READY_TIMEOUT) -> bool:
+        """Block until warm-up has finished; True if RAG is usable"""
+        self.start_warmup()
+        self._ready.wait(timeout)
+        return self.is_ready
+
+    def get_readiness(self) -> dict:
+        return {
+            "status": self.status,
+            "ready": self.is_ready,
+            "warmup_seconds": self.warmup_seconds,
+            "error": self.error,
+        }
 
     def _get_embeddings(self, texts: Union[str, List[str]]) -> List[List[float]]:
         """
-        Generate embeddings using HF API (preferred) or local fallback.
+        Get embeddings, serving repeats from the embedding cache and
+        computing only the texts it hasn't seen.
         """
         if isinstance(texts, str):
             texts = [texts]
-            
+
+        embeddings = self.embedding_cache.get_many(EMBEDDING_MODEL, texts)
+        missing = list(dict.fromkeys(text for text, emb in zip(texts, embeddings) if emb is None))
+        if missing:
+            computed = self._compute_embeddings(missing)
+            self.embedding_cache.put_many(EMBEDDING_MODEL, missing, computed)
+            by_text = dict(zip(missing, computed))
+            embeddings = [emb if emb is not None else by_text[text] for text, emb in zip(texts, embeddings)]
+        return embeddings
+
+    def _compute_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings using HF API (preferred) or local fallback.
+        """
         # 1. Try Hugging Face API if client exists
         if self.hf_client:
             try:
                 # Use the feature_extraction task
                 embeddings = self.hf_client.feature_extraction(
                     texts, 
-                    model="sentence-transformers/all-MiniLM-L6-v2"
+                    model=EMBEDDING_MODEL
                 )
                 
                 # Ensure it's a list (InferenceClient returns numpy array usually)
@@ -80,89 +201,51 @@ class RAGService:
             
         return self.local_model.encode(texts).tolist()
 
-    def _ensure_index_exists(self):
-        """Create Pinecone index if it doesn't exist"""
-        if not self.pc: return
-        
-        existing_indexes = [i.name for i in self.pc.list_indexes()]
-        
-        if self.index_name not in existing_indexes:
-            print(f"Creating Pinecone index '{self.index_name}'...")
-            try:
-                self.pc.create_index(
-                    name=self.index_name,
-                    dimension=self.embedding_dim,
-                    metric="cosine",
-                    spec=ServerlessSpec(
-                        cloud="aws",
-                        region="us-east-1"
-                    )
-                )
-                # Wait for index to be ready
-                while not self.pc.describe_index(self.index_name).status['ready']:
-                    time.sleep(1)
-                print("Index created successfully.")
-            except Exception as e:
-                print(f"Error creating index: {e}")
-
     def seed_knowledge_base(self):
         """Seed the knowledge base with sample data if empty"""
-        if not self.pc:
+        if not self.store:
             return
 
-        stats = self.index.describe_index_stats()
-        if stats.total_vector_count > 0:
+        if self.store.count() > 0:
             print("Knowledge base already populated. Skipping seed.")
             return
 
         print("Seeding knowledge base with sample data...")
         
-        # Sample Q&A Pairs
-        sample_data = [
-            {
-                "id": "seed_1",
-                "text": "How do I reset my password? To reset your password, go to the login page and click on 'Forgot Password'. Follow the email instructions to create a new password.",
-                "metadata": {"type": "faq", "topic": "account"}
-            },
-            {
-                "id": "seed_2",
-                "text": "What are the billing cycles? We offer monthly and annual billing cycles. You can switch between them in your account settings under the 'Billing' tab.",
-                "metadata": {"type": "faq", "topic": "billing"}
-            },
-            {
-                "id": "seed_3",
-                "text": "How do I contact support? You can contact support by creating a ticket in this portal or emailing support@intellidesk.com. Our hours are 9am-5pm EST.",
-                "metadata": {"type": "faq", "topic": "support"}
-            },
-            {
-                "id": "seed_4",
-                "text": "Where can I find API documentation? API documentation is available at https://api.intellidesk.com/docs. You needs an API key from your dashboard settings.",
-                "metadata": {"type": "faq", "topic": "technical"}
-            },
-            {
-                "id": "seed_5",
-                "text": "My server is down. If your server is down, please check the status page at status.intellidesk.com. If the status is green, restart your local agent.",
-                "metadata": {"type": "faq", "topic": "troubleshooting"}
-            }
-        ]
-        
-        texts = [item["text"] for item in sample_data]
+        texts = [item["text"] for item in SEED_DOCUMENTS]
         embeddings = self._get_embeddings(texts)
         
         vectors = []
-        for i, item in enumerate(sample_data):
+        for i, item in enumerate(SEED_DOCUMENTS):
             vectors.append({
                 "id": item["id"],
                 "values": embeddings[i],
                 "metadata": {**item["metadata"], "text": item["text"]}
             })
             
-        self.index.upsert(vectors=vectors)
+        self.store.upsert(vectors)
         print(f"Seeded {len(vectors)} documents.")
 
+    def _backfill_lexical_index(self):
+        """Build the lexical index from seeds and document_chunks the first time it is used"""
+        if not self.lexical:
+            return
+        try:
+            if self.lexical.count() > 0:
+                return
+            self.lexical.add([
+                (item["id"], item["text"], {**item["metadata"], "text": item["text"]})
+                for item in SEED_DOCUMENTS
+            ])
+            indexed = self.lexical.rebuild_from_chunks()
+            print(f"Built lexical index ({len(SEED_DOCUMENTS)} seeds, {indexed} chunks).")
+        except Exception as e:
+            print(f"Lexical index backfill error: {e}")
+
     def add_document(self, document_id: int, filename: str, chunks: List[str]) -> int:
-        """Embed and upsert document chunks to Pinecone"""
-        if not self.pc or not chunks:
+        """Embed and upsert document chunks to the vector store"""
+        self.wait_until_ready()
+        if not self.store or not chunks:
             return 0
             
         print(f"Indexing document {filename} with {len(chunks)} chunks...")
@@ -183,18 +266,20 @@ class RAGService:
                 }
             })
         
-        # Batch upsert
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i+batch_size]
-            self.index.upsert(vectors=batch)
+        self.store.upsert(vectors)
+        if self.lexical:
+            self.lexical.add([(v["id"], v["metadata"]["text"], v["metadata"]) for v in vectors])
+        self.search_cache.invalidate()
             
         print(f"Indexed {len(vectors)} chunks.")
         return len(vectors)
 
     def add_knowledge_pair(self, question: str, answer: str, source_id: str = "auto") -> bool:
         """Add a Q&A pair to the knowledge base (Learning Loop)."""
-        if not self.pc or not question or not answer:
+        if not self.is_ready:
+            print(f"Learning skipped: RAG is {self.status}.")
+            return False
+        if not self.store or not question or not answer:
             return False
             
         try:
@@ -212,16 +297,16 @@ class RAGService:
             embedding = embeddings[0] # Single text
             
             # Upsert
-            self.index.upsert(vectors=[{
-                "id": vector_id,
-                "values": embedding,
-                "metadata": {
-                    "text": text,
-                    "type": "learned_qa",
-                    "source_id": str(source_id),
-                    "created_at": time.time()
-                }
-            }])
+            metadata = {
+                "text": text,
+                "type": "learned_qa",
+                "source_id": str(source_id),
+                "created_at": time.time()
+            }
+            self.store.upsert([{"id": vector_id, "values": embedding, "metadata": metadata}])
+            if self.lexical:
+                self.lexical.add([(vector_id, text, metadata)])
+            self.search_cache.invalidate()
             print("Successfully learned new Q&A pair.")
             return True
         except Exception as e:
@@ -230,77 +315,172 @@ class RAGService:
 
     def search(self, query: str, top_k: int = 3) -> List[Tuple[str, float, dict]]:
         """Search the knowledge base for relevant chunks"""
-        if not self.pc:
-            return []
-            
-        query_embeddings = self._get_embeddings(query)
-        if not query_embeddings: return []
-        
-        query_embedding = query_embeddings[0]
-        
+        return self.search_with_timings(query, top_k)[0]
+
+    def get_context_for_query(self, query: str, top_k: int = 3) -> str:
+        """Top search results formatted as a bullet list for LLM prompts"""
+        return "\n".join(f"- {text}" for text, score, meta in self.search(query, top_k=top_k))
+
+    def search_with_timings(self, query: str, top_k: int = 3) -> Tuple[List[Tuple[str, float, dict]], Dict[str, float]]:
+        """
+        Search the knowledge base and report per-stage latency in milliseconds.
+        In hybrid mode the vector and BM25 retrievers run concurrently and
+        their rankings are merged with reciprocal-rank fusion. Repeated
+        queries are served from the search cache until the index changes.
+        """
+        timings: Dict[str, float] = {}
+        # The store is assigned before seeding finishes; don't search a half-built index
+        if not self.is_ready:
+            return [], timings
+        start = time.perf_counter()
+
+        cached = self.search_cache.get(query, top_k)
+        if cached is not None:
+            timings["cache_hit"] = 1.0
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return list(cached), timings
+        generation = self.search_cache.generation
+        results, timings = self._search_uncached(query, top_k, start)
+        if results:
+            self.search_cache.put(query, top_k, results, generation)
+        return list(results), timings
+
+    def _search_uncached(self, query: str, top_k: int, start: float):
+        timings: Dict[str, float] = {}
+
+        if not self.lexical:
+            results = [(m.metadata.get("text", ""), m.score, m.metadata)
+                       for m in self._vector_search(query, top_k, timings)]
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            return results, timings
+
+        candidates = top_k * HYBRID_CANDIDATE_MULTIPLIER
+        vector_future = self._search_executor.submit(self._vector_search, query, candidates, timings)
+        lexical_future = self._search_executor.submit(self._lexical_search, query, candidates, timings)
+        vector_matches = vector_future.result()
+        lexical_matches = lexical_future.result()
+
+        fusion_start = time.perf_counter()
+        results = self._fuse(vector_matches, lexical_matches, top_k)
+        timings["fusion_ms"] = round((time.perf_counter() - fusion_start) * 1000, 2)
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return results, timings
+
+    def _vector_search(self, query: str, top_k: int, timings: Dict[str, float]):
         try:
-            results = self.index.query(
-                vector=query_embedding,
-                top_k=top_k,
-                include_metadata=True
-            )
-            
-            output = []
-            for match in results.matches:
-                text = match.metadata.get("text", "")
-                score = match.score
-                metadata = match.metadata
-                output.append((text, score, metadata))
-                
-            return output
-            
+            stage = time.perf_counter()
+            query_embeddings = self._get_embeddings(query)
+            timings["embedding_ms"] = round((time.perf_counter() - stage) * 1000, 2)
+            if not query_embeddings:
+                return []
+
+            stage = time.perf_counter()
+            matches = self.store.query(query_embeddings[0], top_k=top_k)
+            timings["vector_ms"] = round((time.perf_counter() - stage) * 1000, 2)
+            return matches
         except Exception as e:
             print(f"Search error: {e}")
             return []
 
+    def _lexical_search(self, query: str, top_k: int, timings: Dict[str, float]):
+        try:
+            stage = time.perf_counter()
+            matches = self.lexical.search(query, top_k)
+            timings["lexical_ms"] = round((time.perf_counter() - stage) * 1000, 2)
+            return matches
+        except Exception as e:
+            print(f"Lexical search error: {e}")
+            return []
+
+    @staticmethod
+    def _fuse(vector_matches, lexical_matches, top_k: int) -> List[Tuple[str, float, dict]]:
+        """
+        Reciprocal-rank fusion: each list contributes 1 / (RRF_K + rank).
+        Scores are rescaled so a result ranked first by both retrievers gets 1.0.
+        """
+        fused: Dict[str, dict] = {}
+        for rank, match in enumerate(vector_matches, start=1):
+            entry = fused.setdefault(match.id, {"text": match.metadata.get("text", ""),
+                                                "metadata": dict(match.metadata), "score": 0.0})
+            entry["score"] += 1.0 / (RRF_K + rank)
+            entry["metadata"]["vector_score"] = match.score
+        for rank, (vector_id, text, bm25_score, metadata) in enumerate(lexical_matches, start=1):
+            entry = fused.setdefault(vector_id, {"text": text, "metadata": dict(metadata), "score": 0.0})
+            entry["score"] += 1.0 / (RRF_K + rank)
+            entry["metadata"]["lexical_score"] = bm25_score
+
+        best_possible = 2.0 / (RRF_K + 1)
+        ranked = sorted(fused.values(), key=lambda e: e["score"], reverse=True)[:top_k]
+        return [(e["text"], e["score"] / best_possible, e["metadata"]) for e in ranked]
+
     def remove_document(self, document_id: int) -> int:
         """Remove all chunks for a specific document"""
-        if not self.pc:
+        self.wait_until_ready()
+        if not self.store:
             return 0
             
         # Delete by metadata filter
         try:
-            self.index.delete(
-                filter={"document_id": {"$eq": document_id}}
-            )
+            self.store.delete(filter={"document_id": {"$eq": document_id}})
+            if self.lexical:
+                self.lexical.remove_document(document_id)
             return 1 
         except Exception as e:
             print(f"Delete error: {e}")
             return 0
+        finally:
+            self.search_cache.invalidate()
 
     def compute_similarity(self, text1: str, text2: str) -> float:
         """Compute cosine similarity between two texts"""
+        return self.similarity_scores(text1, [text2])[0]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts (through the cache) as a float32 matrix, one row per text"""
+        self.wait_until_ready()
+        return np.asarray(self._get_embeddings(list(texts)), dtype=np.float32)
+
+    def similarity_scores(self, text: str, candidates: List[str]) -> List[float]:
+        """
+        Cosine similarity of text against every candidate.
+        All texts are embedded in a single batch and scored with one matrix product.
+        """
+        if not candidates:
+            return []
         try:
-            embeddings = self._get_embeddings([text1, text2])
-            from sklearn.metrics.pairwise import cosine_similarity
-            score = cosine_similarity([embeddings[0]], [embeddings[1]])[0][0]
-            return float(score)
+            embeddings = self.embed([text] + list(candidates))
+            return cosine_scores(embeddings[0], embeddings[1:]).tolist()
         except Exception as e:
             print(f"Similarity computation error: {e}")
-            return 0.0
+            return [0.0] * len(candidates)
 
     def get_stats(self) -> dict:
         """Get index statistics"""
-        if not self.pc:
-            return {"status": "RAG_DISABLED"}
+        if not self.store:
+            return {
+                "status": "RAG_DISABLED" if self.status == "disabled" else self.status,
+                "error": self.error,
+                "embedding_cache": self.embedding_cache.get_stats(),
+                "search_cache": self.search_cache.get_stats()
+            }
             
-        stats = self.index.describe_index_stats()
         return {
-            "total_vectors": stats.total_vector_count,
-            "namespaces": stats.namespaces,
-            "status": "ready"
+            **self.store.describe(),
+            "status": "ready",
+            "retrieval_mode": "hybrid" if self.lexical else "vector",
+            "lexical_entries": self.lexical.count() if self.lexical else None,
+            "embedding_cache": self.embedding_cache.get_stats(),
+            "search_cache": self.search_cache.get_stats()
         }
 
 # Singleton instance
 _rag_service = None
+_rag_service_lock = threading.Lock()
 
 def get_rag_service() -> RAGService:
     global _rag_service
-    if _rag_service is None:
-        _rag_service = RAGService()
+    with _rag_service_lock:
+        if _rag_service is None:
+            _rag_service = RAGService()
+            _rag_service.start_warmup()
     return _rag_service
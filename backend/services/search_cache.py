@@ -0,0 +1,79 @@
+"""
+In-process TTL + LRU cache for knowledge base search results.
+
+Keys are (generation, normalized query, top_k). RAGService bumps the
+generation whenever the index changes, so results computed against an
+older index can never be served again.
+"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "600"))  # seconds
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    return WHITESPACE_PATTERN.sub(" ", (query or "").strip().lower())
+
+
+class SearchResultCache:
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries: "OrderedDict[Tuple[int, str, int], Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, query: str, top_k: int) -> Optional[Any]:
+        with self._lock:
+            key = (self.generation, normalize_query(query), top_k)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return value
+
+    def put(self, query: str, top_k: int, value: Any, generation: int):
+        """Store a result computed at the given generation (dropped if the index changed since)"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            key = (generation, normalize_query(query), top_k)
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def invalidate(self):
+        """Bump the generation and drop everything cached so far"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.stats["invalidations"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            lookups = stats["hits"] + stats["misses"]
+            stats.update({
+                "entries": len(self._entries),
+                "generation": self.generation,
+                "hit_rate": round(stats["hits"] / lookups, 4) if lookups else None,
+            })
+        return stats
@@ -0,0 +1,131 @@
+"""
+Full-text search over tickets and their emails (FTS5, see migration 0004).
+
+Free text is turned into an FTS5 query of quoted terms, all required, the
+last one prefix-matched so results follow the user while typing. Tickets
+are ranked by their best bm25 score across tickets_fts and
+ticket_emails_fts; snippets are only built for the returned page.
+Customer name/email search uses the trigram customers_fts index.
+"""
+import html
+import re
+from typing import List, Optional, Tuple
+
+from database import get_read_db
+from models import Ticket
+
+# bm25 column weights; a hit in a title or subject outranks one in a body
+TICKET_WEIGHTS = (5.0, 1.0, 1.0)  # title, description, final_response
+EMAIL_WEIGHTS = (3.0, 1.0)  # subject, body
+SNIPPET_TOKENS = 16
+
+# Control characters can't occur in the HTML-escaped snippet text, so they
+# mark highlights safely until escaping is done
+_MARK_OPEN, _MARK_CLOSE = "\x02", "\x03"
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+TRIGRAM_MIN_LENGTH = 3
+
+
+def _quote(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+def fts_query(text: str) -> Optional[str]:
+    """FTS5 MATCH expression for free text, or None if it has no searchable terms"""
+    terms = TOKEN_PATTERN.findall(text)
+    if not terms:
+        return None
+    return " ".join(_quote(term) for term in terms) + "*"
+
+
+def _highlight(snippet: Optional[str]) -> str:
+    escaped = html.escape(snippet or "")
+    return escaped.replace(_MARK_OPEN, "<mark>").replace(_MARK_CLOSE, "</mark>")
+
+
+def _snippets(conn, fts: str, match: str, rowids: List[int]) -> dict:
+    if not rowids:
+        return {}
+    placeholders = ", ".join("?" * len(rowids))
+    rows = conn.execute(f"""
+        SELECT rowid, snippet({fts}, -1, ?, ?, '…', ?) AS snippet
+        FROM {fts} WHERE {fts} MATCH ? AND rowid IN ({placeholders})
+    """, [_MARK_OPEN, _MARK_CLOSE, SNIPPET_TOKENS, match] + rowids).fetchall()
+    return {row["rowid"]: _highlight(row["snippet"]) for row in rows}
+
+
+def search_tickets(query: str, status: Optional[str] = None, ticket_type: Optional[str] = None,
+                   priority: Optional[str] = None, customer_email: Optional[str] = None,
+                   limit: int = 20, offset: int = 0) -> List[dict]:
+    """
+    Tickets matching `query` in their own text or any of their emails, best
+    first: [{ticket, relevance_score, snippet, matched_in}]
+    """
+    match = fts_query(query)
+    if not match:
+        return []
+
+    filters, params = [], [match, match]
+    for column, value in (("status", status), ("type", ticket_type), ("priority", priority),
+                          ("customer_email", customer_email)):
+        if value:
+            filters.append(f"t.{column} = ?")
+            params.append(value)
+    params.extend([limit, offset])
+    # Only join tickets before ranking when filtering needs its columns
+    filtered = (f"JOIN tickets t ON t.id = best.ticket_id WHERE {' AND '.join(filters)}" if filters else "")
+
+    with get_read_db() as conn:
+        # MIN() makes SQLite take matched_in/email_id from the best-scoring hit.
+        # Ranking runs on ids only; full ticket rows are read for the page alone.
+        rows = conn.execute(f"""
+            WITH hits AS (
+                SELECT rowid AS ticket_id, NULL AS email_id, 'ticket' AS matched_in,
+                       bm25(tickets_fts, {', '.join(map(str, TICKET_WEIGHTS))}) AS score
+                FROM tickets_fts WHERE tickets_fts MATCH ?
+                UNION ALL
+                SELECT e.ticket_id, e.id, 'email',
+                       bm25(ticket_emails_fts, {', '.join(map(str, EMAIL_WEIGHTS))})
+                FROM ticket_emails_fts JOIN ticket_emails e ON e.id = ticket_emails_fts.rowid
+                WHERE ticket_emails_fts MATCH ?
+            ),
+            best AS (
+                SELECT ticket_id, email_id, matched_in, MIN(score) AS score FROM hits GROUP BY ticket_id
+            ),
+            page AS (
+                SELECT best.* FROM best {filtered}
+                ORDER BY best.score, best.ticket_id DESC
+                LIMIT ? OFFSET ?
+            )
+            SELECT t.*, page.email_id, page.matched_in, page.score
+            FROM page JOIN tickets t ON t.id = page.ticket_id
+            ORDER BY page.score, t.id DESC
+        """, params).fetchall()
+
+        ticket_snippets = _snippets(conn, "tickets_fts", match,
+                                    [row["id"] for row in rows if row["matched_in"] == "ticket"])
+        email_snippets = _snippets(conn, "ticket_emails_fts", match,
+                                   [row["email_id"] for row in rows if row["matched_in"] == "email"])
+
+    return [
+        {
+            "ticket": Ticket.from_row(row),
+            # bm25 is lower-is-better and negative; flip it so higher is better
+            "relevance_score": round(-row["score"], 4),
+            "snippet": (ticket_snippets.get(row["id"]) if row["matched_in"] == "ticket"
+                        else email_snippets.get(row["email_id"])) or "",
+            "matched_in": row["matched_in"],
+        }
+        for row in rows
+    ]
+
+
+def customer_search_clause(search: str) -> Tuple[str, list]:
+    """
+    WHERE condition matching customers whose name or email contains
+    `search`. The trigram index needs at least 3 characters; shorter input
+    falls back to LIKE.
+    """
+    if len(search) >= TRIGRAM_MIN_LENGTH:
+        return "id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?)", [_quote(search)]
+    return "(email LIKE ? OR name LIKE ?)", [f"%{search}%", f"%{search}%"]
@@ -1,105 +1,101 @@
+import asyncio
+import time
 from datetime import datetime
 from services.groq_service import get_groq_service
 from services.rag_service import get_rag_service
-from models import TicketStatus
-import sqlite3
+from services.metrics import get_latency_metrics
+from services.llm_guard import BACKGROUND, INTERACTIVE
+from models import TicketStatus, DraftStatus
+from services.draft_service import get_draft_service
+from services.ticket_vectors import ticket_text, store_ticket_embeddings
+from services.email_threading_service import insert_ticket_email
+from database import get_db
 
-def create_ticket_logic(db_conn: sqlite3.Connection, title: str | None, description: str, customer_email: str | None):
+# Histogram namespace for per-stage latency (see GET /api/tickets/stats/latency)
+PIPELINE = "ticket_creation"
+
+async def _timed(stage: str, func, *args, **kwargs):
+    """Run a blocking call in a worker thread and record its latency"""
+    start = time.perf_counter()
+    try:
+        return await asyncio.to_thread(func, *args, **kwargs)
+    finally:
+        get_latency_metrics().observe(PIPELINE, stage, time.perf_counter() - start)
+
+def _embed_ticket(rag_service, title: str, description: str):
+    """Dedup vector for the new ticket, or None while RAG warms up"""
+    if not rag_service.is_ready:
+        return None
+    try:
+        return rag_service.embed([ticket_text(title, description)])[0]
+    except Exception as e:
+        print(f"Ticket embedding error: {e}")
+        return None
+
+def _insert_ticket(values: tuple, vector, first_email: dict | None = None) -> int:
+    """Write the ticket (its dedup vector and the email that opened it) in one short transaction"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO tickets (title, description, customer_email, type, priority, status, confidence_score, created_at, draft_status, classification_source)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, values)
+        ticket_id = cursor.lastrowid
+        if vector is not None:
+            store_ticket_embeddings(conn, [(ticket_id, vector)])
+        if first_email:
+            insert_ticket_email(conn, ticket_id, first_email)
+        return ticket_id
+
+def ticket_title(title: str | None, description: str) -> str:
+    """Title as stored (and classified): auto-generated from the description if missing"""
+    if not title or not title.strip():
+        # Use first 50 chars of description or generic
+        return (description[:50] + "...") if description else "New Ticket"
+    return title
+
+async def create_ticket_logic_async(title: str | None, description: str, customer_email: str | None,
+                                    lane: int = INTERACTIVE, first_email: dict | None = None):
     """
     Core logic for creating a ticket:
-    1. Classify
-    2. RAG Search
-    3. Generate Response
-    4. Save to DB
+    1. Classify (concurrently with the dedup embedding)
+    2. Save to DB with draft_status 'pending'
+    3. Queue response generation (RAG search, Groq draft, auto-send)
+       on the background draft service
+
+    `lane` is the Groq priority lane for classification: API requests are
+    interactive, email ingestion is background. `first_email` (a threading
+    email event) is stored with the ticket, so an email can never end up
+    with a ticket but no thread row.
     """
+    start = time.perf_counter()
     groq_service = get_groq_service()
-    
-    # Auto-generate title if missing
-    if not title or not title.strip():
-        # Use first 50 chars of description or generic
-        title = (description[:50] + "...") if description else "New Ticket"
-        
-    # Classify the ticket
-    classification = groq_service.classify_ticket(title, description)
-
-    # Perform RAG search to get context
     rag_service = get_rag_service()
-    search_results = rag_service.search(description, top_k=3)
-    
-    context_text = ""
-    if search_results:
-        context_text = "\n".join([f"- {text}" for text, score, meta in search_results])
-    
-    # Generate response
-    suggested_response, response_confidence = groq_service.generate_response(
-        title, 
-        description, 
-        classification["type"], 
-        context=context_text
-    )
-    
-    # Create ticket in database
-    cursor = db_conn.cursor()
-    
-    # AUTO-SEND LOGIC
-    final_status = TicketStatus.OPEN.value
-    final_response = None
-    resolved_at = None
-    
-    if suggested_response and customer_email:
-        # Check Confidence Threshold > 0.8 (User Request)
-        confidence = classification.get("confidence", 0)
-        
-        if confidence > 0.8:
-            try:
-                from services.email_service import get_email_service
-                email_service = get_email_service()
-                subject = f"Re: {title}"
-                body = f"Hello,\n\n{suggested_response}\n\nBest regards,\nIntelliDesk AI"
-                
-                # Send Email
-                email_service.send_email(customer_email, subject, body)
-                print(f"Auto-sent response to {customer_email} (Confidence: {confidence:.2f})")
-                
-                # Learning Loop: Add to RAG
-                try:
-                    rag_service.add_knowledge_pair(
-                        question=f"{title}\n{description}",
-                        answer=suggested_response,
-                        source_id=f"ticket_{ticket_id if 'ticket_id' in locals() else 'new'}"
-                    )
-                except Exception as rag_err:
-                    print(f"Learning Loop Error: {rag_err}")
 
-                # Update State to Resolved
-                final_status = TicketStatus.RESOLVED.value
-                final_response = suggested_response
-                resolved_at = datetime.utcnow().isoformat()
-                
-            except Exception as e:
-                print(f"Failed to auto-send response: {e}")
-        else:
-             print(f"Confidence {confidence:.2f} <= 0.8. Holding for manual approval.")
+    title = ticket_title(title, description)
+
+    classification, vector = await asyncio.gather(
+        _timed("classify", groq_service.classify_ticket, title, description, lane),
+        _timed("embed", _embed_ticket, rag_service, title, description),
+    )
 
-    cursor.execute("""
-        INSERT INTO tickets (title, description, customer_email, type, priority, status, suggested_response, confidence_score, final_response, resolved_at, created_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
+    created_at = datetime.utcnow().isoformat()
+    ticket_id = await _timed("db_write", _insert_ticket, (
         title,
         description,
         customer_email,
         classification["type"],
         classification["priority"],
-        final_status,
-        suggested_response,  # Generated response
+        TicketStatus.OPEN.value,
         classification["confidence"],
-        final_response,
-        resolved_at,
-        datetime.utcnow().isoformat()
-    ))
-    ticket_id = cursor.lastrowid
-    db_conn.commit()
-    
+        created_at,
+        DraftStatus.PENDING.value,
+        classification.get("source", "llm")
+    ), vector, first_email)
+
+    await _timed("enqueue_draft", get_draft_service().enqueue, ticket_id)
+    get_latency_metrics().observe(PIPELINE, "total", time.perf_counter() - start)
+
     # Return constructed object (similar to what was done in router)
     return {
         "id": ticket_id,
@@ -108,11 +104,18 @@ def create_ticket_logic(db_conn: sqlite3.Connection, title: str | None, descript
         "customer_email": customer_email,
         "type": classification["type"],
         "priority": classification["priority"],
-        "status": final_status,
-        "suggested_response": suggested_response,
+        "status": TicketStatus.OPEN.value,
+        "suggested_response": None,
         "confidence_score": classification["confidence"],
-        "final_response": final_response,
-        "created_at": datetime.utcnow().isoformat(),
+        "final_response": None,
+        "created_at": created_at,
         "updated_at": None,
-        "resolved_at": resolved_at
+        "resolved_at": None,
+        "draft_status": DraftStatus.PENDING.value
     }
+
+def create_ticket_logic(title: str | None, description: str, customer_email: str | None,
+                        first_email: dict | None = None):
+    """Blocking wrapper for callers without an event loop (e.g. email ingestion workers)"""
+    return asyncio.run(create_ticket_logic_async(title, description, customer_email, lane=BACKGROUND,
+                                                 first_email=first_email))
@@ -0,0 +1,72 @@
+"""
+Per-ticket embedding storage.
+
+Each ticket's "title description" embedding is stored once, as a float16
+BLOB in the ticket_embeddings table, so threading dedup can load
+candidate vectors with a single query instead of calling the model.
+"""
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from database import get_db, get_read_db
+from services.rag_service import get_rag_service, EMBEDDING_MODEL
+
+VECTOR_DTYPE = np.float16
+
+
+def ticket_text(title: str, description: str) -> str:
+    return f"{title} {description}"
+
+
+def store_ticket_embeddings(conn: sqlite3.Connection, items: Iterable[Tuple[int, np.ndarray]]):
+    rows = []
+    for ticket_id, vector in items:
+        vector = np.asarray(vector, dtype=VECTOR_DTYPE)
+        rows.append((ticket_id, EMBEDDING_MODEL, int(vector.shape[0]), vector.tobytes(), datetime.utcnow().isoformat()))
+    conn.executemany("""
+        INSERT OR REPLACE INTO ticket_embeddings (ticket_id, model, dim, vector, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, rows)
+
+
+def load_ticket_embeddings(conn: sqlite3.Connection, ticket_ids: List[int]) -> Dict[int, np.ndarray]:
+    if not ticket_ids:
+        return {}
+    placeholders = ','.join(['?'] * len(ticket_ids))
+    cursor = conn.execute(
+        f"SELECT ticket_id, vector FROM ticket_embeddings WHERE model = ? AND ticket_id IN ({placeholders})",
+        [EMBEDDING_MODEL] + list(ticket_ids)
+    )
+    return {
+        row[0]: np.frombuffer(row[1], dtype=VECTOR_DTYPE).astype(np.float32)
+        for row in cursor.fetchall()
+    }
+
+
+def embed_tickets(conn: sqlite3.Connection, tickets: List[Tuple[int, str, str]]) -> Dict[int, np.ndarray]:
+    """Embed (id, title, description) tuples in one batch and persist the vectors"""
+    if not tickets:
+        return {}
+    vectors = get_rag_service().embed([ticket_text(title, description) for _, title, description in tickets])
+    result = {ticket_id: vector for (ticket_id, _, _), vector in zip(tickets, vectors)}
+    store_ticket_embeddings(conn, result.items())
+    return result
+
+
+def ensure_ticket_embedding(ticket_id: int):
+    """Embed a ticket if it doesn't have a stored vector yet"""
+    if not get_rag_service().is_ready:
+        return  # picked up later by _semantic_scores or the backfill script
+    with get_read_db() as conn:
+        if load_ticket_embeddings(conn, [ticket_id]):
+            return
+        row = conn.execute("SELECT title, description FROM tickets WHERE id = ?", (ticket_id,)).fetchone()
+    if not row:
+        return
+    # Embed before opening the write transaction; the model may take a while
+    vector = get_rag_service().embed([ticket_text(row["title"], row["description"])])[0]
+    with get_db() as conn:
+        store_ticket_embeddings(conn, [(ticket_id, vector)])
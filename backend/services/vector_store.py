@@ -0,0 +1,318 @@
+"""
+Pluggable vector storage for RAGService.
+
+Backends:
+- "pinecone": managed Pinecone serverless index (network round-trip per call)
+- "local":    in-process index persisted to disk. Uses FAISS when installed,
+              otherwise a NumPy matrix product; both are exact cosine search.
+
+Select with VECTOR_STORE; by default Pinecone is used when
+PINECONE_API_KEY is set and the local store otherwise.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "").lower()
+PINECONE_INDEX_NAME = "intellidesk"
+LOCAL_STORE_DIR = os.path.join(os.path.dirname(__file__), "..", "data", "vector_store")
+
+
+@dataclass
+class VectorMatch:
+    id: str
+    score: float
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+class VectorStore(ABC):
+    """Interface implemented by every vector backend"""
+
+    backend = "base"
+
+    @abstractmethod
+    def upsert(self, vectors: List[dict]) -> None:
+        """Insert or replace vectors given as {"id", "values", "metadata"} dicts"""
+
+    @abstractmethod
+    def query(self, vector: List[float], top_k: int) -> List[VectorMatch]:
+        ...
+
+    @abstractmethod
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None) -> None:
+        ...
+
+    @abstractmethod
+    def count(self) -> int:
+        ...
+
+    def describe(self) -> dict:
+        return {"backend": self.backend, "total_vectors": self.count()}
+
+
+class PineconeVectorStore(VectorStore):
+    backend = "pinecone"
+
+    def __init__(self, api_key: str, dimension: int, index_name: str = PINECONE_INDEX_NAME):
+        from pinecone import Pinecone
+        self.pc = Pinecone(api_key=api_key)
+        self.index_name = index_name
+        self.dimension = dimension
+        self._ensure_index_exists()
+        self.index = self.pc.Index(self.index_name)
+
+    def _ensure_index_exists(self):
+        """Create Pinecone index if it doesn't exist"""
+        from pinecone import ServerlessSpec
+        existing_indexes = [i.name for i in self.pc.list_indexes()]
+
+        if self.index_name not in existing_indexes:
+            print(f"Creating Pinecone index '{self.index_name}'...")
+            try:
+                self.pc.create_index(
+                    name=self.index_name,
+                    dimension=self.dimension,
+                    metric="cosine",
+                    spec=ServerlessSpec(
+                        cloud="aws",
+                        region="us-east-1"
+                    )
+                )
+                # Wait for index to be ready
+                while not self.pc.describe_index(self.index_name).status['ready']:
+                    time.sleep(1)
+                print("Index created successfully.")
+            except Exception as e:
+                print(f"Error creating index: {e}")
+
+    def upsert(self, vectors: List[dict]) -> None:
+        # Batch upsert
+        batch_size = 100
+        for i in range(0, len(vectors), batch_size):
+            self.index.upsert(vectors=vectors[i:i+batch_size])
+
+    def query(self, vector: List[float], top_k: int) -> List[VectorMatch]:
+        results = self.index.query(vector=vector, top_k=top_k, include_metadata=True)
+        return [VectorMatch(id=m.id, score=m.score, metadata=dict(m.metadata or {})) for m in results.matches]
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None) -> None:
+        if ids:
+            self.index.delete(ids=ids)
+        if filter:
+            self.index.delete(filter=filter)
+
+    def count(self) -> int:
+        return self.index.describe_index_stats().total_vector_count
+
+    def describe(self) -> dict:
+        stats = self.index.describe_index_stats()
+        return {
+            "backend": self.backend,
+            "total_vectors": stats.total_vector_count,
+            "namespaces": stats.namespaces,
+        }
+
+
+def _matches_filter(metadata: dict, filter: dict) -> bool:
+    """Subset of Pinecone's metadata filter language: equality, $eq, $ne, $in"""
+    for key, condition in filter.items():
+        value = metadata.get(key)
+        if isinstance(condition, dict):
+            for op, expected in condition.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Exact cosine search over L2-normalized vectors held in memory.
+    Persisted to a single SQLite file (one row per vector: id, float32
+    blob, metadata JSON), so each mutation writes only the rows it touches
+    and vectors can never get out of step with their ids and metadata.
+    """
+    backend = "local"
+    FORMAT_VERSION = 1  # PRAGMA user_version of vectors.db
+
+    def __init__(self, dimension: int, directory: str = LOCAL_STORE_DIR):
+        self.dimension = dimension
+        self.directory = directory
+        self._lock = threading.RLock()
+        self._ids: List[str] = []
+        self._metadata: List[dict] = []
+        self._matrix = np.zeros((0, dimension), dtype=np.float32)
+        self._faiss_index = None
+        os.makedirs(directory, exist_ok=True)
+        # One shared connection guarded by self._lock
+        self._conn = sqlite3.connect(os.path.join(directory, "vectors.db"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS vectors (
+                seq INTEGER PRIMARY KEY,
+                id TEXT NOT NULL UNIQUE,
+                vector BLOB NOT NULL,
+                metadata TEXT NOT NULL
+            )
+        """)
+        self._conn.execute(f"PRAGMA user_version = {self.FORMAT_VERSION}")
+        self._conn.commit()
+        self._import_legacy_files()
+        self._load()
+
+        try:
+            import faiss
+            self._faiss = faiss
+        except ImportError:
+            self._faiss = None
+
+    def _import_legacy_files(self):
+        """One-time import of the vectors.npy + metadata.json pair older versions wrote"""
+        vectors_path = os.path.join(self.directory, "vectors.npy")
+        metadata_path = os.path.join(self.directory, "metadata.json")
+        if not (os.path.exists(vectors_path) and os.path.exists(metadata_path)):
+            return
+        if self._conn.execute("SELECT 1 FROM vectors LIMIT 1").fetchone() is None:
+            with open(metadata_path, "r") as f:
+                sidecar = json.load(f)
+            matrix = np.load(vectors_path).astype(np.float32)
+            if matrix.shape[0] != len(sidecar["ids"]):
+                print("WARNING: Legacy local vector store files are out of sync. Not importing them.")
+                return
+            self._write(list(zip(sidecar["ids"], matrix, sidecar["metadata"])))
+            print(f"Imported {matrix.shape[0]} vectors from the legacy local store files")
+        os.replace(vectors_path, vectors_path + ".migrated")
+        os.replace(metadata_path, metadata_path + ".migrated")
+
+    def _load(self):
+        rows = self._conn.execute("SELECT id, vector, metadata FROM vectors ORDER BY seq").fetchall()
+        expected = self.dimension * np.dtype(np.float32).itemsize
+        rows = [row for row in rows if len(row[1]) == expected]
+        if not rows:
+            return
+        self._ids = [row[0] for row in rows]
+        self._metadata = [json.loads(row[2]) for row in rows]
+        self._matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+
+    def _write(self, rows: list):
+        """Upsert (id, vector, metadata) rows in one transaction; existing ids keep their position"""
+        with self._conn:
+            self._conn.executemany("""
+                INSERT INTO vectors (id, vector, metadata) VALUES (?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET vector = excluded.vector, metadata = excluded.metadata
+            """, [(vector_id, np.asarray(row, dtype=np.float32).tobytes(), json.dumps(metadata))
+                  for vector_id, row, metadata in rows])
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-12)
+
+    def upsert(self, vectors: List[dict]) -> None:
+        if not vectors:
+            return
+        # A repeated id keeps its last entry, as Pinecone does
+        vectors = list({vector["id"]: vector for vector in vectors}.values())
+        with self._lock:
+            positions = {vector_id: i for i, vector_id in enumerate(self._ids)}
+            new_rows, new_ids, new_metadata = [], [], []
+            values = self._normalize(np.asarray([v["values"] for v in vectors], dtype=np.float32))
+            # Disk first, so a failed write leaves memory matching the file
+            self._write([(vector["id"], row, vector.get("metadata") or {}) for vector, row in zip(vectors, values)])
+            for vector, row in zip(vectors, values):
+                metadata = dict(vector.get("metadata") or {})
+                if vector["id"] in positions:
+                    i = positions[vector["id"]]
+                    self._matrix[i] = row
+                    self._metadata[i] = metadata
+                else:
+                    positions[vector["id"]] = len(self._ids) + len(new_ids)
+                    new_ids.append(vector["id"])
+                    new_rows.append(row)
+                    new_metadata.append(metadata)
+            if new_rows:
+                self._matrix = np.vstack([self._matrix, np.asarray(new_rows, dtype=np.float32)])
+                self._ids.extend(new_ids)
+                self._metadata.extend(new_metadata)
+            self._faiss_index = None  # rebuilt lazily on next query
+
+    def query(self, vector: List[float], top_k: int) -> List[VectorMatch]:
+        with self._lock:
+            if not self._ids:
+                return []
+            query = self._normalize(np.asarray([vector], dtype=np.float32))
+            k = min(top_k, len(self._ids))
+            if self._faiss is not None:
+                if self._faiss_index is None:
+                    self._faiss_index = self._faiss.IndexFlatIP(self.dimension)
+                    self._faiss_index.add(self._matrix)
+                scores, rows = self._faiss_index.search(query, k)
+                ranked = list(zip(rows[0].tolist(), scores[0].tolist()))
+            else:
+                scores = self._matrix @ query[0]
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                ranked = [(int(i), float(scores[i])) for i in top]
+            return [
+                VectorMatch(id=self._ids[i], score=score, metadata=dict(self._metadata[i]))
+                for i, score in ranked if i >= 0
+            ]
+
+    def delete(self, ids: Optional[List[str]] = None, filter: Optional[dict] = None) -> None:
+        with self._lock:
+            drop = set(ids or [])
+            keep = [
+                i for i, (vector_id, metadata) in enumerate(zip(self._ids, self._metadata))
+                if vector_id not in drop and not (filter and _matches_filter(metadata, filter))
+            ]
+            if len(keep) == len(self._ids):
+                return
+            kept = set(keep)
+            with self._conn:
+                self._conn.executemany("DELETE FROM vectors WHERE id = ?",
+                                       [(vector_id,) for i, vector_id in enumerate(self._ids) if i not in kept])
+            self._matrix = self._matrix[keep]
+            self._ids = [self._ids[i] for i in keep]
+            self._metadata = [self._metadata[i] for i in keep]
+            self._faiss_index = None
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def describe(self) -> dict:
+        return {
+            "backend": self.backend,
+            "total_vectors": self.count(),
+            "namespaces": {},
+            "engine": "faiss" if self._faiss is not None else "numpy",
+        }
+
+
+def create_vector_store(dimension: int) -> Optional[VectorStore]:
+    """Build the configured backend, or None if it can't be used"""
+    api_key = os.getenv("PINECONE_API_KEY")
+    backend = VECTOR_STORE or ("pinecone" if api_key else "local")
+
+    if backend == "pinecone":
+        if not api_key:
+            print("WARNING: VECTOR_STORE=pinecone but PINECONE_API_KEY not found. RAG will be disabled.")
+            return None
+        return PineconeVectorStore(api_key, dimension)
+    if backend == "local":
+        return LocalVectorStore(dimension)
+
+    print(f"WARNING: Unknown VECTOR_STORE '{backend}'. RAG will be disabled.")
+    return None
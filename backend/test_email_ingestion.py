@@ -0,0 +1,252 @@
+"""
+EmailIngestionService driven through its mailbox_factory against a local
+IMAP stand-in: IDLE push, polling fallback, reconnects and backoff.
+
+Run with `python -m pytest test_email_ingestion.py` or `python test_email_ingestion.py`.
+"""
+import contextlib
+import os
+import select
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from email.message import EmailMessage
+from unittest import mock
+
+# Must be set before database is imported (it migrates on import)
+_test_dir = tempfile.mkdtemp(prefix="intellidesk-test-")
+os.environ.setdefault("DATABASE_PATH", os.path.join(_test_dir, "test.db"))
+# Pre-classification builds the Groq service and its cache; keep it out of data/
+os.environ.setdefault("CLASSIFICATION_CACHE_PATH", os.path.join(_test_dir, "classification_cache.db"))
+# The Groq client is built at import; no LLM call is made here
+os.environ.setdefault("GROQ_API_KEY", "test")
+
+from imap_tools import MailBoxUnencrypted
+
+import services.email_service as email_service
+from services.email_store import EmailStore
+
+
+class IMAPSession(socketserver.StreamRequestHandler):
+    """The subset of IMAP4rev1 (+ IDLE) that imap_tools and the ingestion loop use"""
+
+    def send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.sessions.append(self.connection)
+        capabilities = "IMAP4rev1 IDLE" if server.idle else "IMAP4rev1"
+        self.send(f"* OK [CAPABILITY {capabilities}] IMAP stand-in ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, command, *rest = line.decode().rstrip("\r\n").split(" ", 2)
+            args = rest[0] if rest else ""
+            command = command.upper()
+            if command == "CAPABILITY":
+                self.send(f"* CAPABILITY {capabilities}")
+            elif command == "LOGIN":
+                with server.lock:
+                    server.logins += 1
+            elif command == "SELECT":
+                self.send(f"* {len(server.messages)} EXISTS")
+                self.send(f"* OK [UIDVALIDITY {server.uidvalidity}] UIDs valid")
+                self.send(f"* OK [UIDNEXT {server.uid_next()}] Predicted next UID")
+            elif command == "STATUS":
+                self.send(f'* STATUS "INBOX" (UIDVALIDITY {server.uidvalidity} UIDNEXT {server.uid_next()})')
+            elif command == "UID":
+                self.uid_command(args)
+            elif command == "IDLE":
+                self.idle(tag)
+                continue
+            elif command == "LOGOUT":
+                self.send("* BYE logging out")
+                self.send(f"{tag} OK LOGOUT completed")
+                return
+            elif command != "NOOP":
+                self.send(f"{tag} BAD unsupported command")
+                continue
+            self.send(f"{tag} OK {command} completed")
+
+    def uid_command(self, args: str):
+        subcommand, _, args = args.partition(" ")
+        messages = list(self.server.messages)
+        if subcommand.upper() == "SEARCH":
+            uids = [uid for uid, _ in messages]
+            if " UID " in f" {args} ":
+                low = int(args.split("UID ")[1].split(":")[0])
+                # "N:*" always includes the highest UID (RFC 3501)
+                uids = [uid for uid in uids if uid >= low] or uids[-1:]
+            self.send("* SEARCH " + " ".join(map(str, uids)))
+        elif subcommand.upper() == "FETCH":
+            wanted = {int(uid) for uid in args.split(" ")[0].split(",")}
+            for seq, (uid, raw) in enumerate(messages, start=1):
+                if uid in wanted:
+                    self.send(f"* {seq} FETCH (UID {uid} FLAGS () RFC822.SIZE {len(raw)} BODY[] {{{len(raw)}}}\r\n".encode()
+                              + raw + b")\r\n")
+
+    def idle(self, tag: str):
+        self.send("+ idling")
+        seen = len(self.server.messages)
+        while True:
+            readable, _, _ = select.select([self.connection], [], [], 0.05)
+            if readable:
+                if not self.rfile.readline():
+                    return
+                self.send(f"{tag} OK IDLE terminated")
+                return
+            if len(self.server.messages) > seen:
+                seen = len(self.server.messages)
+                self.send(f"* {seen} EXISTS")
+
+
+class IMAPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, idle: bool = True):
+        super().__init__(("127.0.0.1", 0), IMAPSession)
+        self.idle = idle
+        self.uidvalidity = 7
+        self.messages = []  # (uid, raw RFC 822 bytes)
+        self.sessions = []
+        self.logins = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def uid_next(self) -> int:
+        return len(self.messages) + 1
+
+    def deliver(self, subject: str, sender: str = "customer@example.com"):
+        message = EmailMessage()
+        message["From"] = sender
+        message["To"] = "support@example.com"
+        message["Subject"] = subject
+        message["Message-ID"] = f"<{self.uid_next()}@example.com>"
+        message.set_content(f"Body of {subject}")
+        self.messages.append((self.uid_next(), message.as_bytes()))
+
+    def drop_connections(self):
+        for connection in self.sessions:
+            with contextlib.suppress(OSError):
+                connection.shutdown(2)
+        self.sessions = []
+
+    def close(self):
+        self.shutdown()
+        self.drop_connections()
+        self.server_close()
+
+
+def wait_for(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+@contextlib.contextmanager
+def ingestion_service(server: IMAPStandIn, ingest=None):
+    """A started EmailIngestionService reading from `server`; yields (service, processed subjects)"""
+    state_dir = tempfile.mkdtemp(prefix="intellidesk-imap-")
+    store = EmailStore(os.path.join(state_dir, "email_log"), legacy_json=None)
+
+    def factory():
+        return MailBoxUnencrypted("127.0.0.1", server.server_address[1]).login(
+            "support@example.com", "secret", initial_folder="INBOX")
+
+    with mock.patch.multiple(email_service, STATE_FILE=os.path.join(state_dir, "imap_state.json"),
+                             IDLE_TIMEOUT=1, CHECK_INTERVAL=0.2, RECONNECT_BACKOFF_MIN=0.05,
+                             get_sync_db=mock.MagicMock(), get_email_store=lambda: store):
+        service = email_service.EmailIngestionService(mailbox_factory=factory)
+        processed = []
+        # Threading/ticket creation and the Mongo mirror are outside this test
+        service._process_email = lambda msg, body, clean_from: processed.append(msg.subject)
+        service._mirror_to_mongo = lambda emails: None
+        if ingest:
+            service._ingest_new = ingest
+        service.start()
+        try:
+            yield service, processed
+        finally:
+            service.stop()
+
+
+def test_idle_push():
+    server = IMAPStandIn(idle=True)
+    try:
+        server.deliver("Printer offline")
+        server.deliver("VPN drops")
+        with ingestion_service(server) as (service, processed):
+            assert wait_for(lambda: processed == ["Printer offline", "VPN drops"]), processed
+            server.deliver("Invoice missing")
+            assert wait_for(lambda: "Invoice missing" in processed), processed
+            metrics = service.get_metrics()
+        assert metrics["mode"] == "idle" and metrics["connects"] == 1, metrics
+        assert metrics["idle_wakeups"] >= 1 and metrics["last_ingest_latency_s"] is not None, metrics
+    finally:
+        server.close()
+
+
+def test_poll_fallback_without_idle():
+    server = IMAPStandIn(idle=False)
+    try:
+        server.deliver("Printer offline")
+        with ingestion_service(server) as (service, processed):
+            assert wait_for(lambda: processed == ["Printer offline"]), processed
+            server.deliver("VPN drops")
+            assert wait_for(lambda: processed == ["Printer offline", "VPN drops"]), processed
+            metrics = service.get_metrics()
+        # One session held open across poll cycles
+        assert metrics["mode"] == "poll" and metrics["connects"] == 1 and server.logins == 1, metrics
+    finally:
+        server.close()
+
+
+def test_reconnects_after_dropped_session():
+    server = IMAPStandIn(idle=True)
+    try:
+        server.deliver("Printer offline")
+        with ingestion_service(server) as (service, processed):
+            assert wait_for(lambda: processed == ["Printer offline"]), processed
+            server.drop_connections()
+            server.deliver("VPN drops")
+            assert wait_for(lambda: processed == ["Printer offline", "VPN drops"]), processed
+            metrics = service.get_metrics()
+        assert metrics["reconnects"] >= 1 and metrics["connects"] >= 2, metrics
+    finally:
+        server.close()
+
+
+def test_backoff_grows_when_ingest_keeps_failing():
+    server = IMAPStandIn(idle=True)
+
+    def failing_ingest(mailbox, notified_at=None):
+        raise RuntimeError("store unavailable")
+
+    try:
+        with ingestion_service(server, ingest=failing_ingest):
+            time.sleep(1.5)
+        # 0.05s doubling backoff: about 5 logins in 1.5s, not one every 50ms
+        assert 2 <= server.logins <= 7, server.logins
+    finally:
+        server.close()
+
+
+if __name__ == "__main__":
+    failures = 0
+    for test in [test_idle_push, test_poll_fallback_without_idle, test_reconnects_after_dropped_session,
+                 test_backoff_grows_when_ingest_keeps_failing]:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {test.__name__}: {e}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,176 @@
+"""
+OutboundMailService delivering the outbox to a local SMTP stand-in:
+connection reuse, permanent rejections, and an unreachable server.
+
+Run with `python -m pytest test_outbound_mail.py` or `python test_outbound_mail.py`.
+"""
+import contextlib
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+# Must be set before database is imported (it migrates on import)
+os.environ.setdefault("DATABASE_PATH", os.path.join(tempfile.mkdtemp(prefix="intellidesk-test-"), "test.db"))
+
+import services.outbound_mail as outbound_mail
+from database import get_db, get_read_db
+
+
+class SMTPSession(socketserver.StreamRequestHandler):
+    """The subset of SMTP (RFC 5321) that smtplib uses without STARTTLS or AUTH"""
+
+    def send(self, line: str):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.send("220 smtp stand-in ready")
+        recipients = []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, args = line.decode().rstrip("\r\n").partition(" ")
+            command = command.upper()
+            if command in ("EHLO", "HELO"):
+                self.send("250 stand-in")
+            elif command == "MAIL":
+                recipients = []
+                self.send("250 OK")
+            elif command == "RCPT":
+                address = args.split(":", 1)[1].strip("<> ")
+                if address in server.rejected:
+                    self.send("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.send("250 OK")
+            elif command == "DATA":
+                self.send("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                server.delivered.extend(recipients)
+                self.send("250 OK queued")
+            elif command in ("RSET", "NOOP"):
+                self.send("250 OK")
+            elif command == "QUIT":
+                self.send("221 Bye")
+                return
+            else:
+                self.send("502 Command not implemented")
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, rejected=()):
+        super().__init__(("127.0.0.1", 0), SMTPSession)
+        self.rejected = set(rejected)
+        self.delivered = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+def closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+
+def outbox_rows(ids) -> list:
+    placeholders = ",".join("?" * len(ids))
+    with get_read_db() as conn:
+        return [dict(row) for row in conn.execute(
+            f"SELECT * FROM outbox WHERE id IN ({placeholders}) ORDER BY id", list(ids)).fetchall()]
+
+
+@contextlib.contextmanager
+def smtp_target(port: int):
+    with get_db() as conn:
+        conn.execute("DELETE FROM outbox")
+    with mock.patch.multiple(outbound_mail, SMTP_SERVER="127.0.0.1", SMTP_PORT=port, SMTP_STARTTLS=False,
+                             OUTBOX_POLL_INTERVAL=0.1):
+        yield
+
+
+def test_batch_shares_one_connection():
+    server = SMTPStandIn()
+    try:
+        with smtp_target(server.server_address[1]):
+            service = outbound_mail.OutboundMailService("support@example.com", "secret", workers=1)
+            ids = [service.enqueue(f"user{i}@example.com", f"Ticket #{i}", "Resolved.") for i in range(5)]
+            service.start()
+            try:
+                assert wait_for(lambda: all(row["status"] == "sent" for row in outbox_rows(ids))), outbox_rows(ids)
+            finally:
+                service.stop()
+        assert sorted(server.delivered) == sorted(f"user{i}@example.com" for i in range(5)), server.delivered
+        assert server.connections == 1 and service.pool.stats["opened"] == 1, service.pool.stats
+    finally:
+        server.close()
+
+
+def test_rejected_recipient_fails_permanently():
+    server = SMTPStandIn(rejected={"gone@example.com"})
+    try:
+        with smtp_target(server.server_address[1]):
+            service = outbound_mail.OutboundMailService("support@example.com", "secret", workers=1)
+            ids = [service.enqueue(to, "Ticket update", "Resolved.")
+                   for to in ("gone@example.com", "dana@example.com")]
+            service._send_batch(service._claim_batch())
+            service.pool.close()
+        rejected, delivered = outbox_rows(ids)
+        assert rejected["status"] == "failed" and rejected["attempts"] == 1, rejected
+        assert delivered["status"] == "sent", delivered
+        assert server.delivered == ["dana@example.com"], server.delivered
+    finally:
+        server.close()
+
+
+def test_unreachable_server_defers_the_batch_after_one_attempt():
+    with smtp_target(closed_port()):
+        service = outbound_mail.OutboundMailService("support@example.com", "secret", workers=1)
+        ids = [service.enqueue(f"user{i}@example.com", f"Ticket #{i}", "Resolved.") for i in range(5)]
+        with mock.patch.object(service.pool, "_open", wraps=service.pool._open) as open_connection:
+            service._send_batch(service._claim_batch())
+        assert open_connection.call_count == 1, open_connection.call_count
+
+    rows = outbox_rows(ids)
+    assert all(row["status"] == "pending" and row["next_attempt_at"] > time.time() for row in rows), rows
+    assert all(row["last_error"] for row in rows), rows
+    # Only the message that was actually tried spends an attempt
+    assert [row["attempts"] for row in rows] == [1, 0, 0, 0, 0], rows
+
+
+if __name__ == "__main__":
+    failures = 0
+    for test in [test_batch_shares_one_connection, test_rejected_recipient_fails_permanently,
+                 test_unreachable_server_defers_the_batch_after_one_attempt]:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {test.__name__}: {e}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,48 @@
+"""
+Description cleaning for response prompts and retrieval queries.
+
+Run with `python -m pytest test_prompt_builder.py` or `python test_prompt_builder.py`.
+"""
+import sys
+
+from services.prompt_builder import clean_description, retrieval_query
+
+
+def test_signature_and_footer_stripped():
+    description = (
+        "My VPN drops every hour since the update.\n\n"
+        "Thanks,\nDana Whitfield\nIT Manager, Acme Corp\n+1 (555) 123-4567\ndana@acme.com\n\n"
+        "Sent from my iPhone"
+    )
+    assert clean_description(description) == "My VPN drops every hour since the update."
+    assert clean_description("Printer is offline\n-- \nJohn Smith\nwww.acme.com") == "Printer is offline"
+
+
+def test_closing_in_the_middle_keeps_the_problem():
+    description = "Hello\nThanks!\nI still cannot log in, error 403 on every attempt\nPlease help"
+    assert clean_description(description) == description
+    assert "error 403" in retrieval_query("Login", description)
+
+
+def test_double_dash_before_content_is_not_a_signature():
+    description = "Error log:\n--\nstack trace...\n  File \"app.py\", line 3, in main"
+    assert clean_description(description) == description
+    assert clean_description("Error log:\n--\nstack trace...") == "Error log:\n--\nstack trace..."
+
+
+def test_quoted_history_stripped():
+    description = "Still broken.\n\nOn Mon, 2 Mar 2026 at 10:00, Support <help@example.com> wrote:\n> Try restarting"
+    assert clean_description(description) == "Still broken."
+
+
+if __name__ == "__main__":
+    failures = 0
+    for test in [test_signature_and_footer_stripped, test_closing_in_the_middle_keeps_the_problem,
+                 test_double_dash_before_content_is_not_a_signature, test_quoted_history_stripped]:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {test.__name__}: {e}")
+    sys.exit(1 if failures else 0)
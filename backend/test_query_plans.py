@@ -0,0 +1,167 @@
+"""
+Schema migration and query plan checks against a fresh temporary database.
+
+Run with `python -m pytest test_query_plans.py` or `python test_query_plans.py`.
+"""
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+
+# Must be set before database is imported (it migrates on import)
+os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="intellidesk-test-"), "test.db")
+
+import database
+from migrations import discover, run_migrations
+from services.search_service import customer_search_clause, search_tickets
+
+FULL_SCAN = re.compile(r"^SCAN \w+( AS \w+)?$")
+
+# Hot queries as issued by the services/routers, with the plan they must avoid
+HOT_QUERIES = {
+    "threading header lookup": (
+        "SELECT ticket_id FROM ticket_emails WHERE message_id IN (?, ?) LIMIT 1", ("a", "b")),
+    "email dedup check": (
+        "SELECT id FROM ticket_emails WHERE message_id = ?", ("a",)),
+    "sender's open tickets": (
+        "SELECT * FROM tickets WHERE customer_email = ? AND status != 'closed' ORDER BY updated_at DESC LIMIT 10",
+        ("a@example.com",)),
+    "ticket list": (
+        "SELECT * FROM tickets WHERE 1=1 ORDER BY created_at DESC LIMIT ? OFFSET ?", (50, 0)),
+    "ticket list by status": (
+        "SELECT * FROM tickets WHERE 1=1 AND status = ? ORDER BY created_at DESC LIMIT ? OFFSET ?", ("open", 50, 0)),
+    "ticket emails": (
+        "SELECT * FROM ticket_emails WHERE ticket_id = ? ORDER BY received_at ASC", (1,)),
+    "daily created": (
+        "SELECT DATE(created_at) as date, COUNT(*) as count FROM tickets WHERE created_at >= ? GROUP BY DATE(created_at)",
+        ("2026-01-01",)),
+    "daily resolved": (
+        "SELECT DATE(resolved_at) as date, COUNT(*) as count FROM tickets WHERE resolved_at >= ? GROUP BY DATE(resolved_at)",
+        ("2026-01-01",)),
+    "document chunks": (
+        "SELECT id, content FROM document_chunks WHERE document_id = ? ORDER BY chunk_index", (1,)),
+    "ticket keyset page": (
+        "SELECT * FROM tickets WHERE 1=1 AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?",
+        ("2026-01-01", 10, 51)),
+    "ticket keyset page by status": (
+        "SELECT * FROM tickets WHERE 1=1 AND status = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?", ("open", "2026-01-01", 10, 51)),
+    "ticket keyset page by priority": (
+        "SELECT * FROM tickets WHERE 1=1 AND priority = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?", ("high", "2026-01-01", 10, 51)),
+    "customer keyset page": (
+        "SELECT * FROM customers WHERE 1=1 AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?",
+        ("2026-01-01", 10, 101)),
+    "customer keyset page by account": (
+        "SELECT * FROM customers WHERE 1=1 AND account_id = ? AND (created_at, id) < (?, ?) "
+        "ORDER BY created_at DESC, id DESC LIMIT ?", (1, "2026-01-01", 10, 101)),
+    "customers of account": (
+        "SELECT * FROM customers WHERE 1=1 AND account_id = ? LIMIT ? OFFSET ?", (1, 100, 0)),
+    "account detail": (
+        """SELECT a.*, COUNT(c.id) as user_count FROM accounts a
+           LEFT JOIN customers c ON a.id = c.account_id WHERE a.id = ? GROUP BY a.id""", (1,)),
+    "customer by email": (
+        "SELECT * FROM customers WHERE email = ?", ("a@example.com",)),
+    "pending drafts": (
+        "SELECT id FROM tickets WHERE draft_status = ? ORDER BY id", ("pending",)),
+    "customer search": (
+        "SELECT * FROM customers WHERE 1=1 AND id IN (SELECT rowid FROM customers_fts WHERE customers_fts MATCH ?) "
+        "LIMIT ? OFFSET ?", ('"example"', 100, 0)),
+}
+
+# Paginated lists must also come back in index order, without a sort step
+ORDERED_QUERIES = {
+    "sender's open tickets", "ticket list", "ticket list by status", "ticket emails", "document chunks",
+    "ticket keyset page", "ticket keyset page by status", "ticket keyset page by priority",
+    "customer keyset page", "customer keyset page by account",
+}
+
+
+def query_plan(sql: str, params: tuple) -> list:
+    with database.get_read_db() as conn:
+        return [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+
+
+def test_migrations_recorded():
+    with database.get_read_db() as conn:
+        versions = [row["version"] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")]
+    assert versions == [version for version, _ in discover()]
+
+
+def test_migrations_idempotent():
+    conn = database.get_connection()
+    try:
+        assert run_migrations(conn) == []
+    finally:
+        conn.close()
+
+
+def test_hot_queries_use_indexes():
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = query_plan(sql, params)
+        scans = [step for step in plan if FULL_SCAN.match(step)]
+        assert not scans, f"{name}: full table scan {scans} in plan {plan}"
+        if name in ORDERED_QUERIES:
+            assert not any("TEMP B-TREE" in step for step in plan), f"{name}: sorts in plan {plan}"
+
+
+def test_ticket_email_message_id_unique():
+    with database.get_db() as conn:
+        ticket_id = conn.execute(
+            "INSERT INTO tickets (title, description) VALUES ('Unique check', 'body')").lastrowid
+        conn.execute("INSERT INTO ticket_emails (ticket_id, message_id, sender) VALUES (?, 'm-1', 's')", (ticket_id,))
+    try:
+        with database.get_db() as conn:
+            conn.execute("INSERT INTO ticket_emails (ticket_id, message_id, sender) VALUES (?, 'm-1', 's')",
+                         (ticket_id,))
+    except sqlite3.IntegrityError:
+        pass
+    else:
+        raise AssertionError("duplicate ticket_emails.message_id was accepted")
+
+
+def test_full_text_search_in_sync():
+    with database.get_db() as conn:
+        ticket_id = conn.execute("INSERT INTO tickets (title, description) VALUES (?, ?)",
+                                 ("Printer offline", "The office printer keeps dropping off wifi")).lastrowid
+        conn.execute("INSERT INTO ticket_emails (ticket_id, message_id, sender, subject, body) VALUES (?, ?, ?, ?, ?)",
+                     (ticket_id, "m-fts", "s", "Re: printer", "Still failing after the firmware upgrade"))
+        conn.execute("INSERT INTO customers (email, name) VALUES ('dana.fts@example.com', 'Dana Whitfield')")
+
+    hits = search_tickets("printer wif")
+    assert [hit["ticket"].id for hit in hits] == [ticket_id] and hits[0]["matched_in"] == "ticket"
+    assert "<mark>" in hits[0]["snippet"]
+    hits = search_tickets("firmware")
+    assert [hit["ticket"].id for hit in hits] == [ticket_id] and hits[0]["matched_in"] == "email"
+    assert search_tickets("printer", status="closed") == []
+
+    condition, params = customer_search_clause("whitf")
+    with database.get_read_db() as conn:
+        names = [row["name"] for row in conn.execute(f"SELECT name FROM customers WHERE {condition}", params)]
+    assert names == ["Dana Whitfield"]
+
+    with database.get_db() as conn:
+        conn.execute("UPDATE tickets SET title = 'Scanner offline', description = 'jammed' WHERE id = ?", (ticket_id,))
+    assert search_tickets("wifi") == []
+    assert [hit["ticket"].id for hit in search_tickets("scanner")] == [ticket_id]
+
+    with database.get_db() as conn:
+        conn.execute("DELETE FROM ticket_emails WHERE ticket_id = ?", (ticket_id,))
+        conn.execute("DELETE FROM tickets WHERE id = ?", (ticket_id,))
+        for fts in ("tickets_fts", "ticket_emails_fts", "customers_fts"):
+            conn.execute(f"INSERT INTO {fts}({fts}) VALUES ('integrity-check')")
+    assert search_tickets("scanner") == [] and search_tickets("firmware") == []
+
+
+if __name__ == "__main__":
+    failures = 0
+    for test in [test_migrations_recorded, test_migrations_idempotent, test_hot_queries_use_indexes,
+                 test_ticket_email_message_id_unique, test_full_text_search_in_sync]:
+        try:
+            test()
+            print(f"PASS {test.__name__}")
+        except AssertionError as e:
+            failures += 1
+            print(f"FAIL {test.__name__}: {e}")
+    sys.exit(1 if failures else 0)
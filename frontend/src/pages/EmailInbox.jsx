@@ -1,20 +1,27 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Mail, RefreshCw, Search, Clock, ChevronRight, Trash2, ArrowLeft, Zap, Database, X, Send } from 'lucide-react';
 import { ticketsAPI } from '../services/api';
 
+// The API returns newest-first pages; "Load more" grows the window the poll refreshes
+const PAGE_SIZE = 100;
+
 export default function EmailInbox() {
     const [emails, setEmails] = useState([]);
     const [loading, setLoading] = useState(true);
     const [searchTerm, setSearchTerm] = useState('');
+    const [hasMore, setHasMore] = useState(false);
+    // A ref, so the polling interval always sees the current window size
+    const visibleCount = useRef(PAGE_SIZE);
 
     const fetchEmails = async () => {
         setLoading(true);
         try {
             // Fetch directly from API
-            const response = await fetch('https://agglomeration-intellideskai.onrender.com/api/emails/');
+            const response = await fetch(`https://agglomeration-intellideskai.onrender.com/api/emails/?limit=${visibleCount.current}&offset=0`);
             if (response.ok) {
                 const data = await response.json();
                 setEmails(data);
+                setHasMore(data.length === visibleCount.current);
             }
         } catch (error) {
             console.error('Failed to fetch emails:', error);
@@ -23,6 +30,11 @@ export default function EmailInbox() {
         }
     };
 
+    const loadMore = () => {
+        visibleCount.current += PAGE_SIZE;
+        fetchEmails();
+    };
+
     useEffect(() => {
         fetchEmails();
         // Poll every 10 seconds for UI updates
@@ -188,6 +200,15 @@ export default function EmailInbox() {
                         <p>Waiting for incoming messages...</p>
                     </div>
                 )}
+                {hasMore && (
+                    <button
+                        onClick={loadMore}
+                        disabled={loading}
+                        className="w-full px-4 py-2 bg-[var(--bg-tertiary)] text-[var(--text-primary)] rounded hover:bg-[var(--border-color)] flex items-center justify-center gap-2 border border-[var(--border-color)] transition-colors"
+                    >
+                        Load more
+                    </button>
+                )}
             </div>
 
             {/* Email Detail Modal */}